@@ -0,0 +1,60 @@
+# python3 -m bench [options] [WORKLOAD...]
+
+import argparse
+import json
+import sys
+
+from bench.runner import BenchmarkError, BenchmarkRunner, compare
+from bench.workloads import WORKLOADS
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m bench', description='interpret.py benchmarks')
+    parser.add_argument('workloads', nargs='*', help='any of: ' + ', '.join(WORKLOADS))
+    parser.add_argument('--repeat', type=int, default=5, help='measured runs per workload, the median is reported')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured runs before them')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the size of every workload')
+    parser.add_argument('--output', help='write the results as json to OUTPUT')
+    parser.add_argument('--baseline', help='compare with results stored by --output')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='relative change counted as a regression, default 0.05')
+    parser.add_argument('--interpreter-arg', action='append', default=[],
+                        help='passed to interpret.py, repeatable, e.g. --interpreter-arg=--engine=compiled')
+    parser.add_argument('--cache', action='store_true', help='let interpret.py use its program cache')
+    args = parser.parse_args()
+
+    names = args.workloads or list(WORKLOADS)
+    for name in names:
+        if name not in WORKLOADS:
+            parser.error('unknown workload [{}]'.format(name))
+
+    interpreter_args = list(args.interpreter_arg)
+    if not args.cache:
+        interpreter_args.append('--no-cache')
+    runner = BenchmarkRunner(interpreter_args, args.repeat, args.warmup, args.scale)
+    try:
+        results = runner.run(names)
+    except BenchmarkError as error:
+        sys.stderr.write('bench: {}\n'.format(error))
+        sys.exit(2)
+
+    document = {'interpreter_args': interpreter_args, 'results': results}
+    if args.output != None:
+        with open(args.output, 'w') as output_file:
+            json.dump(document, output_file, indent=1)
+            output_file.write('\n')
+    else:
+        json.dump(document, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+
+    if args.baseline != None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        lines, regressed = compare(results, baseline, args.tolerance)
+        sys.stderr.write('\n'.join(lines) + '\n')
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# runs workloads through interpret.py in child processes, timing the run loop users get
+# the measured runs only write --timings, the instructions are counted once by a separate --stats run without -O,
+# where a fused block would count as one, so instructions per second compares across -O levels
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.workloads import WORKLOADS
+
+INTERPRETER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'interpret.py')
+
+
+class BenchmarkError(Exception):  # a run of the interpreter did not exit with 0, its timings mean nothing
+    pass
+
+
+class Measurement:  # one run of the interpreter
+    def __init__(self, wall_seconds, peak_rss_kib, exit_code, report):
+        self.wall_seconds = wall_seconds
+        self.peak_rss_kib = peak_rss_kib
+        self.exit_code = exit_code
+        self.report = report  # the json the interpreter wrote
+
+
+def source_level(interpreter_args):  # the arguments without -O LEVEL
+    args = []
+    skip = False
+    for arg in interpreter_args:
+        if not skip and arg.startswith('-O'):
+            skip = arg == '-O'  # the level is the next argument
+        elif skip:
+            skip = False
+        else:
+            args.append(arg)
+    return args
+
+
+def run_once(command, input_path, report_option, report_path):
+    with open(input_path) as input_file, tempfile.TemporaryFile('w+') as error_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(command + [report_option + report_path], stdin=input_file,
+                                   stdout=subprocess.DEVNULL, stderr=error_file)
+        _, status, usage = os.wait4(process.pid, 0)  # rusage of this child only, unlike getrusage
+        wall = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            error_file.seek(0)
+            raise BenchmarkError('interpret.py exited with {}: {}'.format(process.returncode, error_file.read().strip()))
+    with open(report_path) as report_file:
+        report = json.load(report_file)
+    return Measurement(wall, usage.ru_maxrss, process.returncode, report)
+
+
+class BenchmarkRunner:
+    def __init__(self, interpreter_args, repeat, warmup, scale):
+        self.interpreter_args = interpreter_args  # extra arguments, --engine, -O, ...
+        self.repeat = repeat
+        self.warmup = warmup
+        self.scale = scale
+
+    def run(self, names):  # returns {name: result dict}
+        results = {}
+        with tempfile.TemporaryDirectory(prefix='ipp-bench-') as directory:
+            for name in names:
+                try:
+                    results[name] = self.runWorkload(name, directory)
+                except BenchmarkError as error:
+                    raise BenchmarkError('{}: {}'.format(name, error)) from None
+                sys.stderr.write('{:<10} {:>12.0f} instr/s\n'.format(
+                    name, results[name]['instructions_per_second']))
+        return results
+
+    def runWorkload(self, name, directory):
+        generator, default_size = WORKLOADS[name]
+        size = max(1, int(default_size * self.scale))
+        source, input_text = generator(size)
+        source_path = os.path.join(directory, name + '.xml')
+        input_path = os.path.join(directory, name + '.in')
+        report_path = os.path.join(directory, name + '.json')
+        with open(source_path, 'w') as source_file:
+            source_file.write(source)
+        with open(input_path, 'w') as input_file:
+            input_file.write(input_text)
+
+        command = [sys.executable, INTERPRETER, '--source=' + source_path]
+        executed = run_once(command + source_level(self.interpreter_args), input_path, '--stats=',
+                            report_path).report['instructions_executed']
+        command += self.interpreter_args
+        for _ in range(self.warmup):
+            run_once(command, input_path, '--timings=', report_path)
+        runs = [run_once(command, input_path, '--timings=', report_path) for _ in range(self.repeat)]
+        run_seconds = statistics.median(run.report['run_seconds'] for run in runs)
+
+        return {
+            'size': size,
+            'exit_code': runs[0].exit_code,
+            'instructions_executed': executed,
+            'instructions_per_second': executed / run_seconds if run_seconds > 0 else 0.0,
+            'load_seconds': statistics.median(run.report['load_seconds'] for run in runs),
+            'run_seconds': run_seconds,
+            'wall_seconds': statistics.median(run.wall_seconds for run in runs),
+            'peak_rss_kib': max(run.peak_rss_kib for run in runs),
+        }
+
+
+# metric -> True when higher is better
+COMPARED = {
+    'instructions_per_second': True,
+    'load_seconds': False,
+    'wall_seconds': False,
+    'peak_rss_kib': False,
+}
+
+
+def compare(results, baseline, tolerance):  # returns table lines and whether anything regressed
+    lines = ['{:<10} {:<24} {:>14} {:>14} {:>8}'.format('workload', 'metric', 'baseline', 'current', 'change')]
+    regressed = False
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old = baseline[name][metric]
+            new = result[metric]
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            mark = ''
+            if worse > tolerance:
+                mark = ' !'
+                regressed = True
+            lines.append('{:<10} {:<24} {:>14.4g} {:>14.4g} {:>+7.1%}{}'.format(
+                name, metric, old, new, change, mark))
+    return lines, regressed
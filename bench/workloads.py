@@ -0,0 +1,175 @@
+# synthetic IPPcode23 programs, every workload returns (xml source, input text) for a size
+
+import xml.etree.ElementTree as ET
+
+
+class ProgramBuilder:  # collects instructions and writes them as the xml parse.php produces
+    def __init__(self):
+        self.instructions = []
+
+    def add(self, opcode, *args):  # args are 'type@value' for literals, 'GF@x' for variables, plain names for labels
+        self.instructions.append((opcode, args))
+
+    @staticmethod
+    def argument(opcode, index, arg):
+        frame = arg.split('@', 1)[0]
+        if frame in ['GF', 'LF', 'TF']:
+            return 'var', arg
+        if frame in ['int', 'bool', 'string', 'nil'] and '@' in arg:
+            return frame, arg.split('@', 1)[1]
+        if opcode == 'READ' and index == 1:
+            return 'type', arg
+        return 'label', arg
+
+    def xml(self):
+        program = ET.Element('program', language='IPPcode23')
+        for order, (opcode, args) in enumerate(self.instructions, 1):
+            instruction = ET.SubElement(program, 'instruction', order=str(order), opcode=opcode)
+            for index, arg in enumerate(args):
+                typpe, value = ProgramBuilder.argument(opcode, index, arg)
+                element = ET.SubElement(instruction, 'arg{}'.format(index + 1), type=typpe)
+                element.text = value
+        return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(program, encoding='unicode') + '\n'
+
+
+def counted_loop(builder, counter, count, body):  # counter runs from 0 to count, body adds the loop body
+    builder.add('DEFVAR', counter)
+    builder.add('MOVE', counter, 'int@0')
+    builder.add('LABEL', 'loop_' + counter[3:])
+    body(builder)
+    builder.add('ADD', counter, counter, 'int@1')
+    builder.add('JUMPIFNEQ', 'loop_' + counter[3:], counter, 'int@{}'.format(count))
+
+
+def loop(size):  # tight integer arithmetic, values stay small enough for IDIV
+    builder = ProgramBuilder()
+    builder.add('DEFVAR', 'GF@s')
+    builder.add('DEFVAR', 'GF@t')
+    builder.add('MOVE', 'GF@s', 'int@0')
+
+    def body(b):
+        b.add('ADD', 'GF@s', 'GF@s', 'GF@i')
+        b.add('MUL', 'GF@t', 'GF@i', 'int@3')
+        b.add('IDIV', 'GF@t', 'GF@t', 'int@2')
+        b.add('SUB', 'GF@s', 'GF@s', 'GF@t')
+    counted_loop(builder, 'GF@i', size, body)
+    builder.add('WRITE', 'GF@s')
+    return builder.xml(), ''
+
+
+def strings(size):  # string building with CONCAT, then rewriting it with SETCHAR
+    builder = ProgramBuilder()
+    builder.add('DEFVAR', 'GF@s')
+    builder.add('DEFVAR', 'GF@c')
+    builder.add('MOVE', 'GF@s', 'string@')
+
+    def build(b):
+        b.add('INT2CHAR', 'GF@c', 'int@97')
+        b.add('CONCAT', 'GF@s', 'GF@s', 'GF@c')
+    counted_loop(builder, 'GF@i', size, build)
+
+    def rewrite(b):
+        b.add('SETCHAR', 'GF@s', 'GF@j', 'string@b')
+    counted_loop(builder, 'GF@j', size, rewrite)
+    builder.add('STRLEN', 'GF@c', 'GF@s')
+    builder.add('WRITE', 'GF@c')
+    return builder.xml(), ''
+
+
+def recursion(size):  # recursive sum of 0..n on the data stack, one frame per level
+    depth = 200
+    builder = ProgramBuilder()
+    builder.add('DEFVAR', 'GF@r')
+
+    def body(b):
+        b.add('PUSHS', 'int@{}'.format(depth))
+        b.add('CALL', 'sum')
+        b.add('POPS', 'GF@r')
+    counted_loop(builder, 'GF@k', max(1, size // depth), body)
+    builder.add('WRITE', 'GF@r')
+    builder.add('EXIT', 'int@0')
+
+    builder.add('LABEL', 'sum')
+    builder.add('CREATEFRAME')
+    builder.add('PUSHFRAME')
+    builder.add('DEFVAR', 'LF@n')
+    builder.add('POPS', 'LF@n')
+    builder.add('JUMPIFNEQ', 'sum_rec', 'LF@n', 'int@0')
+    builder.add('PUSHS', 'int@0')
+    builder.add('POPFRAME')
+    builder.add('RETURN')
+    builder.add('LABEL', 'sum_rec')
+    builder.add('DEFVAR', 'LF@m')
+    builder.add('SUB', 'LF@m', 'LF@n', 'int@1')
+    builder.add('PUSHS', 'LF@m')
+    builder.add('CALL', 'sum')
+    builder.add('POPS', 'LF@m')
+    builder.add('ADD', 'LF@m', 'LF@m', 'LF@n')
+    builder.add('PUSHS', 'LF@m')
+    builder.add('POPFRAME')
+    builder.add('RETURN')
+    return builder.xml(), ''
+
+
+def frames(size):  # many calls of a function with a dozen locals passed through TF
+    locals_count = 12
+    builder = ProgramBuilder()
+    builder.add('DEFVAR', 'GF@r')
+
+    def body(b):
+        b.add('CREATEFRAME')
+        b.add('DEFVAR', 'TF@arg')
+        b.add('MOVE', 'TF@arg', 'GF@i')
+        b.add('CALL', 'work')
+        b.add('MOVE', 'GF@r', 'TF@result')
+    counted_loop(builder, 'GF@i', size, body)
+    builder.add('WRITE', 'GF@r')
+    builder.add('EXIT', 'int@0')
+
+    builder.add('LABEL', 'work')
+    builder.add('PUSHFRAME')
+    for k in range(locals_count):
+        builder.add('DEFVAR', 'LF@v{}'.format(k))
+        builder.add('ADD', 'LF@v{}'.format(k), 'LF@arg', 'int@{}'.format(k))
+    builder.add('DEFVAR', 'LF@result')
+    builder.add('MOVE', 'LF@result', 'LF@v{}'.format(locals_count - 1))
+    builder.add('POPFRAME')
+    builder.add('RETURN')
+    return builder.xml(), ''
+
+
+def read(size):  # READ heavy input processing, every line is parsed as int
+    builder = ProgramBuilder()
+    builder.add('DEFVAR', 'GF@s')
+    builder.add('DEFVAR', 'GF@x')
+    builder.add('DEFVAR', 'GF@t')
+    builder.add('MOVE', 'GF@s', 'int@0')
+    builder.add('LABEL', 'next')
+    builder.add('READ', 'GF@x', 'int')
+    builder.add('TYPE', 'GF@t', 'GF@x')
+    builder.add('JUMPIFEQ', 'done', 'GF@t', 'string@nil')
+    builder.add('ADD', 'GF@s', 'GF@s', 'GF@x')
+    builder.add('JUMP', 'next')
+    builder.add('LABEL', 'done')
+    builder.add('WRITE', 'GF@s')
+    return builder.xml(), ''.join('{}\n'.format(k) for k in range(size))
+
+
+def write(size):  # WRITE heavy output
+    builder = ProgramBuilder()
+
+    def body(b):
+        b.add('WRITE', 'GF@i')
+        b.add('WRITE', 'string@\\010')
+    counted_loop(builder, 'GF@i', size, body)
+    return builder.xml(), ''
+
+
+WORKLOADS = {  # name -> (generator, default size)
+    'loop': (loop, 200000),
+    'strings': (strings, 20000),
+    'recursion': (recursion, 100000),
+    'frames': (frames, 20000),
+    'read': (read, 100000),
+    'write': (write, 100000),
+}
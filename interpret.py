@@ -1,8 +1,26 @@
 import argparse
 import xml.etree.ElementTree as ET
 import sys
-import copy
+import os
+import io
 import re
+import hashlib
+import marshal
+import gc
+import mmap
+import struct
+import json
+import time
+import itertools
+import contextlib
+import tempfile
+import signal
+import select
+import socket
+import stat
+import glob
+import codecs
+import resource
 from enum import Enum
 
 
@@ -13,18 +31,119 @@ class VariableType(Enum):
     NIL = 'nil'
     UNINIT = ''
 
-class VariableData:# actual data with its type
+class VariableData:# actual data with its type, immutable once created so it can be shared freely
+    __slots__ = ('type', 'value')
+
     def __init__(self, typpe, value):
         self.type = typpe
         self.value = value
 
     @staticmethod
     def empty():
-        return VariableData(VariableType.UNINIT, None)
+        return UNINIT_DATA
+
+
+UNINIT_DATA = VariableData(VariableType.UNINIT, None)
+
+
+class StringData(VariableData):  # STRING grown by CONCAT or changed by SETCHAR, flattened when its value is read
+    # the versions of one string share a list of characters, held by the newest version, every older
+    # version holds the change turning the newer one back into it (a persistent array), so appending to or
+    # changing the newest version is O(1) and every version still reads as the string it was created as
+    __slots__ = ('chars', 'change', 'newer', 'flat')
+
+    TRUNCATE = 0  # (TRUNCATE, length)
+    EXTEND = 1  # (EXTEND, characters)
+    SET = 2  # (SET, index, character)
+
+    def __init__(self, chars):
+        self.type = VariableType.STRING
+        self.chars = chars  # None unless this is the newest version
+        self.change = None
+        self.newer = None
+        self.flat = None  # the value once it was read
+
+    @property
+    def value(self):
+        if self.flat == None:
+            self.reroot()
+            self.flat = ''.join(self.chars)
+        return self.flat
+
+    def length(self):
+        if self.flat != None:
+            return len(self.flat)
+        self.reroot()
+        return len(self.chars)
+
+    def reroot(self):  # makes this the newest version, undoing the changes made after it
+        if self.chars != None:
+            return
+        path = []
+        version = self
+        while version.chars == None:
+            path.append(version)
+            version = version.newer
+        chars = version.chars
+        for older in reversed(path):
+            newer = older.newer
+            change = older.change
+            if change[0] == StringData.TRUNCATE:
+                newer.change = (StringData.EXTEND, chars[change[1]:])
+                del chars[change[1]:]
+            elif change[0] == StringData.EXTEND:
+                newer.change = (StringData.TRUNCATE, len(chars))
+                chars.extend(change[1])
+            else:
+                newer.change = (StringData.SET, change[1], chars[change[1]])
+                chars[change[1]] = change[2]
+            newer.chars = None
+            newer.newer = older
+            older.chars = chars
+            older.change = None
+            older.newer = None
+
+    def derive(self, change):  # newest version, this one keeps change to get back to itself
+        result = StringData(self.chars)
+        self.chars = None
+        self.change = change
+        self.newer = result
+        return result
+
+    @staticmethod
+    def of(data):  # data as a StringData, copying the characters of a plain STRING once
+        if type(data) is StringData:
+            data.reroot()
+            return data
+        return StringData(list(data.value))
+
+    @staticmethod
+    def concat(data, text):
+        data = StringData.of(data)
+        length = len(data.chars)
+        data.chars.extend(text)
+        return data.derive((StringData.TRUNCATE, length))
+
+    @staticmethod
+    def setChar(data, index, char):
+        data = StringData.of(data)
+        old = data.chars[index]
+        data.chars[index] = char
+        return data.derive((StringData.SET, index, old))
+
+
+def string_length(data):  # length of a STRING without flattening a StringData
+    if type(data) is StringData:
+        return data.length()
+    return len(data.value)
 
 class ErrCode(Enum):
     CMD_ARGS = 10
     OPEN_INPUT_FILE = 11
+    OPEN_OUTPUT_FILE = 12
+    HEADER = 21
+    OPCODE = 22
+    SYNTAX = 23
     FORMAT_XML = 31
     BAD_XML = 32
     SEMANTIC = 52
@@ -34,87 +153,240 @@ class ErrCode(Enum):
     UNINITIALIZED_VAR = 56
     OPERAND_VALUE = 57
     BAD_STRING_MANIPULATION = 58
+    RESOURCE_LIMIT = 90
+    INTERNAL = 99
+
+
+class OutputBuffer:  # collects WRITE and DPRINT output and writes it out in bulk
+    def __init__(self, threshold=65536):
+        self.threshold = threshold  # buffered characters that trigger a flush
+        self.parts = []
+        self.size = 0
+        self.to_stderr = False  # stream the buffered parts belong to
+        self.written = 0  # characters written to stdout so far
+
+    def write(self, text):
+        if self.to_stderr:
+            self.flush()
+            self.to_stderr = False
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.threshold:
+            self.flush()
+
+    def writeErr(self, text):
+        if not self.to_stderr:
+            self.flush()
+            self.to_stderr = True
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.threshold:
+            self.flush()
+
+    def flush(self):
+        if len(self.parts) == 0:
+            return
+        stream = sys.stderr if self.to_stderr else sys.stdout
+        text = ''.join(self.parts)
+        stream.write(text)
+        if not self.to_stderr:
+            self.written += len(text)
+        stream.flush()
+        self.parts = []
+        self.size = 0
+
+
+output_buffer = OutputBuffer()
+
+
+class InputReader:  # READ input, read in large chunks and handed out line by line
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, stream):
+        self.raw = getattr(stream, 'buffer', None)  # binary file under a text one, read1 returns what is available
+        self.stream = stream
+        if self.raw != None:
+            self.decoder = codecs.getincrementaldecoder(stream.encoding or 'utf-8')(stream.errors or 'strict')
+            if stream is not sys.stdin:  # open() translates \r\n and \r, sys.stdin splits at \n only
+                self.decoder = io.IncrementalNewlineDecoder(self.decoder, True)
+        else:
+            self.decoder = None  # StringIO and friends hand out str already
+        self.lines = []  # complete lines of the last chunk, without newlines
+        self.next_line = 0  # index into lines
+        self.rest = ''  # unfinished last line of the chunks read so far
+        self.ended = False
+        self.consumed = 0  # lines handed out, the position a checkpoint resumes from
+
+    def readLine(self):  # next line without its newline, '' at the end of input like readline
+        if self.next_line == len(self.lines) and not self.fill():
+            return ''
+        line = self.lines[self.next_line]
+        self.next_line += 1
+        self.consumed += 1
+        return line
+
+    def skip(self, count):  # drops lines already read by the run a checkpoint was taken from
+        while count > 0 and (self.next_line < len(self.lines) or self.fill()):
+            step = min(count, len(self.lines) - self.next_line)
+            self.next_line += step
+            self.consumed += step
+            count -= step
+        return count == 0
+
+    def fill(self):  # False at the end of input
+        while not self.ended:
+            chunk = self.readChunk()
+            if chunk == None:
+                self.ended = True
+                lines = [self.rest] if self.rest != '' else []
+                self.rest = ''
+            else:
+                lines = (self.rest + chunk).split('\n')
+                self.rest = lines.pop()
+            if len(lines) > 0:
+                self.lines = lines
+                self.next_line = 0
+                return True
+        return False
+
+    def readChunk(self):  # text with newlines translated like a text file reads them, None at the end of input
+        if self.decoder == None:
+            text = self.stream.read(InputReader.CHUNK_SIZE)
+            return text if text != '' else None
+        data = self.raw.read1(InputReader.CHUNK_SIZE)
+        text = self.decoder.decode(data, data == b'')
+        if data == b'' and text == '':
+            return None
+        return text
 
 
 class ErrorHandler:
+    before_exit = None  # callable run once before an error exit, set while the program is loading
+
     @staticmethod
     def error_exit(msg, code):
+        if ErrorHandler.before_exit != None:
+            before_exit = ErrorHandler.before_exit
+            ErrorHandler.before_exit = None
+            before_exit()
+        output_buffer.flush()
         sys.stderr.write("<ERROR EXIT> "+msg+"\n")
         sys.exit(code.value)
 
 
-class ProgramContext:  # holds variable dictionaries, program counter, navigates around the program
-    def __init__(self, input_stream):
-        self.label_dict = {}
-        self.global_var_dict = {}
-        self.temporary_var_dict = None
-        self.local_var_dict_stack = []
+# frame kinds of variable operands, resolved once when the program is loaded
+FRAME_GF = 0
+FRAME_TF = 1
+FRAME_LF = 2
+FRAME_UNKNOWN = 3
+
+FRAME_KINDS = {'GF': FRAME_GF, 'TF': FRAME_TF, 'LF': FRAME_LF}
+
+FRAME_POOL_SIZE = 64  # released TF/LF frames kept for reuse by CREATEFRAME
+
+
+class ProgramContext:  # holds variable frames, program counter, navigates around the program
+    # frames are lists indexed by the slot of Arg_Var, None marks an undeclared variable
+    def __init__(self, input_stream, global_slot_count=0, local_slot_count=0, max_call_depth=1000000,
+                 max_stack=None, max_frames=None):
+        self.global_frame = [None] * global_slot_count
+        self.temporary_frame = None
+        self.local_frame = None  # top of local_frame_stack
+        self.local_frame_stack = []
+        self.local_slot_count = local_slot_count
+        self.blank_frame = [None] * local_slot_count
+        self.frame_pool = []  # released frames, already blank
         self.program_counter = 0
-        self.input_stream = input_stream
-        self.call_program_counter = None
-        self.stack = []
+        self.input_reader = InputReader(input_stream)
+        # return addresses, call_stack[:call_depth] is in use, grows by doubling up to max_call_depth
+        self.call_stack = [0] * min(16, max_call_depth)
+        self.call_depth = 0
+        self.max_call_depth = max_call_depth
+        # data stack, unboxed into parallel lists of types and values so stack
+        # instructions never build a VariableData for their operands or results
+        self.stack_types = []
+        self.stack_values = []
+        # --max-stack and --max-frames, checked on every push, sys.maxsize keeps it one comparison without a limit
+        self.max_stack = sys.maxsize if max_stack == None else max_stack
+        self.max_frames = sys.maxsize if max_frames == None else max_frames
 
     def pushStack(self, data):
-        self.stack.append(data)
+        if len(self.stack_types) >= self.max_stack:
+            self.stack_limit_error()
+        self.stack_types.append(data.type)
+        self.stack_values.append(data.value)
 
     def popStack(self):
-        if len(self.stack) == 0:
-            ErrorHandler.error_exit(
-                'pop var stack, empty', ErrCode.UNINITIALIZED_VAR)
-        return self.stack.pop()
-
-    def _getVarData(self, frame, name):
-        if frame == "GF":
-            return self.global_var_dict.get(name)
-        elif frame == 'TF':
-            if self.temporary_var_dict == None:
-                self.nonexists_frame_error(frame)
-            return self.temporary_var_dict.get(name)
-        elif frame == 'LF':
-            if len(self.local_var_dict_stack) == 0:
-                self.nonexists_frame_error(frame)
-            return self.local_var_dict_stack[-1].get(name)
+        if len(self.stack_types) == 0:
+            self.stack_underflow_error()
+        return VariableData(self.stack_types.pop(), self.stack_values.pop())
+
+    def clearStack(self):
+        self.stack_types.clear()
+        self.stack_values.clear()
+
+    def stack_limit_error(self):
+        ResourceGovernor.exceeded('data stack limit of {} values reached'.format(self.max_stack))
+
+    def frame_limit_error(self):
+        ResourceGovernor.exceeded('frame stack limit of {} frames reached'.format(self.max_frames))
+
+    def stack_underflow_error(self):
+        ErrorHandler.error_exit(
+            'pop var stack, empty', ErrCode.UNINITIALIZED_VAR)
+
+    def _getVarData(self, var):
+        kind = var.frame_kind
+        if kind == FRAME_GF:
+            return self.global_frame[var.slot]
+        elif kind == FRAME_LF:
+            if self.local_frame == None:
+                self.nonexists_frame_error(var.frame)
+            return self.local_frame[var.slot]
+        elif kind == FRAME_TF:
+            if self.temporary_frame == None:
+                self.nonexists_frame_error(var.frame)
+            return self.temporary_frame[var.slot]
         else:
-            self.nonexists_frame_error(frame)
+            self.nonexists_frame_error(var.frame)
 
-    def peekVarType(self, frame, name):
-        var_data = self._getVarData(frame, name)
+    def peekVarType(self, var):
+        var_data = self._getVarData(var)
 
         if var_data == None:
-            self.nonexists_var_error(frame, name)
+            self.nonexists_var_error(var.frame, var.name)
 
         return var_data.type
 
-    def readVariable(self, frame, name):
-        var_data = self._getVarData(frame, name)
+    def readVariable(self, var):
+        var_data = self._getVarData(var)
 
         if var_data == None:
-            self.nonexists_var_error(frame, name)
+            self.nonexists_var_error(var.frame, var.name)
 
         if var_data.type == None:
-            self.uninit_var_error(frame, name)
-
-        return copy.deepcopy(var_data)
-
-    def writeVariable(self, frame, name, data):
-        if frame == "GF":
-            if name not in self.global_var_dict.keys():
-                self.nonexists_var_error(frame, name)
-            self.global_var_dict[name] = data
-        elif frame == 'TF':
-            if self.temporary_var_dict == None:
-                self.nonexists_frame_error(frame)
-            if name not in self.temporary_var_dict.keys():
-                self.nonexists_var_error(frame, name)
-            self.temporary_var_dict[name] = data
-        elif frame == 'LF':
-            if len(self.local_var_dict_stack) == 0:
-                self.nonexists_frame_error(frame)
-            if name not in self.local_var_dict_stack[-1].keys():
-                self.nonexists_var_error(frame, name)
-            self.local_var_dict_stack[-1][name] = data
+            self.uninit_var_error(var.frame, var.name)
+
+        return var_data
+
+    def writeVariable(self, var, data):
+        kind = var.frame_kind
+        if kind == FRAME_GF:
+            frame = self.global_frame
+        elif kind == FRAME_LF:
+            frame = self.local_frame
+            if frame == None:
+                self.nonexists_frame_error(var.frame)
+        elif kind == FRAME_TF:
+            frame = self.temporary_frame
+            if frame == None:
+                self.nonexists_frame_error(var.frame)
         else:
-            self.label_name_error(frame)
+            self.label_name_error(var.frame)
+
+        if frame[var.slot] == None:
+            self.nonexists_var_error(var.frame, var.name)
+        frame[var.slot] = data
 
     def label_name_error(self, frame):
         ErrorHandler.error_exit(
@@ -136,64 +408,82 @@ class ProgramContext:  # holds variable dictionaries, program counter, navigates
         ErrorHandler.error_exit(
             'variable redefinition [{}, {}]'.format(frame, name), ErrCode.SEMANTIC)
 
-    def declareVariable(self, frame, name):
-        if frame == "GF":
-            if name in self.global_var_dict.keys():
-                self.var_redef_error(frame, name)
-            self.global_var_dict[name] = VariableData.empty()
-        elif frame == 'TF':
-            if self.temporary_var_dict == None:
-                self.nonexists_frame_error(frame)
-            if name in self.temporary_var_dict.keys():
-                self.var_redef_error(frame, name)
-            self.temporary_var_dict[name] = VariableData.empty()
-        elif frame == 'LF':
-            if len(self.local_var_dict_stack) == 0:
-                self.nonexists_frame_error(frame)
-            if name in self.local_var_dict_stack[-1].keys():
-                self.var_redef_error(frame, name)
-            self.local_var_dict_stack[-1][name] = VariableData.empty()
+    def declareVariable(self, var):
+        kind = var.frame_kind
+        if kind == FRAME_GF:
+            frame = self.global_frame
+        elif kind == FRAME_LF:
+            frame = self.local_frame
+            if frame == None:
+                self.nonexists_frame_error(var.frame)
+        elif kind == FRAME_TF:
+            frame = self.temporary_frame
+            if frame == None:
+                self.nonexists_frame_error(var.frame)
         else:
-            self.label_name_error(frame)
+            self.label_name_error(var.frame)
+
+        if frame[var.slot] != None:
+            self.var_redef_error(var.frame, var.name)
+        frame[var.slot] = VariableData.empty()
+
+    def callLabel(self, target):
+        depth = self.call_depth
+        if depth == len(self.call_stack):
+            if depth >= self.max_call_depth:
+                ResourceGovernor.exceeded('call depth limit of {} calls reached'.format(self.max_call_depth))
+            self.call_stack.extend([0] * min(depth, self.max_call_depth - depth))
+        self.call_stack[depth] = self.program_counter
+        self.call_depth = depth + 1
+        self.program_counter = target
 
-    def declareLabel(self, label):
-        if label in self.label_dict.keys():
+    def returnLabel(self):
+        if self.call_depth == 0:
             ErrorHandler.error_exit(
-                'label redeclaration [{}]'.format(label), ErrCode.SEMANTIC)
-        self.label_dict[label] = self.program_counter
+                'return label empty call stack', ErrCode.UNINITIALIZED_VAR)  # TODO is this right?
+        self.call_depth -= 1
+        self.program_counter = self.call_stack[self.call_depth]
 
-    def jumpLabel(self, label):
-        if label not in self.label_dict.keys():
-            ErrorHandler.error_exit(
-                'label is undefined [{}]'.format(label), ErrCode.SEMANTIC)
-        self.program_counter = self.label_dict[label]
+    # a frame is owned by exactly one of TF or local_frame_stack, so frames are moved between
+    # them and the one that is dropped goes back to frame_pool
 
-    def callLabel(self, label):
-        self.call_program_counter = self.program_counter
-        self.jumpLabel(label)
+    def newFrame(self):
+        if self.frame_pool:
+            return self.frame_pool.pop()
+        return self.blank_frame[:]
 
-    def returnLabel(self):
-        if self.call_program_counter != None:
-            self.program_counter = self.call_program_counter
-            self.call_program_counter = None
-        else:
-            ErrorHandler.error_exit(
-                'return label empty call stack', ErrCode.UNINITIALIZED_VAR)  # TODO is this right?
+    def releaseFrame(self, frame):
+        if frame != None and len(self.frame_pool) < FRAME_POOL_SIZE:
+            frame[:] = self.blank_frame
+            self.frame_pool.append(frame)
 
     def createFrame(self):
-        self.temporary_var_dict = {}
+        self.releaseFrame(self.temporary_frame)
+        self.temporary_frame = self.newFrame()
 
     def pushFrame(self):
-        if self.temporary_var_dict == None:
+        if self.temporary_frame == None:
             self.nonexists_frame_error('TF')
-        self.local_var_dict_stack.append(
-            copy.deepcopy(self.temporary_var_dict))
-        self.temporary_var_dict = None
+        if len(self.local_frame_stack) >= self.max_frames:
+            self.frame_limit_error()
+        self.local_frame = self.temporary_frame
+        self.local_frame_stack.append(self.local_frame)
+        self.temporary_frame = None
 
     def popFrame(self):
-        if len(self.local_var_dict_stack) == 0:
+        if self.local_frame == None:
             self.nonexists_frame_error('LF')
-        self.temporary_var_dict = self.local_var_dict_stack.pop()
+        self.releaseFrame(self.temporary_frame)
+        self.temporary_frame = self.local_frame_stack.pop()
+        self.local_frame = self.local_frame_stack[-1] if self.local_frame_stack else None
+
+    def createPushFrame(self):  # CREATEFRAME directly followed by PUSHFRAME
+        if len(self.local_frame_stack) >= self.max_frames:
+            self.frame_limit_error()
+        self.releaseFrame(self.temporary_frame)
+        self.local_frame = self.newFrame()
+        self.local_frame_stack.append(self.local_frame)
+        self.temporary_frame = None
 
 
 class ArgumentXML:#argument parsed from xml
@@ -203,34 +493,49 @@ class ArgumentXML:#argument parsed from xml
 
 
 class Arg_Symb:
+    __slots__ = ()
+
     def __init__(self):
         pass
 
 
 class Arg_Var(Arg_Symb):
+    __slots__ = ('name', 'frame', 'frame_kind', 'slot')
+
     def __init__(self, name, frame):
         self.name = name
         self.frame = frame
+        self.frame_kind = FRAME_KINDS.get(frame, FRAME_UNKNOWN)
+        self.slot = None  # index into the frame, assigned by SlotResolver
 
 
 class Arg_Literal(Arg_Symb):
+    __slots__ = ('type', 'value', 'data')
+
     def __init__(self, typpe, value):
         self.type = typpe
         self.value = value
+        self.data = VariableData(typpe, value)# built once, shared by every read
 
 
 class Arg_Label:
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
 
 class Arg_Type:
+    __slots__ = ('type',)
+
     def __init__(self, typpe):
         self.type = typpe
 
 
 class Ins:
     expected_args = None
+    proven_types = {}  # (frame kind, slot) -> VariableType of operands TypeInference proved, read only
+    unchecked = False  # TypeInference proved the type check always passes, see runner
 
     def __init__(self, args):
         self.args = args
@@ -247,12 +552,18 @@ class Ins:
     def execute(self, program_context):
         pass
 
+    def runner(self):  # what runs the instruction, chosen once the program is analysed
+        return self.executeUnchecked if self.unchecked else self.execute
+
+    def compile(self, compiler):  # python source lines of the instruction body, None keeps runner
+        return None
+
     @staticmethod
     def getDataFromSymbArg(arg, program_context):# either read from memory if var, or get literal value
         if isinstance(arg, Arg_Var):
-            return program_context.readVariable(arg.frame, arg.name)
+            return program_context.readVariable(arg)
         elif isinstance(arg, Arg_Literal):
-            return VariableData(arg.type, arg.value)
+            return arg.data
         else:
             ErrorHandler.error_exit(
                 'bad instruction argument type', ErrCode.NONEXISTS_FRAME)  # TODO is this right?
@@ -263,18 +574,27 @@ class Ins_CREATEFRAME(Ins):
     def execute(self, program_context):
         program_context.createFrame()
 
+    def compile(self, compiler):
+        return ['ctx.createFrame()']
+
 
 class Ins_PUSHFRAME(Ins):
     expected_args = []
     def execute(self, program_context):
         program_context.pushFrame()
 
+    def compile(self, compiler):
+        return ['ctx.pushFrame()']
+
 
 class Ins_POPFRAME(Ins):
     expected_args = []
     def execute(self, program_context):
         program_context.popFrame()
 
+    def compile(self, compiler):
+        return ['ctx.popFrame()']
+
 
 class Ins_BaseFun(Ins):
     def execute(self, program_context):
@@ -293,16 +613,47 @@ class Ins_BaseFun1(Ins_BaseFun):
 
         data_out = self.perform_calculation(var_data)
 
-        program_context.writeVariable(
-            self.args[0].frame, self.args[0].name, data_out)
+        program_context.writeVariable(self.args[0], data_out)
 
     def check_types_match(self, var_data, type):
         if var_data.type != type:
             self.arg_type_error()
 
+    def allowsTypes(self, type1):  # whether the type check passes
+        return type1 == self.operand_type
+
+    def executeUnchecked(self, program_context):  # execute for an operand type proven by TypeInference
+        var_data = Ins.getDataFromSymbArg(
+            self.args[1], program_context)
+        program_context.writeVariable(self.args[0], self.uncheckedResult(var_data))
+
+    def uncheckedResult(self, var_data):
+        return VariableData(self.result_type, self.operation(var_data.value))
+
     def perform_calculation(self, var_data):
         pass
 
+    # compiled form, expression is python code of the operation with {0} as the operand
+    operand_type = None
+    result_type = None
+    expression = None
+
+    def compile(self, compiler):
+        if self.expression == None:
+            return None
+        lines, a = compiler.operand(self.args[1], 'a')
+        lines += compiler.requireTypes([(a, self.operand_type)])
+        lines += self.compileOperation(compiler, a)
+        lines += compiler.store(self.args[0], 'r')
+        return lines
+
+    def compileGuard(self, compiler, a):  # value checks the operation needs, the type already matches
+        return []
+
+    def compileOperation(self, compiler, a):
+        return self.compileGuard(compiler, a) + ['r = VariableData({}, {})'.format(
+            self.result_type.name, self.expression.format(a.value))]
+
 
 class Ins_BaseFun2(Ins_BaseFun):
     expected_args = [Arg_Var, Arg_Symb, Arg_Symb]
@@ -314,18 +665,64 @@ class Ins_BaseFun2(Ins_BaseFun):
 
         data_out = self.perform_calculation(var_data1, var_data2)
 
-        program_context.writeVariable(
-            self.args[0].frame, self.args[0].name, data_out)
+        program_context.writeVariable(self.args[0], data_out)
 
     def check_types_match(self, var_data1, var_data2, type1, type2):
         if var_data1.type != type1 or var_data2.type != type2:
             self.arg_type_error()
 
+    def check_operand_types(self, type1, type2):
+        if type1 != self.operand_types[0] or type2 != self.operand_types[1]:
+            self.arg_type_error()
+
+    def allowsTypes(self, type1, type2):  # whether the type check passes
+        return type1 == self.operand_types[0] and type2 == self.operand_types[1]
+
+    def executeUnchecked(self, program_context):  # execute for operand types proven by TypeInference
+        var_data1 = Ins.getDataFromSymbArg(
+            self.args[1], program_context)
+        var_data2 = Ins.getDataFromSymbArg(
+            self.args[2], program_context)
+        program_context.writeVariable(self.args[0], self.uncheckedResult(var_data1, var_data2))
+
+    def uncheckedResult(self, var_data1, var_data2):
+        return VariableData(self.result_type, self.operation(var_data1.value, var_data2.value))
+
     def perform_calculation(self, var_data1, var_data2):
         pass
 
+    # compiled form, expression is python code of the operation with {0} and {1} as operands
+    operand_types = None
+    result_type = None
+    expression = None
+
+    def compile(self, compiler):
+        if self.expression == None:
+            return None
+        lines, a = compiler.operand(self.args[1], 'a')
+        lines2, b = compiler.operand(self.args[2], 'b')
+        lines += lines2
+        lines += self.compileCheck(compiler, a, b)
+        lines += self.compileOperation(compiler, a, b)
+        lines += compiler.store(self.args[0], 'r')
+        return lines
+
+    def compileCheck(self, compiler, a, b):
+        return compiler.requireTypes(
+            [(a, self.operand_types[0]), (b, self.operand_types[1])])
+
+    def compileGuard(self, compiler, a, b):  # value checks the operation needs, types already match
+        return []
+
+    def compileOperation(self, compiler, a, b):
+        return self.compileGuard(compiler, a, b) + ['r = VariableData({}, {})'.format(
+            self.result_type.name, self.expression.format(a.value, b.value))]
+
 
 class Ins_BaseFun2Arithmetic(Ins_BaseFun2):
+    operand_types = (VariableType.INT, VariableType.INT)
+    result_type = VariableType.INT
+
     def perform_calculation(self, var_data1, var_data2):
         self.check_types_match(var_data1, var_data2, VariableType.INT, VariableType.INT)
         value = self.operation(var_data1.value, var_data2.value)
@@ -336,6 +733,9 @@ class Ins_BaseFun2Arithmetic(Ins_BaseFun2):
 
 
 class Ins_BaseFun2Log(Ins_BaseFun2):
+    operand_types = (VariableType.BOOL, VariableType.BOOL)
+    result_type = VariableType.BOOL
+
     def perform_calculation(self, var_data1, var_data2):
         self.check_types_match(var_data1, var_data2,
                                VariableType.BOOL, VariableType.BOOL)
@@ -348,22 +748,39 @@ class Ins_BaseFun2Log(Ins_BaseFun2):
 
 class Ins_BaseFun2Rel(Ins_BaseFun2):  # TODO exetract comparison functionality to JUMPIFEQ
     def perform_calculation(self, var_data1, var_data2):
-        if var_data1.type not in self.get_allowed_types() or var_data2.type not in self.get_allowed_types():
-            self.arg_type_error()
-        if var_data1.type != var_data2.type:
-            if var_data1.type != VariableType.NIL and var_data2.type != VariableType.NIL:
-                self.arg_type_error()
+        self.check_operand_types(var_data1.type, var_data2.type)
         value = self.operation(var_data1.value, var_data2.value)
         return VariableData(VariableType.BOOL, value)
 
+    def check_operand_types(self, type1, type2):
+        if not self.allowsTypes(type1, type2):
+            self.arg_type_error()
+
+    def allowsTypes(self, type1, type2):
+        if type1 not in self.get_allowed_types() or type2 not in self.get_allowed_types():
+            return False
+        return type1 == type2 or type1 == VariableType.NIL or type2 == VariableType.NIL
+
     def get_allowed_types(self):
         return [VariableType.INT, VariableType.BOOL, VariableType.STRING]
 
     def operation(self, a, b):
         pass
 
+    result_type = VariableType.BOOL
+
+    def compileCheck(self, compiler, a, b):
+        if a.literal_type != None and b.literal_type != None:
+            return [] if self.allowsTypes(a.literal_type, b.literal_type) else ['type_error()']
+        allowed = compiler.constant(tuple(self.get_allowed_types()))
+        return ['if {0} not in {2} or {1} not in {2}: type_error()'.format(a.type, b.type, allowed),
+                'if {0} is not {1} and {0} is not NIL and {1} is not NIL: type_error()'.format(
+                    a.type, b.type)]
+
 
 class Ins_EQ(Ins_BaseFun2Rel):  # TODO allow for nil comparison, compare by type first
+    expression = '{0} == {1}'
+
     def get_allowed_types(self):
         return [VariableType.NIL, VariableType.INT, VariableType.BOOL, VariableType.STRING]
 
@@ -372,11 +789,14 @@ class Ins_EQ(Ins_BaseFun2Rel):  # TODO allow for nil comparison, compare by type
 
 
 class Ins_LT(Ins_BaseFun2Rel):
+    expression = '{0} < {1}'
+
     def operation(self, a, b):
         return a < b
 
 
 class Ins_GT(Ins_BaseFun2Rel):
+    expression = '{0} > {1}'
 
     def operation(self, a, b):
         return a > b
@@ -396,25 +816,43 @@ class Ins_SETCHAR(Ins_BaseFun2):
         if var_data0.type != VariableType.STRING:
             self.arg_type_error()
 
-        data_out = var_data0
         index = var_data1.value
         if len(var_data2.value) == 0:
             ErrorHandler.error_exit(
                 'SETCHAR empty char', ErrCode.BAD_STRING_MANIPULATION)
         char = var_data2.value[0]
 
-        if index < 0 or index >= len(data_out.value):
+        if index < 0 or index >= string_length(var_data0):
             ErrorHandler.error_exit(
                 'SETCHAR invalid index', ErrCode.BAD_STRING_MANIPULATION)
 
-        prev_str = data_out.value
-        data_out.value = prev_str[:index] + char + prev_str[index+1:]
+        data_out = StringData.setChar(var_data0, index, char)
+
+        program_context.writeVariable(self.args[0], data_out)
 
-        program_context.writeVariable(
-            self.args[0].frame, self.args[0].name, data_out)
+    def compile(self, compiler):
+        lines, i = compiler.operand(self.args[1], 'a')
+        lines2, c = compiler.operand(self.args[2], 'b')
+        lines3, s = compiler.operand(self.args[0], 's')
+        lines += lines2 + lines3
+        lines += compiler.requireTypes([(i, VariableType.INT), (c, VariableType.STRING)])
+        lines += compiler.requireTypes([(s, VariableType.STRING)])
+        lines += [
+            "if len({}) == 0: ErrorHandler.error_exit('SETCHAR empty char', ErrCode.BAD_STRING_MANIPULATION)".format(c.value),
+            "if {0} < 0 or {0} >= string_length({1}): ErrorHandler.error_exit('SETCHAR invalid index', ErrCode.BAD_STRING_MANIPULATION)".format(i.value, s.data),
+            'r = StringData.setChar({1}, {0}, {2}[0])'.format(i.value, s.data, c.value)]
+        lines += compiler.store(self.args[0], 'r')
+        return lines
 
 
 class Ins_STRI2INT(Ins_BaseFun2):
+    operand_types = (VariableType.STRING, VariableType.INT)
+    result_type = VariableType.INT
+    expression = 'ord({0}[{1}])'
+
+    def compileGuard(self, compiler, a, b):
+        return ["if {1} < 0 or {1} >= len({0}): ErrorHandler.error_exit('STRI2INT wrong index', ErrCode.BAD_STRING_MANIPULATION)".format(a.value, b.value)]
+
     def perform_calculation(self, var_data1, var_data2):
         self.check_types_match(var_data1, var_data2,
                                VariableType.STRING, VariableType.INT)
@@ -429,17 +867,41 @@ class Ins_STRI2INT(Ins_BaseFun2):
 
 
 class Ins_CONCAT(Ins_BaseFun2):
+    operand_types = (VariableType.STRING, VariableType.STRING)
+    result_type = VariableType.STRING
+    expression = '{0} + {1}'
+
+    def appends(self):  # CONCAT x x y grows x, its versions share one StringData character list
+        var, first = self.args[0], self.args[1]
+        return isinstance(first, Arg_Var) and first.frame_kind == var.frame_kind and first.slot == var.slot
+
     def perform_calculation(self, var_data1, var_data2):
         self.check_types_match(var_data1, var_data2,
                                VariableType.STRING, VariableType.STRING)
-        value = self.operation(var_data1.value, var_data2.value)
-        return VariableData(VariableType.STRING, value)
+        return self.uncheckedResult(var_data1, var_data2)
+
+    def uncheckedResult(self, var_data1, var_data2):
+        if self.appends():
+            return StringData.concat(var_data1, var_data2.value)
+        return VariableData(VariableType.STRING, var_data1.value + var_data2.value)
+
+    def compileOperation(self, compiler, a, b):
+        if self.appends():
+            return ['r = StringData.concat({}, {})'.format(a.data, b.value)]
+        return Ins_BaseFun2.compileOperation(self, compiler, a, b)
 
     def operation(self, a, b):
         return a + b
 
 
 class Ins_GETCHAR(Ins_BaseFun2):
+    operand_types = (VariableType.STRING, VariableType.INT)
+    result_type = VariableType.STRING
+    expression = '{0}[{1}]'
+
+    def compileGuard(self, compiler, a, b):
+        return ["if {1} < 0 or {1} >= len({0}): ErrorHandler.error_exit('GETCHAR wrong index', ErrCode.BAD_STRING_MANIPULATION)".format(a.value, b.value)]
+
     def perform_calculation(self, var_data1, var_data2):
         self.check_types_match(var_data1, var_data2,
                                VariableType.STRING, VariableType.INT)
@@ -454,16 +916,29 @@ class Ins_GETCHAR(Ins_BaseFun2):
 
 
 class Ins_STRLEN(Ins_BaseFun1):
+    operand_type = VariableType.STRING
+    result_type = VariableType.INT
+    expression = 'len({0})'
+
     def perform_calculation(self, var_data):
         self.check_types_match(var_data, VariableType.STRING)
-        value = self.operation(var_data.value)
-        return VariableData(VariableType.INT, value)
+        return self.uncheckedResult(var_data)
+
+    def uncheckedResult(self, var_data):
+        return VariableData(VariableType.INT, string_length(var_data))
+
+    def compileOperation(self, compiler, a):
+        return ['r = VariableData(INT, string_length({}))'.format(a.data)]
 
     def operation(self, a):
         return len(a)
 
 
 class Ins_NOT(Ins_BaseFun1):
+    operand_type = VariableType.BOOL
+    result_type = VariableType.BOOL
+    expression = 'not {0}'
+
     def perform_calculation(self, var_data):
         self.check_types_match(var_data, VariableType.BOOL)
         value = self.operation(var_data.value)
@@ -474,6 +949,13 @@ class Ins_NOT(Ins_BaseFun1):
 
 
 class Ins_INT2CHAR(Ins_BaseFun1):
+    operand_type = VariableType.INT
+    result_type = VariableType.STRING
+    expression = 'chr({0})'
+
+    def compileGuard(self, compiler, a):  # the code points chr accepts
+        return ["if {0} < 0 or {0} > 0x10ffff: ErrorHandler.error_exit('INT2CHAR failed', ErrCode.BAD_STRING_MANIPULATION)".format(a.value)]
+
     def perform_calculation(self, var_data):
         self.check_types_match(var_data, VariableType.INT)
         value = self.operation(var_data.value)
@@ -488,37 +970,52 @@ class Ins_INT2CHAR(Ins_BaseFun1):
 
 
 class Ins_AND(Ins_BaseFun2Log):
+    expression = '{0} and {1}'
+
     def operation(self, a, b):
         return a and b
 
 
 class Ins_OR(Ins_BaseFun2Log):
+    expression = '{0} or {1}'
+
     def operation(self, a, b):
         return a or b
 
 
 class Ins_ADD(Ins_BaseFun2Arithmetic):
+    expression = '{0} + {1}'
+
     def operation(self, a, b):
         return a + b
 
 
 class Ins_MUL(Ins_BaseFun2Arithmetic):
+    expression = '{0} * {1}'
+
     def operation(self, a, b):
         return a * b
 
 
 class Ins_SUB(Ins_BaseFun2Arithmetic):
+    expression = '{0} - {1}'
+
     def operation(self, a, b):
         return a - b
 
 
 class Ins_IDIV(Ins_BaseFun2Arithmetic):
+    expression = 'int({0} / {1})'
+
     def operation(self, a, b):
         if b == 0:
             ErrorHandler.error_exit(
                 'IDIV division by 0', ErrCode.OPERAND_VALUE)
         return int(a / b)
 
+    def compileGuard(self, compiler, a, b):
+        return ["if {} == 0: ErrorHandler.error_exit('IDIV division by 0', ErrCode.OPERAND_VALUE)".format(b.value)]
+
 
 class Ins_PUSHS(Ins):
     expected_args = [Arg_Symb]
@@ -526,28 +1023,30 @@ class Ins_PUSHS(Ins):
         data = Ins.getDataFromSymbArg(self.args[0], program_context)
         program_context.pushStack(data)
 
+    def compile(self, compiler):
+        lines, a = compiler.operand(self.args[0], 'a')
+        return lines + ['if len(ctx.stack_types) >= ctx.max_stack: ctx.stack_limit_error()',
+                        'ctx.stack_types.append({})'.format(a.type),
+                        'ctx.stack_values.append({})'.format(a.value)]
+
 
 class Ins_POPS(Ins):
     expected_args = [Arg_Var]
     def execute(self, program_context):
         data = program_context.popStack()
-        program_context.writeVariable(
-            self.args[0].frame, self.args[0].name, data)
+        program_context.writeVariable(self.args[0], data)
+
+    def compile(self, compiler):
+        return ['r = ctx.popStack()'] + compiler.store(self.args[0], 'r')
+
 
+ESCAPE_SEQUENCE = re.compile(r'\\([0-9]{3})')
 
-def escape_string(x):
-    arr = list(bytes(x, 'utf-8'))
 
-    digits = range(48, 57+1)
-    i = 0
-    while i < len(arr)-4:
-        if arr[i] == 92 and arr[i+1] in digits and arr[i+2] in digits and arr[i+3] in digits:
-            num = int(bytes(arr[i+1:i+4]).decode('utf-8'))
-            del arr[i:i+4]
-            arr.insert(i, num)
-        i += 1
-    out = bytes(arr).decode('utf-8')
-    return out
+def escape_string(x):  # replaces \ddd escape sequences with the characters they stand for
+    if '\\' not in x:
+        return x
+    return ESCAPE_SEQUENCE.sub(lambda match: chr(int(match.group(1))), x)
 
 
 class Ins_JumpCon(Ins):
@@ -562,43 +1061,86 @@ class Ins_JumpCon(Ins):
             self.arg_type_error()
         if data1.type != data2.type:
             self.arg_type_error()
-        if self.should_jump(data1, data2):
-            program_context.jumpLabel(self.args[0].name)
+        if self.should_jump(data1.value, data2.value):
+            program_context.program_counter = self.target
 
-    def should_jump(self, data1, data2):
+    def allowsTypes(self, type1, type2):  # whether the type check passes
+        return type1 in [VariableType.BOOL, VariableType.INT, VariableType.STRING, VariableType.NIL] and type1 == type2
+
+    def executeUnchecked(self, program_context):  # execute for operand types proven by TypeInference
+        data1 = Ins.getDataFromSymbArg(self.args[1], program_context)
+        data2 = Ins.getDataFromSymbArg(self.args[2], program_context)
+        if self.should_jump(data1.value, data2.value):
+            program_context.program_counter = self.target
+
+    def should_jump(self, a, b):
         pass
 
+    jump_expression = None  # compiled should_jump, {0} and {1} are the operand values
+
+    def compile(self, compiler):
+        lines, a = compiler.operand(self.args[1], 'a')
+        lines2, b = compiler.operand(self.args[2], 'b')
+        allowed = compiler.constant(
+            (VariableType.BOOL, VariableType.INT, VariableType.STRING, VariableType.NIL))
+        checks = ['if {} not in {}: type_error()'.format(a.type, allowed),
+                  'if {} is not {}: type_error()'.format(a.type, b.type)]
+        if a.literal_type != None and b.literal_type != None:
+            checks = [] if self.allowsTypes(a.literal_type, b.literal_type) else ['type_error()']
+        return lines + lines2 + checks + [
+            'if {}: ctx.program_counter = {}'.format(
+                self.jump_expression.format(a.value, b.value), self.target)]
+
 
 class Ins_JUMPIFNEQ(Ins_JumpCon):
-    def should_jump(self, data1, data2):
-        return data1.value != data2.value
+    jump_expression = '{0} != {1}'
+
+    def should_jump(self, a, b):
+        return a != b
 
 
 class Ins_JUMPIFEQ(Ins_JumpCon):  # TODO proper comparison types etc...
-    def should_jump(self, data1, data2):
-        return data1.value == data2.value
+    jump_expression = '{0} == {1}'
+
+    def should_jump(self, a, b):
+        return a == b
 
 
 class Ins_WRITE(Ins):
     expected_args = [Arg_Symb]
     def execute(self, program_context):
         data = Ins.getDataFromSymbArg(self.args[0], program_context)
+        output_buffer.write(str(Ins_WRITE.formatData(data)))
+
+    @staticmethod
+    def formatData(data):
         if data.type == VariableType.STRING:
-            value = escape_string(data.value)
+            return data.value
         elif data.type == VariableType.BOOL:
-            value = 'true' if data.value == True else 'false'
+            return 'true' if data.value == True else 'false'
         elif data.type == VariableType.NIL:
-            value = ''
-        else:
-            value = data.value
-        print(value, file=sys.stdout, end='')
+            return ''
+        return data.value
+
+    def compile(self, compiler):
+        arg = self.args[0]
+        if isinstance(arg, Arg_Literal):  # output known up front
+            return ['write({!r})'.format(str(Ins_WRITE.formatData(arg.data)))]
+        lines, a = compiler.operand(arg, 'a')
+        return lines + [
+            'if {} is INT: write(str({}))'.format(a.type, a.value),
+            'else: write(str(write_format({})))'.format(a.data)]
 
 
 class Ins_DPRINT(Ins):
     expected_args = [Arg_Symb]
     def execute(self, program_context):
         data = Ins.getDataFromSymbArg(self.args[0], program_context)
-        print(data.value, file=sys.stderr, end='')
+        output_buffer.writeErr(str(data.value))
+
+    def compile(self, compiler):
+        lines, a = compiler.operand(self.args[0], 'a')
+        return lines + ['write_err(str({}))'.format(a.value)]
 
 
 class Ins_EXIT(Ins):
@@ -611,15 +1153,27 @@ class Ins_EXIT(Ins):
         if var_data.value not in range(0, 49+1):
             ErrorHandler.error_exit(
                 'exit code not in range', ErrCode.OPERAND_VALUE)
+        output_buffer.flush()
         sys.exit(var_data.value)
 
+    def compile(self, compiler):
+        lines, a = compiler.operand(self.args[0], 'a')
+        return lines + [
+            "if {} is not INT: ErrorHandler.error_exit('exit wrong operand type', ErrCode.OPERAND_TYPE)".format(a.type),
+            "if {} not in range(0, 49+1): ErrorHandler.error_exit('exit code not in range', ErrCode.OPERAND_VALUE)".format(a.value),
+            'output_buffer.flush()',
+            'sys.exit({})'.format(a.value)]
+
 
 class Ins_DEFVAR(Ins):
     expected_args = [Arg_Var]
     arg_count = 1
 
     def execute(self, program_context):
-        program_context.declareVariable(self.args[0].frame, self.args[0].name)
+        program_context.declareVariable(self.args[0])
+
+    def compile(self, compiler):
+        return compiler.declare(self.args[0])
 
 
 class Ins_MOVE(Ins):
@@ -627,29 +1181,29 @@ class Ins_MOVE(Ins):
 
     def execute(self, program_context):
         data = Ins.getDataFromSymbArg(self.args[1], program_context)
-        program_context.writeVariable(
-            self.args[0].frame, self.args[0].name, data)
+        program_context.writeVariable(self.args[0], data)
+
+    def compile(self, compiler):
+        lines, a = compiler.operand(self.args[1], 'a')
+        return lines + compiler.store(self.args[0], a.data)
 
 
 class Ins_READ(Ins):
     expected_args = [Arg_Var, Arg_Type]
     
     def execute(self, program_context):
-        input_str = program_context.input_stream.readline()
-        input_str = input_str.split('\n')[0]
+        input_str = program_context.input_reader.readLine()
 
         typpe = self.args[1].type
 
         if (input_str == ''):  # TODO organize this
             if typpe == VariableType.STRING:
                 data = VariableData(VariableType.STRING, '')
-                program_context.writeVariable(
-                    self.args[0].frame, self.args[0].name, data)
+                program_context.writeVariable(self.args[0], data)
                 return
 
             data = VariableData(VariableType.NIL, VariableType.NIL)
-            program_context.writeVariable(
-                self.args[0].frame, self.args[0].name, data)
+            program_context.writeVariable(self.args[0], data)
             return
 
         typpe = self.args[1].type
@@ -665,8 +1219,7 @@ class Ins_READ(Ins):
                 typpe = VariableType.NIL
 
         data = VariableData(typpe, value)
-        program_context.writeVariable(
-            self.args[0].frame, self.args[0].name, data)
+        program_context.writeVariable(self.args[0], data)
 
 
 class Ins_TYPE(Ins):
@@ -675,7 +1228,7 @@ class Ins_TYPE(Ins):
         arg = self.args[1]
         type_str = None
         if isinstance(arg, Arg_Var):
-            type_str = program_context.peekVarType(arg.frame, arg.name).value
+            type_str = program_context.peekVarType(arg).value
         elif isinstance(arg, Arg_Literal):
             type_str = arg.type.value
         else:
@@ -683,33 +1236,43 @@ class Ins_TYPE(Ins):
             ErrorHandler.error_exit('TYPE wrong arg', ErrCode.NONEXISTS_FRAME)
 
         data = VariableData(VariableType.STRING, type_str)
-        program_context.writeVariable(
-            self.args[0].frame, self.args[0].name, data)
+        program_context.writeVariable(self.args[0], data)
 
+    def compile(self, compiler):
+        lines, a = compiler.operand(self.args[1], 'a')
+        return lines + ['r = VariableData(STRING, {}.value)'.format(a.type)] + \
+            compiler.store(self.args[0], 'r')
 
-class Ins_LABEL(Ins):
-    expected_args = [Arg_Label]
-    def __init__(self, args):
-        super().__init__(args)
-        self.declared = False
 
-    def execute(self, program_context):
-        if self.declared == True:
-            return
-        program_context.declareLabel(self.args[0].name)
-        self.declared = True
+class Ins_LABEL(Ins):  # removed from the program by ProgramLinker, never executed
+    expected_args = [Arg_Label]
 
 
 class Ins_JUMP(Ins):
     expected_args = [Arg_Label]
     def execute(self, program_context):
-        program_context.jumpLabel(self.args[0].name)
+        program_context.program_counter = self.target
+
+    def compile(self, compiler):
+        return ['ctx.program_counter = {}'.format(self.target)]
 
 
 class Ins_CALL(Ins):
     expected_args = [Arg_Label]
+    def __init__(self, args):
+        super().__init__(args)
+        self.tail = False  # directly followed by RETURN, runs as a jump, see mark_tail_calls
+
     def execute(self, program_context):
-        program_context.callLabel(self.args[0].name)
+        if self.tail:
+            program_context.program_counter = self.target
+        else:
+            program_context.callLabel(self.target)
+
+    def compile(self, compiler):
+        if self.tail:
+            return ['ctx.program_counter = {}'.format(self.target)]
+        return ['ctx.callLabel({})'.format(self.target)]
 
 
 class Ins_RETURN(Ins):
@@ -717,8 +1280,259 @@ class Ins_RETURN(Ins):
     def execute(self, program_context):
         program_context.returnLabel()
 
+    def compile(self, compiler):
+        return ['ctx.returnLabel()']
+
+
+# STACK extension, operands are popped from the data stack (the last one on top) and
+# the result is pushed back, the operation itself is inherited from the register form
+
+class Ins_StackFun1(Ins):
+    expected_args = []
+
+    def execute(self, program_context):
+        types = program_context.stack_types
+        values = program_context.stack_values
+        if len(types) < 1:
+            program_context.stack_underflow_error()
+        if types.pop() != self.operand_type:
+            self.arg_type_error()
+        values.append(self.operation(values.pop()))
+        types.append(self.result_type)
+
+    def compile(self, compiler):
+        a = CompiledOperand(None, 'a', 'a_type')
+        return ['t = ctx.stack_types',
+                'v = ctx.stack_values',
+                'if len(t) < 1: ctx.stack_underflow_error()',
+                'a_type = t.pop()',
+                'a = v.pop()'] + \
+            compiler.requireTypes([(a, self.operand_type)]) + self.compileGuard(compiler, a) + [
+                'v.append({})'.format(self.expression.format(a.value)),
+                't.append({})'.format(self.result_type.name)]
+
+
+class Ins_StackFun2(Ins):
+    expected_args = []
+
+    def execute(self, program_context):
+        types = program_context.stack_types
+        values = program_context.stack_values
+        if len(types) < 2:
+            program_context.stack_underflow_error()
+        type2 = types.pop()
+        value2 = values.pop()
+        type1 = types.pop()
+        value1 = values.pop()
+        self.check_operand_types(type1, type2)
+        values.append(self.operation(value1, value2))
+        types.append(self.result_type)
+
+    def compile(self, compiler):
+        a = CompiledOperand(None, 'a', 'a_type')
+        b = CompiledOperand(None, 'b', 'b_type')
+        return ['t = ctx.stack_types',
+                'v = ctx.stack_values',
+                'if len(t) < 2: ctx.stack_underflow_error()',
+                'b_type = t.pop()',
+                'b = v.pop()',
+                'a_type = t.pop()',
+                'a = v.pop()'] + \
+            self.compileCheck(compiler, a, b) + self.compileGuard(compiler, a, b) + [
+                'v.append({})'.format(self.expression.format(a.value, b.value)),
+                't.append({})'.format(self.result_type.name)]
+
+
+class Ins_StackJumpCon(Ins):
+    expected_args = [Arg_Label]
+
+    def execute(self, program_context):
+        types = program_context.stack_types
+        values = program_context.stack_values
+        if len(types) < 2:
+            program_context.stack_underflow_error()
+        type2 = types.pop()
+        value2 = values.pop()
+        type1 = types.pop()
+        value1 = values.pop()
+        if type1 not in [VariableType.BOOL, VariableType.INT, VariableType.STRING, VariableType.NIL]:
+            self.arg_type_error()
+        if type1 != type2:
+            self.arg_type_error()
+        if self.should_jump(value1, value2):
+            program_context.program_counter = self.target
+
+    def compile(self, compiler):
+        allowed = compiler.constant(
+            (VariableType.BOOL, VariableType.INT, VariableType.STRING, VariableType.NIL))
+        return ['t = ctx.stack_types',
+                'v = ctx.stack_values',
+                'if len(t) < 2: ctx.stack_underflow_error()',
+                'b_type = t.pop()',
+                'b = v.pop()',
+                'a_type = t.pop()',
+                'a = v.pop()',
+                'if a_type not in {}: type_error()'.format(allowed),
+                'if a_type is not b_type: type_error()',
+                'if {}: ctx.program_counter = {}'.format(
+                    self.jump_expression.format('a', 'b'), self.target)]
+
+
+class Ins_CLEARS(Ins):
+    expected_args = []
+    def execute(self, program_context):
+        program_context.clearStack()
+
+    def compile(self, compiler):
+        return ['ctx.clearStack()']
+
+
+class Ins_ADDS(Ins_StackFun2, Ins_ADD):
+    pass
+
+
+class Ins_SUBS(Ins_StackFun2, Ins_SUB):
+    pass
+
+
+class Ins_MULS(Ins_StackFun2, Ins_MUL):
+    pass
+
+
+class Ins_IDIVS(Ins_StackFun2, Ins_IDIV):
+    pass
+
+
+class Ins_LTS(Ins_StackFun2, Ins_LT):
+    pass
+
+
+class Ins_GTS(Ins_StackFun2, Ins_GT):
+    pass
+
+
+class Ins_EQS(Ins_StackFun2, Ins_EQ):
+    pass
+
+
+class Ins_ANDS(Ins_StackFun2, Ins_AND):
+    pass
+
+
+class Ins_ORS(Ins_StackFun2, Ins_OR):
+    pass
+
+
+class Ins_STRI2INTS(Ins_StackFun2, Ins_STRI2INT):
+    pass
+
+
+class Ins_NOTS(Ins_StackFun1, Ins_NOT):
+    pass
+
+
+class Ins_INT2CHARS(Ins_StackFun1, Ins_INT2CHAR):
+    pass
+
+
+class Ins_JUMPIFEQS(Ins_StackJumpCon, Ins_JUMPIFEQ):
+    pass
+
+
+class Ins_JUMPIFNEQS(Ins_StackJumpCon, Ins_JUMPIFNEQ):
+    pass
+
+
+# superinstructions, created by ProgramOptimizer and never parsed from xml
+
+class Ins_CREATEPUSHFRAME(Ins):
+    expected_args = []
+    def execute(self, program_context):
+        program_context.createPushFrame()
+
+    def compile(self, compiler):
+        return ['ctx.createPushFrame()']
+
+
+class Ins_Block(Ins):  # straight run of instructions, only the last one may jump
+    expected_args = []
+
+    def __init__(self, instructions):
+        super().__init__([])
+        self.instructions = instructions
+        self.runs = [ins.execute for ins in instructions]
+
+    def execute(self, program_context):
+        for run in self.runs:
+            run(program_context)
+
+    def runner(self):
+        self.runs = [ins.runner() for ins in self.instructions]
+        return self.execute
+
+    def compile(self, compiler):
+        lines = []
+        for ins in self.instructions:
+            body = compiler.body(ins)
+            if body == None:
+                body = ['{}(ctx)'.format(compiler.constant(ins.runner()))]
+            lines += body
+        return lines
+
 
 class InstructionFactory:
+    ins_class_dict = {
+        "MOVE": Ins_MOVE,
+        "DEFVAR": Ins_DEFVAR,
+        "WRITE": Ins_WRITE,
+        "TYPE": Ins_TYPE,
+        "EXIT": Ins_EXIT,
+        "DPRINT": Ins_DPRINT,
+        "READ": Ins_READ,
+        "LABEL": Ins_LABEL,
+        "JUMP": Ins_JUMP,
+        "CALL": Ins_CALL,
+        "RETURN": Ins_RETURN,
+        "PUSHS": Ins_PUSHS,
+        "POPS": Ins_POPS,
+        "INT2CHAR": Ins_INT2CHAR,
+        "ADD": Ins_ADD,
+        "MUL": Ins_MUL,
+        "AND": Ins_AND,
+        "OR": Ins_OR,
+        "SUB": Ins_SUB,
+        "IDIV": Ins_IDIV,
+        "STRLEN": Ins_STRLEN,
+        "JUMPIFEQ": Ins_JUMPIFEQ,
+        "JUMPIFNEQ": Ins_JUMPIFNEQ,
+        "CREATEFRAME": Ins_CREATEFRAME,
+        "PUSHFRAME": Ins_PUSHFRAME,
+        "POPFRAME": Ins_POPFRAME,
+        "CONCAT": Ins_CONCAT,
+        "STRI2INT": Ins_STRI2INT,
+        "GETCHAR": Ins_GETCHAR,
+        "EQ": Ins_EQ,
+        "LT": Ins_LT,
+        "GT": Ins_GT,
+        "NOT": Ins_NOT,
+        "SETCHAR": Ins_SETCHAR,
+        "CLEARS": Ins_CLEARS,
+        "ADDS": Ins_ADDS,
+        "SUBS": Ins_SUBS,
+        "MULS": Ins_MULS,
+        "IDIVS": Ins_IDIVS,
+        "LTS": Ins_LTS,
+        "GTS": Ins_GTS,
+        "EQS": Ins_EQS,
+        "ANDS": Ins_ANDS,
+        "ORS": Ins_ORS,
+        "NOTS": Ins_NOTS,
+        "INT2CHARS": Ins_INT2CHARS,
+        "STRI2INTS": Ins_STRI2INTS,
+        "JUMPIFEQS": Ins_JUMPIFEQS,
+        "JUMPIFNEQS": Ins_JUMPIFNEQS,
+    }
+    opcode_dict = {cls: opcode for opcode, cls in ins_class_dict.items()}
 
     @staticmethod
     def parseArg(arg):
@@ -737,7 +1551,7 @@ class InstructionFactory:
             val = arg.textval
             if val == None:
                 val = ''
-            return Arg_Literal(VariableType.STRING, val)
+            return Arg_Literal(VariableType.STRING, escape_string(val))
         elif arg.typename == 'bool':
             val = None
             if arg.textval == 'true':
@@ -769,42 +1583,7 @@ class InstructionFactory:
     @staticmethod
     def create_instruction(opcode, args):  # add args to constructor
         args = list(map(InstructionFactory.parseArg, args))
-        ins_class_dict = {
-            "MOVE": Ins_MOVE,
-            "DEFVAR": Ins_DEFVAR,
-            "WRITE": Ins_WRITE,
-            "TYPE": Ins_TYPE,
-            "EXIT": Ins_EXIT,
-            "DPRINT": Ins_DPRINT,
-            "READ": Ins_READ,
-            "LABEL": Ins_LABEL,
-            "JUMP": Ins_JUMP,
-            "CALL": Ins_CALL,
-            "RETURN": Ins_RETURN,
-            "PUSHS": Ins_PUSHS,
-            "POPS": Ins_POPS,
-            "INT2CHAR": Ins_INT2CHAR,
-            "ADD": Ins_ADD,
-            "MUL": Ins_MUL,
-            "AND": Ins_AND,
-            "OR": Ins_OR,
-            "SUB": Ins_SUB,
-            "IDIV": Ins_IDIV,
-            "STRLEN": Ins_STRLEN,
-            "JUMPIFEQ": Ins_JUMPIFEQ,
-            "JUMPIFNEQ": Ins_JUMPIFNEQ,
-            "CREATEFRAME": Ins_CREATEFRAME,
-            "PUSHFRAME": Ins_PUSHFRAME,
-            "POPFRAME": Ins_POPFRAME,
-            "CONCAT": Ins_CONCAT,
-            "STRI2INT": Ins_STRI2INT,
-            "GETCHAR": Ins_GETCHAR,
-            "EQ": Ins_EQ,
-            "LT": Ins_LT,
-            "GT": Ins_GT,
-            "NOT": Ins_NOT,
-            "SETCHAR": Ins_SETCHAR,
-        }
+        ins_class_dict = InstructionFactory.ins_class_dict
 
         if opcode not in ins_class_dict.keys():
             ErrorHandler.error_exit(
@@ -812,68 +1591,656 @@ class InstructionFactory:
 
         return ins_class_dict[opcode](args)
 
+    @staticmethod
+    def opcodeOf(ins):
+        return InstructionFactory.opcode_dict[type(ins)]
 
-class CustomParser(argparse.ArgumentParser):
-    def print_help(self, file=None):
-        print("IPPCode23 interpret")
-        print("run with:")
-        print("  python3 interpret.py ARGS")
-        print("  ARGS:")
-        print("    --help prints this message")
-        print("    --source=SOURCE IPPCode23 source file")
-        print("    --input=INPUT input file to read from")
-        print("    by default INPUT = stdin and SOURCE = stdin")
-        print("    so atleast one must be specified")
 
+class CompiledOperand:  # symb operand inside compiled code, all fields are python expressions
+    def __init__(self, data, value, typpe, literal_type=None):
+        self.data = data
+        self.value = value
+        self.type = typpe
+        self.literal_type = literal_type  # type known at compile time, of a literal or proven by TypeInference
 
-def main():
-    # Parse arguments
-    parser = CustomParser()
 
-    parser.add_argument('--source')
-    parser.add_argument('--input')
+class ProgramCompiler:  # --engine=compiled, turns each instruction into a specialised python function
+    def __init__(self):
+        self.namespace = {
+            'sys': sys,
+            'VariableData': VariableData,
+            'ErrorHandler': ErrorHandler,
+            'ErrCode': ErrCode,
+            'UNINIT_DATA': UNINIT_DATA,
+            'StringData': StringData,
+            'string_length': string_length,
+            'type_error': ProgramCompiler.type_error,
+            'write_format': Ins_WRITE.formatData,
+            'output_buffer': output_buffer,
+            'write': output_buffer.write,
+            'write_err': output_buffer.writeErr,
+        }
+        for typpe in VariableType:  # INT, STRING, ... usable by name
+            self.namespace[typpe.name] = typpe
+        self.constant_count = 0
+        self.proven_types = {}  # of the instruction being compiled
 
-    args = parser.parse_args()
+    def body(self, ins, proven_types=None):  # compiled lines of ins, None keeps its runner
+        self.proven_types = ins.proven_types if proven_types == None else proven_types
+        return ins.compile(self)
 
-    source_file_path = args.source
-    input_file_path = args.input
+    @staticmethod
+    def type_error():
+        ErrorHandler.error_exit('instruction bad operand type', ErrCode.OPERAND_TYPE)
 
-    if input_file_path == None and source_file_path == None:
-        ErrorHandler.error_exit(
-            "specify either --source or --input", ErrCode.CMD_ARGS)
+    def constant(self, value):  # name under which value is visible to compiled code
+        name = 'K{}'.format(self.constant_count)
+        self.constant_count += 1
+        self.namespace[name] = value
+        return name
 
-    input_file = sys.stdin
+    def operand(self, arg, target):  # lines loading arg into local target, and the operand
+        if isinstance(arg, Arg_Literal):
+            if isinstance(arg.value, (bool, int, str)):
+                value = repr(arg.value)
+            else:
+                value = self.constant(arg.value)
+            return [], CompiledOperand(self.constant(arg.data), value, arg.type.name, arg.type)
+
+        lines = self.frame(arg, 'nonexists_frame_error')
+        lines += ['{} = f[{}]'.format(target, arg.slot),
+                  'if {} is None: ctx.nonexists_var_error({!r}, {!r})'.format(
+                      target, arg.frame, arg.name)]
+        return lines, CompiledOperand(target, target + '.value', target + '.type',
+                                      self.proven_types.get((arg.frame_kind, arg.slot)))
+
+    def frame(self, var, unknown_error):  # lines putting the frame of var into local f
+        if var.frame_kind == FRAME_GF:
+            return ['f = ctx.global_frame']
+        elif var.frame_kind == FRAME_LF:
+            attr = 'local_frame'
+        elif var.frame_kind == FRAME_TF:
+            attr = 'temporary_frame'
+        else:
+            return ['ctx.{}({!r})'.format(unknown_error, var.frame)]
+        return ['f = ctx.' + attr,
+                'if f is None: ctx.nonexists_frame_error({!r})'.format(var.frame)]
+
+    def store(self, var, data):
+        return self.frame(var, 'label_name_error') + [
+            'if f[{}] is None: ctx.nonexists_var_error({!r}, {!r})'.format(
+                var.slot, var.frame, var.name),
+            'f[{}] = {}'.format(var.slot, data)]
+
+    def declare(self, var):
+        return self.frame(var, 'label_name_error') + [
+            'if f[{}] is not None: ctx.var_redef_error({!r}, {!r})'.format(
+                var.slot, var.frame, var.name),
+            'f[{}] = UNINIT_DATA'.format(var.slot)]
+
+    def requireTypes(self, checks):  # checks are (operand, VariableType) pairs
+        conditions = []
+        for operand, typpe in checks:
+            if operand.literal_type == None:
+                conditions.append('{} is not {}'.format(operand.type, typpe.name))
+            elif operand.literal_type != typpe:
+                return ['type_error()']
+        if len(conditions) == 0:
+            return []
+        return ['if {}: type_error()'.format(' or '.join(conditions))]
 
-    # if path specified open file else stdin
-    if input_file_path != None:
-        try:
-            input_file = open(input_file_path)
-        except Exception:
-            ErrorHandler.error_exit(
-                'could not open a file [{}]'.format(input_file_path), ErrCode.OPEN_INPUT_FILE)
+    @staticmethod
+    def dropFrameReloads(lines):  # frame of f loaded again with no frame instruction in between
+        out = []
+        loaded = None
+        skip_check = False
+        for line in lines:
+            if skip_check and line.startswith('if f is None'):
+                skip_check = False
+                continue
+            skip_check = False
+            if line.startswith('f = '):
+                if line == loaded:
+                    skip_check = True
+                    continue
+                loaded = line
+            elif 'Frame()' in line or '(ctx)' in line:
+                loaded = None
+            out.append(line)
+        return out
+
+    def compile(self, instructions):  # returns a callable per instruction, taking the context
+        source = []
+        for index, ins in enumerate(instructions):
+            body = self.body(ins)
+            if body == None:
+                continue
+            source.append('def _i{}(ctx):'.format(index))
+            source.extend('    ' + line for line in ProgramCompiler.dropFrameReloads(body))
+
+        exec(compile('\n'.join(source), '<compiled IPPcode23>', 'exec'), self.namespace)
+
+        return [self.namespace.get('_i{}'.format(index)) or ins.runner()
+                for index, ins in enumerate(instructions)]
+
+
+class ProgramOptimizer:  # -O LEVEL, rewrites the sorted instruction list into fewer instructions
+    # after these control may continue elsewhere, so they end a basic block
+    block_enders = (Ins_JUMP, Ins_JumpCon, Ins_CALL, Ins_RETURN, Ins_EXIT)
+
+    def __init__(self, level, stack_limit=False):
+        self.level = level
+        self.stack_limit = stack_limit  # --max-stack is checked by every PUSHS, so PUSHS+POPS stays unfused
+        self.eliminated = 0
+
+    def optimize(self, instructions):
+        if self.level < 1:
+            return instructions
+
+        out = []
+        for block in self.basicBlocks(self.dropJumpsToNext(instructions)):
+            block = self.peephole(block)
+            if self.level >= 2 and len(block) > 1:
+                block = [Ins_Block(block)]
+            out += block
+
+        self.eliminated = len(instructions) - len(out)
+        return out
+
+    def dropJumpsToNext(self, instructions):  # JUMP to the label right after it
+        out = []
+        for i in range(0, len(instructions)):
+            ins = instructions[i]
+            if isinstance(ins, Ins_JUMP) and i+1 < len(instructions):
+                next_ins = instructions[i+1]
+                if isinstance(next_ins, Ins_LABEL) and next_ins.args[0].name == ins.args[0].name:
+                    continue
+            out.append(ins)
+        return out
+
+    def basicBlocks(self, instructions):
+        # labels stay on their own, jumps land on their index and continue after them
+        block = []
+        for ins in instructions:
+            if isinstance(ins, Ins_LABEL):
+                if len(block) > 0:
+                    yield block
+                yield [ins]
+                block = []
+                continue
+            block.append(ins)
+            if isinstance(ins, self.block_enders):
+                yield block
+                block = []
+        if len(block) > 0:
+            yield block
+
+    def peephole(self, block):
+        out = []
+        for ins in block:
+            prev = out[-1] if len(out) > 0 else None
+            if isinstance(prev, Ins_CREATEFRAME) and isinstance(ins, Ins_PUSHFRAME):
+                out[-1] = Ins_CREATEPUSHFRAME([])
+            elif isinstance(prev, Ins_PUSHS) and isinstance(ins, Ins_POPS) and not self.stack_limit:
+                out[-1] = Ins_MOVE([ins.args[0], prev.args[0]])
+            else:
+                out.append(ins)
 
-    if source_file_path == None:
-        source_file_path = sys.stdin
+        # loop tests, up to two calculations feeding a conditional jump run as one instruction
+        if len(out) > 1 and isinstance(out[-1], Ins_JumpCon):
+            start = len(out) - 1
+            while start > 0 and len(out) - start < 3 and isinstance(out[start-1], Ins_BaseFun2):
+                start -= 1
+            if start < len(out) - 1:
+                out[start:] = [Ins_Block(out[start:])]
+        return out
 
-    try:
-        tree = ET.parse(source_file_path)
-    except Exception:
-        ErrorHandler.error_exit('could not parse xml', ErrCode.FORMAT_XML)
 
-    root = tree.getroot()
+class ProgramLinker:  # drops LABEL instructions and gives every jump the index of its target
+    jumps = (Ins_JUMP, Ins_CALL, Ins_JumpCon)
 
-    instructions = []
-    # go through xml instruction and instantate instruction objects
-    for ins_obj in root:
-        if ins_obj.tag != 'instruction':
-            ErrorHandler.error_exit('bad instruction tag', ErrCode.BAD_XML)
+    def link(self, instructions):
+        targets = {}
+        linked = []
+        for ins in instructions:
+            if isinstance(ins, Ins_LABEL):
+                name = ins.args[0].name
+                if name in targets:
+                    ErrorHandler.error_exit(
+                        'label redeclaration [{}]'.format(name), ErrCode.SEMANTIC)
+                targets[name] = len(linked) - 1  # the main loop steps past the target, onto the labelled instruction
+            else:
+                linked.append(ins)
 
-        total_args = len(ins_obj)
-        ins_args = [None for x in range(total_args)]
+        for jump in self.jumpsIn(linked):
+            name = jump.args[0].name
+            if name not in targets:
+                ErrorHandler.error_exit(
+                    'label is undefined [{}]'.format(name), ErrCode.SEMANTIC)
+            jump.target = targets[name]
+        return linked
+
+    def jumpsIn(self, instructions):  # blocks from -O2 may hold the fused loop tests of -O1
+        for ins in instructions:
+            if isinstance(ins, Ins_Block):
+                yield from self.jumpsIn(ins.instructions)
+            elif isinstance(ins, self.jumps):
+                yield ins
+
+
+TYPE_BITS = {VariableType.INT: 1, VariableType.BOOL: 2, VariableType.STRING: 4, VariableType.NIL: 8,
+             VariableType.UNINIT: 16}
+
+
+class TypeInference:  # dataflow over the linked program, proves operand types so the type checks can go
+    # the state before an instruction maps (frame kind, slot) of a variable to the bit set of types it can
+    # hold there, a variable missing from the state may hold anything or not exist at all
+    BITS = TYPE_BITS
+    TYPES = {bit: typpe for typpe, bit in TYPE_BITS.items()}
+    ANY = 31
+    TYPES_OF = [[typpe for typpe, bit in TYPE_BITS.items() if bits & bit] for bits in range(ANY + 1)]
+    READ_RESULTS = {VariableType.INT: 1 | 8, VariableType.BOOL: 2 | 8, VariableType.STRING: 4,
+                    VariableType.NIL: 8}  # as Ins_READ gives them, nil for a missing or bad line
+
+    checked = (Ins_BaseFun2Arithmetic, Ins_BaseFun2Log, Ins_BaseFun2Rel, Ins_CONCAT, Ins_STRI2INT, Ins_GETCHAR,
+               Ins_BaseFun1, Ins_JumpCon)  # instructions with executeUnchecked
+    stack_instructions = (Ins_StackFun1, Ins_StackFun2, Ins_StackJumpCon, Ins_CLEARS)
+    no_writes = (Ins_WRITE, Ins_DPRINT, Ins_EXIT, Ins_PUSHS, Ins_JUMP, Ins_JumpCon, Ins_CALL, Ins_RETURN)
+
+    def __init__(self):
+        self.proven = 0  # instructions running without their type check
+        self.errors = []  # instructions failing their type check whenever they run
+        self.effects = {}  # class -> effectOf its instructions
+        self.checked_classes = {}  # class -> whether its instructions have a type check to prove
+
+    def analyze(self, instructions):
+        return_sites = [index + 1 for index, ins in enumerate(instructions)
+                        if isinstance(TypeInference.last(ins), Ins_CALL)]
+        ends = TypeInference.blocks(instructions, return_sites)
+        states = self.solve(instructions, ends, return_sites)
+        for start, end in ends.items():
+            if start in states:
+                state = dict(states[start])
+                for index in range(start, end):
+                    self.transfer(instructions[index], state, index)
+
+    @staticmethod
+    def blocks(instructions, return_sites):  # start -> end of every basic block, states are kept per block
+        leaders = set([0] + return_sites)
+        for index, ins in enumerate(instructions):
+            ins = TypeInference.last(ins)
+            if isinstance(ins, (Ins_JUMP, Ins_CALL, Ins_JumpCon)):
+                leaders.add(ins.target + 1)
+            if isinstance(ins, (Ins_JUMP, Ins_CALL, Ins_JumpCon, Ins_RETURN, Ins_EXIT)):
+                leaders.add(index + 1)
+        starts = sorted(leader for leader in leaders if leader < len(instructions))
+        return dict(zip(starts, starts[1:] + [len(instructions)]))
+
+    def solve(self, instructions, ends, return_sites):  # block start -> state before it, for blocks that can run
+        states = {0: {}}
+        work = [0]
+        queued = {0}
+        while len(work) > 0:
+            start = work.pop()
+            queued.discard(start)
+            if start not in ends:
+                continue  # the end of the program
+            state = dict(states[start])
+            end = ends[start]
+            for index in range(start, end):
+                self.transfer(instructions[index], state)
+            for successor in TypeInference.successors(end - 1, instructions[end - 1], return_sites):
+                if TypeInference.merge(states, successor, state) and successor not in queued:
+                    work.append(successor)
+                    queued.add(successor)
+        return states
+
+    @staticmethod
+    def last(ins):  # the instruction deciding where control goes after ins
+        while isinstance(ins, Ins_Block) and len(ins.instructions) > 0:
+            ins = ins.instructions[-1]
+        return ins
+
+    @staticmethod
+    def successors(index, ins, return_sites):
+        ins = TypeInference.last(ins)
+        if isinstance(ins, Ins_RETURN):
+            return return_sites  # any CALL may have led here
+        if isinstance(ins, Ins_EXIT):
+            return []
+        if isinstance(ins, (Ins_JUMP, Ins_CALL)):
+            return [ins.target + 1]
+        if isinstance(ins, Ins_JumpCon):
+            return [index + 1, ins.target + 1]
+        return [index + 1]
+
+    @staticmethod
+    def merge(states, index, state):  # True when the state at index grew
+        old = states.get(index)
+        if old == None:
+            states[index] = dict(state)
+            return True
+        if old == state:
+            return False
+        changed = False
+        for key in list(old):
+            bits = state.get(key)
+            if bits == None:
+                del old[key]
+                changed = True
+            elif bits | old[key] != old[key]:
+                old[key] |= bits
+                changed = True
+        return changed
+
+    @staticmethod
+    def bits(arg, state):
+        if isinstance(arg, Arg_Literal):
+            return TypeInference.BITS[arg.type]
+        return state.get((arg.frame_kind, arg.slot), TypeInference.ANY)
+
+    @staticmethod
+    def assign(state, var, bits):
+        if var.frame_kind != FRAME_UNKNOWN:
+            state[(var.frame_kind, var.slot)] = bits
+
+    @staticmethod
+    def dropFrame(state, kind):  # the variables of kind refer to a frame nothing is known about
+        for key in list(state):
+            if key[0] == kind:
+                del state[key]
+
+    @staticmethod
+    def moveFrame(state, source, destination):  # PUSHFRAME and POPFRAME, source is left without a frame
+        TypeInference.dropFrame(state, destination)
+        for key in list(state):
+            if key[0] == source:
+                state[(destination, key[1])] = state.pop(key)
+
+    @staticmethod
+    def effectOf(ins):  # what ins does to variable types, decided once per class
+        if isinstance(ins, Ins_Block):
+            return 'block'
+        if isinstance(ins, TypeInference.stack_instructions) or isinstance(ins, TypeInference.no_writes):
+            return 'none'
+        for classes, effect in [(Ins_DEFVAR, 'defvar'), (Ins_MOVE, 'move'), (Ins_READ, 'read'),
+                                ((Ins_TYPE, Ins_SETCHAR), 'string'), ((Ins_BaseFun1, Ins_BaseFun2), 'result'),
+                                (Ins_CREATEFRAME, 'createframe'), (Ins_PUSHFRAME, 'pushframe'),
+                                (Ins_POPFRAME, 'popframe'), (Ins_CREATEPUSHFRAME, 'createpushframe')]:
+            if isinstance(ins, classes):
+                return effect
+        return 'any'  # POPS and anything new, the variables it writes may hold anything
+
+    def transfer(self, ins, state, index=None):  # state after ins, with an index the findings are kept
+        effect = self.effects.get(type(ins))
+        if effect == None:
+            effect = self.effects[type(ins)] = TypeInference.effectOf(ins)
+        if effect == 'block':
+            for member in ins.instructions:
+                self.transfer(member, state, index)
+            return
+        if index != None:
+            self.check(index, ins, state)
+
+        if effect == 'none':
+            return
+        elif effect == 'defvar':
+            TypeInference.assign(state, ins.args[0], TypeInference.BITS[VariableType.UNINIT])
+        elif effect == 'move':
+            TypeInference.assign(state, ins.args[0], TypeInference.bits(ins.args[1], state))
+        elif effect == 'read':
+            TypeInference.assign(state, ins.args[0], TypeInference.READ_RESULTS[ins.args[1].type])
+        elif effect == 'string':
+            TypeInference.assign(state, ins.args[0], TypeInference.BITS[VariableType.STRING])
+        elif effect == 'result':
+            TypeInference.assign(state, ins.args[0], TypeInference.BITS[ins.result_type])
+        elif effect == 'createframe':
+            TypeInference.dropFrame(state, FRAME_TF)
+        elif effect == 'pushframe':
+            TypeInference.moveFrame(state, FRAME_TF, FRAME_LF)
+        elif effect == 'popframe':
+            TypeInference.moveFrame(state, FRAME_LF, FRAME_TF)
+        elif effect == 'createpushframe':
+            TypeInference.dropFrame(state, FRAME_TF)
+            TypeInference.dropFrame(state, FRAME_LF)
+        else:
+            for arg in ins.args:
+                if isinstance(arg, Arg_Var):
+                    state.pop((arg.frame_kind, arg.slot), None)
+
+    def isChecked(self, ins):
+        checked = self.checked_classes.get(type(ins))
+        if checked == None:
+            checked = self.checked_classes[type(ins)] = isinstance(ins, TypeInference.checked) and \
+                not isinstance(ins, TypeInference.stack_instructions)
+        return checked
+
+    @staticmethod
+    def provenTypes(ins, state):  # (frame kind, slot) -> type of the variable operands with a single possible type
+        return {(arg.frame_kind, arg.slot): TypeInference.TYPES[bits]
+                for arg, bits in ((arg, TypeInference.bits(arg, state)) for arg in ins.args[1:])
+                if isinstance(arg, Arg_Var) and bits in TypeInference.TYPES}
+
+    def check(self, index, ins, state):
+        if not self.isChecked(ins):
+            return
+        operands = ins.args[1:]
+        bits = [TypeInference.bits(arg, state) for arg in operands]
+        ins.proven_types = TypeInference.provenTypes(ins, state)
+        allowed = [ins.allowsTypes(*types) for types in itertools.product(
+            *[TypeInference.TYPES_OF[arg_bits] for arg_bits in bits])]
+        if all(allowed):
+            ins.unchecked = True
+            self.proven += 1
+        elif not any(allowed):
+            self.errors.append('instruction {} ({}) always exits with 53'.format(
+                index, ExecutionStats.opcodeOf(ins)))
+
+
+class HotLoop:  # backward jump of a simple loop, counts the iterations and then runs the specialised loop
+    __slots__ = ('loops', 'index', 'start', 'target', 'jump', 'count', 'function')
+
+    def __init__(self, loops, index, start, jump):
+        self.loops = loops
+        self.index = index  # of the jump
+        self.start = start  # first instruction of the loop body
+        self.target = start - 1  # the main loop steps past it
+        self.jump = jump  # the jump as the program ran it before
+        self.count = 0
+        self.function = None
+
+    def counting(self, program_context):
+        self.jump(program_context)
+        if program_context.program_counter == self.target:
+            self.count += 1
+            if self.count >= self.loops.threshold:
+                self.loops.specialise(self, program_context)
+
+    def specialised(self, program_context):  # the first iteration after entering the loop runs the generic path
+        self.jump(program_context)
+        if program_context.program_counter == self.target:
+            self.function(program_context)
+
+
+class HotLoops:  # counts backward jumps while the program runs and compiles the hot loops for the types they see
+    # a loop is simple when its body only jumps back from its last instruction and nothing jumps into it,
+    # so the specialised function runs whole iterations, guarded at the head by the variable types seen
+    # when it got hot, a guard failing hands the iteration back to the generic path
+    inner_jumps = (Ins_JUMP, Ins_JumpCon, Ins_CALL, Ins_RETURN)
+
+    def __init__(self, threshold):
+        self.threshold = threshold  # backward jumps before a loop is specialised
+        self.program = None
+        self.instructions = None
+        self.compiler = None
+        self.inference = TypeInference()
+        self.specialised = 0
+
+    def install(self, instructions, program):  # a copy of program with every simple loop counting its jumps
+        self.instructions = instructions
+        self.program = list(program)
+        entries = set(jump.target + 1 for jump in ProgramLinker().jumpsIn(instructions))
+        for index, ins in enumerate(instructions):
+            jump = TypeInference.last(ins)
+            if not isinstance(jump, (Ins_JUMP, Ins_JumpCon)) or jump.target >= index:
+                continue
+            start = jump.target + 1
+            body = HotLoops.flatten(instructions[start:index + 1])
+            if any(isinstance(member, HotLoops.inner_jumps) for member in body[:-1]):
+                continue
+            if any(entry in entries for entry in range(start + 1, index + 1)):
+                continue
+            self.program[index] = HotLoop(self, index, start, self.program[index]).counting
+        return self.program
+
+    @staticmethod
+    def flatten(instructions):
+        out = []
+        for ins in instructions:
+            if isinstance(ins, Ins_Block):
+                out += HotLoops.flatten(ins.instructions)
+            else:
+                out.append(ins)
+        return out
+
+    @staticmethod
+    def reads(ins):  # variable operands ins reads
+        return [arg for arg, expected in zip(ins.args, ins.expected_args)
+                if expected is Arg_Symb and isinstance(arg, Arg_Var) and arg.frame_kind != FRAME_UNKNOWN]
+
+    @staticmethod
+    def observe(program_context, var):  # the current type of var, None when it does not exist
+        if var.frame_kind == FRAME_GF:
+            frame = program_context.global_frame
+        elif var.frame_kind == FRAME_LF:
+            frame = program_context.local_frame
+        else:
+            frame = program_context.temporary_frame
+        if frame == None or frame[var.slot] == None:
+            return None
+        return frame[var.slot].type
+
+    def specialise(self, loop, program_context):
+        body = HotLoops.flatten(self.instructions[loop.start:loop.index + 1])
+        state = {}  # loop head, the variables the body reads with the types they hold now
+        for ins in body:
+            for var in HotLoops.reads(ins):
+                typpe = HotLoops.observe(program_context, var)
+                if typpe != None:
+                    state[(var.frame_kind, var.slot)] = TypeInference.BITS[typpe]
+        guards = dict(state)
+
+        if self.compiler == None:
+            self.compiler = ProgramCompiler()
+        compiler = self.compiler
+        lines = []
+        for position, ins in enumerate(body):
+            proven_types = ins.proven_types
+            if self.inference.isChecked(ins):
+                proven_types = dict(TypeInference.provenTypes(ins, state))
+                proven_types.update(ins.proven_types)  # proven for every run, not just this one
+            self.inference.transfer(ins, state)
+            if position == len(body) - 1:
+                lines.append('ctx.program_counter = {}'.format(loop.index))
+            ins_lines = compiler.body(ins, proven_types)
+            if ins_lines == None:
+                ins_lines = ['{}(ctx)'.format(compiler.constant(ins.runner()))]
+            lines += ins_lines
+        lines.append('if ctx.program_counter != {}: return'.format(loop.target))
+
+        name = '_loop{}'.format(loop.index)
+        source = ['def {}(ctx):'.format(name), '    while True:']
+        source += ['        ' + line for line in self.guard(guards, loop.target)]
+        source += ['        ' + line for line in ProgramCompiler.dropFrameReloads(lines)]
+        exec(compile('\n'.join(source), '<hot loop {}>'.format(loop.index), 'exec'), compiler.namespace)
+        loop.function = compiler.namespace[name]
+        self.program[loop.index] = loop.specialised
+        self.specialised += 1
+
+    @staticmethod
+    def guard(guards, target):  # lines leaving the loop for the generic path when a type differs
+        lines = []
+        for (kind, slot), bits in sorted(guards.items()):
+            frame = {FRAME_GF: 'ctx.global_frame', FRAME_LF: 'ctx.local_frame', FRAME_TF: 'ctx.temporary_frame'}[kind]
+            condition = 'g[{0}] is None or g[{0}].type is not {1}'.format(slot, TypeInference.TYPES[bits].name)
+            if kind != FRAME_GF:
+                condition = 'g is None or ' + condition
+            lines += ['g = ' + frame,
+                      'if {}: ctx.program_counter = {}; return'.format(condition, target)]
+        return lines
+
+
+class SlotResolver:  # assigns every variable operand a slot in the frame it lives in
+    def __init__(self):
+        self.global_slots = {}
+        self.local_slots = {}  # shared by TF and LF, a pushed TF becomes LF
+
+    def resolve(self, instructions):
+        for ins in instructions:
+            for arg in ins.args:
+                if isinstance(arg, Arg_Var):
+                    self.resolveVar(arg)
+
+    def resolveVar(self, var):
+        if var.frame_kind == FRAME_GF:
+            slots = self.global_slots
+        else:
+            slots = self.local_slots
+        var.slot = slots.setdefault(var.name, len(slots))
+
+
+class XMLLoader:  # streams the xml program, each instruction is built as soon as its element ends
+    def __init__(self, source):
+        self.source = source
+        self.events = None
+        self.orders = set()
+
+    def drain(self):  # malformed xml anywhere takes precedence over errors found while streaming
+        try:
+            for event in self.events:
+                pass
+        except Exception:
+            ErrorHandler.error_exit('could not parse xml', ErrCode.FORMAT_XML)
+
+    def load(self):  # returns instructions sorted by order
+        try:
+            self.events = ET.iterparse(self.source, events=('start', 'end'))
+        except Exception:
+            ErrorHandler.error_exit('could not parse xml', ErrCode.FORMAT_XML)
+
+        ErrorHandler.before_exit = self.drain
+        instructions = []
+        root = None
+        depth = 0
+        try:
+            for event, elem in self.events:
+                if event == 'start':
+                    depth += 1
+                    if root == None:
+                        root = elem
+                    continue
+
+                depth -= 1
+                if depth == 1:  # instruction with all its arguments
+                    instructions.append(self.buildInstruction(elem))
+                    root.clear()
+        except Exception:
+            ErrorHandler.error_exit('could not parse xml', ErrCode.FORMAT_XML)
+        ErrorHandler.before_exit = None
+
+        instructions.sort(key=lambda x: x[1])
+        return list(map(lambda x: x[0], instructions))
+
+    def buildInstruction(self, ins_obj):
+        if ins_obj.tag != 'instruction':
+            ErrorHandler.error_exit('bad instruction tag', ErrCode.BAD_XML)
+
+        total_args = len(ins_obj)
+        ins_args = [None for x in range(total_args)]
 
         for arg_obj in ins_obj:
             tag = arg_obj.tag.strip()
-            if re.match('^arg[1-3]$', tag) == None:
+            if ARG_TAG.match(tag) == None:
                 ErrorHandler.error_exit(
                     'wrong arg tag regex [{}]'.format(tag), ErrCode.BAD_XML)
             arg_index = int(tag[3:])-1
@@ -906,43 +2273,1692 @@ def main():
             ErrorHandler.error_exit(
                 'could not parse order [{}]'.format(order_str), ErrCode.BAD_XML)
 
+        if order < 1:
+            ErrorHandler.error_exit(
+                'order needs to start from 1 or over', ErrCode.BAD_XML)
+        if order in self.orders:
+            ErrorHandler.error_exit('duplicit order', ErrCode.BAD_XML)
+        self.orders.add(order)
+
         ins = InstructionFactory.create_instruction(opcode, ins_args)
-        instructions.append((ins, order))
+        return (ins, order)
+
+
+ARG_TAG = re.compile('^arg[1-3]$')
+
+
+class SourceLoader:  # parses IPPcode23 source text with the same grammar and regexes as parse.php
+    INS_ARG_LIST = {
+        "MOVE": ['Var', 'Symb'],
+        "STRLEN": ['Var', 'Symb'],
+        "TYPE": ['Var', 'Symb'],
+        "DEFVAR": ['Var'],
+        "POPS": ['Var'],
+        "CALL": ['Label'],
+        "LABEL": ['Label'],
+        "JUMP": ['Label'],
+        "PUSHS": ['Symb'],
+        "WRITE": ['Symb'],
+        "EXIT": ['Symb'],
+        "DPRINT": ['Symb'],
+        "ADD": ['Var', 'Symb', 'Symb'],
+        "SUB": ['Var', 'Symb', 'Symb'],
+        "MUL": ['Var', 'Symb', 'Symb'],
+        "IDIV": ['Var', 'Symb', 'Symb'],
+        "LT": ['Var', 'Symb', 'Symb'],
+        "GT": ['Var', 'Symb', 'Symb'],
+        "EQ": ['Var', 'Symb', 'Symb'],
+        "AND": ['Var', 'Symb', 'Symb'],
+        "OR": ['Var', 'Symb', 'Symb'],
+        "NOT": ['Var', 'Symb', 'SymbOpt'],
+        "INT2CHAR": ['Var', 'Symb'],
+        "CONCAT": ['Var', 'Symb', 'Symb'],
+        "STRI2INT": ['Var', 'Symb', 'Symb'],
+        "GETCHAR": ['Var', 'Symb', 'Symb'],
+        "SETCHAR": ['Var', 'Symb', 'Symb'],
+        "READ": ['Var', 'Type'],
+        "JUMPIFEQ": ['Label', 'Symb', 'Symb'],
+        "JUMPIFNEQ": ['Label', 'Symb', 'Symb'],
+        "CREATEFRAME": [],
+        "PUSHFRAME": [],
+        "POPFRAME": [],
+        "RETURN": [],
+        "BREAK": [],
+        "CLEARS": [],
+        "ADDS": [],
+        "SUBS": [],
+        "MULS": [],
+        "IDIVS": [],
+        "LTS": [],
+        "GTS": [],
+        "EQS": [],
+        "ANDS": [],
+        "ORS": [],
+        "NOTS": [],
+        "INT2CHARS": [],
+        "STRI2INTS": [],
+        "JUMPIFEQS": ['Label'],
+        "JUMPIFNEQS": ['Label'],
+    }
+
+    PATTERN_HEADER = re.compile(r'(?i)^\.IPPcode23$')
+    PATTERN_VAR_NAME = r'[a-zA-Z_$&%*!?-]+[a-zA-Z0-9_$&%*!?-]*'
+    PATTERN_VAR = re.compile('^(GF|LF|TF)@' + PATTERN_VAR_NAME + '$')
+    PATTERN_CONST_INT = r'int@(\+|-)?(?i:[0-9]+|0x[0-9a-f]+)'
+    PATTERN_CONST_NIL = '^nil@nil$'
+    PATTERN_CONST_STRING = re.compile('string@*')  # parse.php has the possessive string@*+, same matches
+    PATTERN_CONST_BOOL = 'bool@(true|false)'
+    PATTERN_LIT_NOT_STRING = re.compile(
+        '^(' + PATTERN_CONST_INT + '|' + PATTERN_CONST_NIL + '|' + PATTERN_CONST_BOOL + ')$')
+    PATTERN_TYPE = re.compile('^(int|string|bool)$')
+    PATTERN_LABEL = re.compile('^' + PATTERN_VAR_NAME + '$')
+    PATTERN_BACKSLASH = re.compile(r'\\')
+    PATTERN_ESCAPE = re.compile(r'\\[0-9]{3}')
+    TRIM = ' \t\n\r\0\x0b'  # characters php trim() removes
+
+    def __init__(self, source):
+        self.source = source
+
+    @staticmethod
+    def cutoffCommentAndTrim(line):
+        return line.split('#', 1)[0].strip(SourceLoader.TRIM)
+
+    def readLines(self):
+        try:
+            if isinstance(self.source, str):
+                with open(self.source, 'rb') as source_file:
+                    data = source_file.read()
+            else:
+                data = self.source.read()
+        except OSError:
+            ErrorHandler.error_exit(
+                'could not open a file [{}]'.format(self.source), ErrCode.OPEN_INPUT_FILE)
+        if isinstance(data, bytes):
+            try:
+                data = data.decode('utf-8')
+            except UnicodeDecodeError:
+                ErrorHandler.error_exit('source is not valid utf-8', ErrCode.SYNTAX)
+        return data.split('\n')
+
+    def load(self):  # returns instructions in program order
+        lines = map(SourceLoader.cutoffCommentAndTrim, self.readLines())
+        for line in lines:
+            if line == '':
+                continue
+            if SourceLoader.PATTERN_HEADER.match(line) == None:
+                ErrorHandler.error_exit('invalid header', ErrCode.HEADER)
+            break
+        else:
+            ErrorHandler.error_exit('invalid header', ErrCode.HEADER)
+
+        # the whole source is checked before any instruction is built, like parse.php before the interpreter
+        parsed = []
+        for line in lines:
+            if line == '':
+                continue
+            words = [word for word in line.split(' ') if word != '']  # strtok on spaces only
+            opcode = words[0].upper()
+            if opcode not in SourceLoader.INS_ARG_LIST:
+                ErrorHandler.error_exit('unknown opcode: ' + opcode, ErrCode.OPCODE)
+            arg_kinds = SourceLoader.INS_ARG_LIST[opcode]
+            if len(words) > len(arg_kinds) + 1:
+                ErrorHandler.error_exit('additional operands', ErrCode.SYNTAX)
+
+            args = []
+            for i, kind in enumerate(arg_kinds):
+                word = words[i + 1].strip(SourceLoader.TRIM) if i + 1 < len(words) else ''
+                arg = getattr(self, 'checkArg' + kind)(word)
+                if arg != None:
+                    args.append(arg)
+            parsed.append((opcode, args))
+
+        return [InstructionFactory.create_instruction(opcode, args) for opcode, args in parsed]
+
+    def checkArgVar(self, word):
+        if SourceLoader.PATTERN_VAR.match(word) == None:
+            ErrorHandler.error_exit('invalid <Var>: ' + word, ErrCode.SYNTAX)
+        return ArgumentXML('var', word)
+
+    def checkArgSymbOpt(self, word):
+        if word != '':
+            return self.checkArgSymb(word)
+        return None
+
+    def checkArgSymb(self, word):
+        if SourceLoader.PATTERN_VAR.match(word) != None:
+            return ArgumentXML('var', word)
+        elif SourceLoader.PATTERN_CONST_STRING.search(word) != None:
+            pieces = word.split('@')
+            literal = pieces[1] if len(pieces) > 1 else ''
+            if len(SourceLoader.PATTERN_BACKSLASH.findall(literal)) != len(SourceLoader.PATTERN_ESCAPE.findall(literal)):
+                ErrorHandler.error_exit('invalid string literal: ' + literal, ErrCode.SYNTAX)
+            return ArgumentXML('string', literal)
+        elif SourceLoader.PATTERN_LIT_NOT_STRING.match(word) != None:
+            pieces = word.split('@')
+            return ArgumentXML(pieces[0], pieces[1])
+        ErrorHandler.error_exit('invalid <Symb>: ' + word, ErrCode.SYNTAX)
+
+    def checkArgLabel(self, word):
+        if SourceLoader.PATTERN_LABEL.match(word) == None:
+            ErrorHandler.error_exit('invalid <label>', ErrCode.SYNTAX)
+        return ArgumentXML('label', word)
+
+    def checkArgType(self, word):
+        if SourceLoader.PATTERN_TYPE.match(word) == None:
+            ErrorHandler.error_exit('invalid <type>', ErrCode.SYNTAX)
+        return ArgumentXML('type', word)
+
+
+class ProgramCache:  # validated programs stored on disk under the identity or a hash of their source, LRU by size
+    FORMAT = 1
+    # a source file modified this recently is keyed by a hash of its bytes, an edit within the same
+    # modification time tick that keeps the size would otherwise look like the cached program
+    RECENT_SECONDS = 2
+    LITERAL_VALUES = {VariableType.INT: int, VariableType.STRING: str, VariableType.BOOL: bool, VariableType.NIL: str}
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def defaultDirectory():
+        base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        return os.path.join(base, 'ipp23')
+
+    interpreter_id = None  # identity of interpret.py, computed once, any change to it invalidates every entry
+
+    @staticmethod
+    def interpreter():
+        if ProgramCache.interpreter_id == None:
+            info = os.stat(os.path.abspath(__file__))
+            ProgramCache.interpreter_id = '{} {} {} {} {}'.format(
+                ProgramCache.FORMAT, sys.version, os.path.abspath(__file__), info.st_size, info.st_mtime_ns)
+        return ProgramCache.interpreter_id
+
+    def key(self, source, source_format):  # of source bytes, used for stdin, which has to be read anyway
+        digest = hashlib.sha256()
+        digest.update('{} {}\n'.format(ProgramCache.interpreter(), source_format).encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def fileKey(self, path, source_format):  # of a source file by its identity, it is only read on a miss
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None  # the loader reports the missing source
+        if time.time() - info.st_mtime < ProgramCache.RECENT_SECONDS:
+            return None  # the caller hashes the bytes
+        digest = hashlib.sha256()
+        digest.update('{} {} file {} {} {} {} {}'.format(
+            ProgramCache.interpreter(), source_format, os.path.realpath(path),
+            info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.ippc')
+
+    def load(self, key):  # returns (instructions, global slot count, local slot count) or None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                global_count, local_count, program = marshal.loads(cache_file.read())
+            instructions = [ProgramCache.loadInstruction(ins, global_count, local_count) for ins in program]
+            os.utime(path)  # most recently used
+        except Exception:
+            return None
+        return instructions, global_count, local_count
+
+    def store(self, key, instructions, global_count, local_count):
+        program = [ProgramCache.dumpInstruction(ins) for ins in instructions]
+        path = self.path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            with open(tmp_path, 'wb') as cache_file:
+                cache_file.write(marshal.dumps((global_count, local_count, program)))
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError:
+            pass  # the cache is only an optimisation
+
+    def evict(self):  # removes least recently used programs until the cache fits max_size
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.ippc'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    @staticmethod
+    def dumpInstruction(ins):
+        return (sys.intern(InstructionFactory.opcodeOf(ins)),
+                tuple(ProgramCache.dumpArg(arg) for arg in ins.args))
+
+    @staticmethod
+    def loadInstruction(ins, global_count, local_count):  # ValueError for an entry the Ins_* constructors would exit on
+        opcode, args = ins
+        ins_class = InstructionFactory.ins_class_dict.get(opcode)
+        if ins_class == None or len(args) != len(ins_class.expected_args):
+            raise ValueError
+        args = [ProgramCache.loadArg(arg, global_count, local_count) for arg in args]
+        if not all(isinstance(arg, expected) for arg, expected in zip(args, ins_class.expected_args)):
+            raise ValueError
+        return ins_class(args)
+
+    # names are interned so marshal stores every distinct one just once
+    @staticmethod
+    def dumpArg(arg):
+        if isinstance(arg, Arg_Var):
+            return (sys.intern(arg.name), sys.intern(arg.frame), arg.slot)
+        elif isinstance(arg, Arg_Literal):
+            return (arg.type.name, arg.value)
+        elif isinstance(arg, Arg_Label):
+            return (sys.intern(arg.name),)
+        return (arg.type.name, None, None, None)
+
+    @staticmethod
+    def loadArg(arg, global_count, local_count):  # checked like bytecode, a slot past its frame is a miss
+        if len(arg) == 3:
+            var = Arg_Var(arg[0], arg[1])
+            if var.frame_kind == FRAME_UNKNOWN or type(arg[2]) is not int:
+                raise ValueError
+            if not 0 <= arg[2] < (global_count if var.frame_kind == FRAME_GF else local_count):
+                raise ValueError
+            var.slot = arg[2]
+            return var
+        elif len(arg) == 2:
+            typpe = VariableType[arg[0]]
+            if type(arg[1]) is not ProgramCache.LITERAL_VALUES.get(typpe):
+                raise ValueError
+            return Arg_Literal(typpe, arg[1])
+        elif len(arg) == 1:
+            return Arg_Label(arg[0])
+        typpe = VariableType[arg[0]]
+        if typpe == VariableType.UNINIT:
+            raise ValueError
+        return Arg_Type(typpe)
+
+
+class Bytecode:  # --compile-only / --bytecode, validated program in a flat binary file
+    # layout: header, instruction table, operand table, constant pool
+    # every table has fixed size records so it is read straight from the mapped file
+    MAGIC = b'IPPB'
+    VERSION = 2  # 2 dropped the label table, ProgramLinker links jumps from the LABEL instructions
+    HEADER = struct.Struct('<4sHxxIIIII')  # global slots, local slots, instructions, operands, pool
+    INSTRUCTION = struct.Struct('<BBI')  # opcode, operand count, first operand
+    OPERAND = struct.Struct('<BIII')  # kind and three kind specific fields
+    CONSTANT = struct.Struct('<BI')  # kind, length of the utf-8 bytes following it
+
+    OPERAND_VAR = 0  # name, frame, slot
+    OPERAND_LITERAL = 1  # type, constant or bool value
+    OPERAND_LABEL = 2  # name
+    OPERAND_TYPE = 3  # type
+
+    CONSTANT_STRING = 0
+    CONSTANT_INT = 1
+
+    opcodes = list(InstructionFactory.ins_class_dict.keys())  # opcode byte is the index in the factory table
+    opcode_numbers = {opcode: number for number, opcode in enumerate(opcodes)}
+    types = list(VariableType)
+
+    def __init__(self):
+        self.pool = []
+        self.pool_index = {}
+
+    def constant(self, kind, value):
+        key = (kind, value)
+        if key not in self.pool_index:
+            self.pool_index[key] = len(self.pool)
+            self.pool.append(key)
+        return self.pool_index[key]
+
+    def dumpOperand(self, arg):
+        if isinstance(arg, Arg_Var):
+            return Bytecode.OPERAND.pack(
+                Bytecode.OPERAND_VAR, self.constant(Bytecode.CONSTANT_STRING, arg.name),
+                self.constant(Bytecode.CONSTANT_STRING, arg.frame), arg.slot)
+        elif isinstance(arg, Arg_Literal):
+            value = 0
+            if arg.type == VariableType.STRING:
+                value = self.constant(Bytecode.CONSTANT_STRING, arg.value)
+            elif arg.type == VariableType.INT:
+                value = self.constant(Bytecode.CONSTANT_INT, str(arg.value))
+            elif arg.type == VariableType.BOOL:
+                value = int(arg.value)
+            return Bytecode.OPERAND.pack(
+                Bytecode.OPERAND_LITERAL, Bytecode.types.index(arg.type), value, 0)
+        elif isinstance(arg, Arg_Label):
+            return Bytecode.OPERAND.pack(
+                Bytecode.OPERAND_LABEL, self.constant(Bytecode.CONSTANT_STRING, arg.name), 0, 0)
+        return Bytecode.OPERAND.pack(
+            Bytecode.OPERAND_TYPE, Bytecode.types.index(arg.type), 0, 0)
+
+    def dump(self, instructions, global_count, local_count):
+        instruction_table = []
+        operand_table = []
+        for ins in instructions:
+            instruction_table.append(Bytecode.INSTRUCTION.pack(
+                Bytecode.opcode_numbers[InstructionFactory.opcodeOf(ins)], len(ins.args), len(operand_table)))
+            operand_table.extend(self.dumpOperand(arg) for arg in ins.args)
+
+        pool = []
+        for kind, value in self.pool:
+            encoded = value.encode('utf-8', 'surrogatepass')
+            pool.append(Bytecode.CONSTANT.pack(kind, len(encoded)))
+            pool.append(encoded)
+
+        header = Bytecode.HEADER.pack(
+            Bytecode.MAGIC, Bytecode.VERSION, global_count, local_count,
+            len(instruction_table), len(operand_table), len(self.pool))
+        return b''.join([header] + instruction_table + operand_table + pool)
+
+    @staticmethod
+    def write(path, instructions, global_count, local_count):
+        data = Bytecode().dump(instructions, global_count, local_count)
+        try:
+            with open(path, 'wb') as bytecode_file:
+                bytecode_file.write(data)
+        except OSError:
+            ErrorHandler.error_exit(
+                'could not write a file [{}]'.format(path), ErrCode.OPEN_OUTPUT_FILE)
+
+    @staticmethod
+    def read(path):  # returns (instructions, global slot count, local slot count)
+        try:
+            with open(path, 'rb') as bytecode_file:
+                empty = os.fstat(bytecode_file.fileno()).st_size == 0
+                if not empty:  # mmap refuses empty files
+                    data = mmap.mmap(bytecode_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            ErrorHandler.error_exit(
+                'could not open a file [{}]'.format(path), ErrCode.OPEN_INPUT_FILE)
+        if empty:
+            ErrorHandler.error_exit('corrupted bytecode, empty file', ErrCode.BAD_XML)
+        try:
+            return Bytecode.load(data)
+        except (struct.error, IndexError, KeyError, ValueError):
+            ErrorHandler.error_exit('corrupted bytecode', ErrCode.BAD_XML)
+        finally:
+            data.close()
+
+    @staticmethod
+    def load(data):  # anything dump would not have written raises ValueError or struct.error
+        (magic, version, global_count, local_count,
+         instruction_count, operand_count, pool_count) = Bytecode.HEADER.unpack_from(data, 0)
+        if magic != Bytecode.MAGIC or version != Bytecode.VERSION:
+            ErrorHandler.error_exit('not a bytecode file of this version', ErrCode.BAD_XML)
+
+        offset = Bytecode.HEADER.size
+        instruction_table = Bytecode.table(data, offset, Bytecode.INSTRUCTION, instruction_count)
+        offset += instruction_count * Bytecode.INSTRUCTION.size
+        operand_table = Bytecode.table(data, offset, Bytecode.OPERAND, operand_count)
+        offset += operand_count * Bytecode.OPERAND.size
+
+        pool = []
+        for _ in range(pool_count):
+            kind, length = Bytecode.CONSTANT.unpack_from(data, offset)
+            offset += Bytecode.CONSTANT.size
+            if offset + length > len(data):
+                raise ValueError('truncated constant')
+            value = data[offset:offset + length].decode('utf-8', 'surrogatepass')
+            offset += length
+            if kind == Bytecode.CONSTANT_INT:
+                value = int(value)
+            elif kind != Bytecode.CONSTANT_STRING:
+                raise ValueError('unknown constant kind')
+            pool.append(value)
+        if offset != len(data):
+            raise ValueError('data after the constant pool')
+
+        operands = [Bytecode.loadOperand(operand, pool, global_count, local_count) for operand in operand_table]
+        ins_class_dict = InstructionFactory.ins_class_dict
+        opcodes = Bytecode.opcodes
+        instructions = []
+        for opcode, count, first in instruction_table:
+            if first + count > len(operands):
+                raise ValueError('operand out of range')
+            instructions.append(ins_class_dict[opcodes[opcode]](operands[first:first + count]))
+        return instructions, global_count, local_count
+
+    @staticmethod
+    def table(data, offset, record, count):  # list of count records, a file cut short is corrupted
+        end = offset + count * record.size
+        if end > len(data):
+            raise ValueError('truncated table')
+        return list(record.iter_unpack(data[offset:end]))
+
+    @staticmethod
+    def constantOf(pool, index, kind):  # pool entry used as a str or int operand, of that kind only
+        value = pool[index]
+        if type(value) is not kind:
+            raise ValueError('constant of another kind')
+        return value
+
+    @staticmethod
+    def loadOperand(operand, pool, global_count, local_count):
+        kind, a, b, c = operand
+        if kind == Bytecode.OPERAND_VAR:
+            var = Arg_Var(Bytecode.constantOf(pool, a, str), Bytecode.constantOf(pool, b, str))
+            if var.frame_kind == FRAME_UNKNOWN:
+                raise ValueError('unknown frame')
+            if c >= (global_count if var.frame_kind == FRAME_GF else local_count):
+                raise ValueError('slot out of range')
+            var.slot = c
+            return var
+        elif kind == Bytecode.OPERAND_LITERAL:
+            typpe = Bytecode.types[a]
+            if typpe == VariableType.BOOL:
+                if b > 1:
+                    raise ValueError('bool out of range')
+                return Arg_Literal(typpe, b != 0)
+            elif typpe == VariableType.NIL:
+                return Arg_Literal(typpe, 'nil')
+            elif typpe == VariableType.STRING:
+                return Arg_Literal(typpe, Bytecode.constantOf(pool, b, str))
+            elif typpe == VariableType.INT:
+                return Arg_Literal(typpe, Bytecode.constantOf(pool, b, int))
+            raise ValueError('literal of type ' + typpe.name)
+        elif kind == Bytecode.OPERAND_LABEL:
+            return Arg_Label(Bytecode.constantOf(pool, a, str))
+        elif kind == Bytecode.OPERAND_TYPE:
+            typpe = Bytecode.types[a]
+            if typpe == VariableType.UNINIT:
+                raise ValueError('operand of type ' + typpe.name)
+            return Arg_Type(typpe)
+        raise ValueError('unknown operand kind')
+
+
+class ExecutionStats:  # --stats=FILE, measures in a run loop of its own so the plain loop in main pays nothing
+    HOT_INSTRUCTIONS = 20
+
+    def __init__(self, path, instructions, load_seconds, eliminated=0):
+        self.path = path
+        self.instructions = instructions
+        self.counts = [0] * len(instructions)  # per instruction index
+        self.times = [0.0] * len(instructions)
+        self.peak_stack = 0
+        self.peak_frames = 0
+        self.peak_variables = 0
+        self.load_seconds = load_seconds  # loading, optimising, linking and compiling
+        self.eliminated = eliminated  # by -O
+        self.run_seconds = 0.0
+
+    @staticmethod
+    def opcodeOf(ins):  # superinstructions have no opcode of their own
+        return InstructionFactory.opcode_dict.get(type(ins), type(ins).__name__[4:])
+
+    @staticmethod
+    def declares(ins):  # only DEFVAR adds a live variable, so the count is only redone after one
+        if isinstance(ins, Ins_Block):
+            return any(ExecutionStats.declares(member) for member in ins.instructions)
+        return isinstance(ins, Ins_DEFVAR)
+
+    def run(self, program, program_context):
+        declaring = [ExecutionStats.declares(ins) for ins in self.instructions]
+        counts = self.counts
+        times = self.times
+        clock = time.perf_counter
+        run_start = clock()
+        try:
+            while program_context.program_counter < len(program):
+                index = program_context.program_counter
+                counts[index] += 1  # before running it, EXIT never returns
+                start = clock()
+                program[index](program_context)
+                times[index] += clock() - start
+                if len(program_context.stack_types) > self.peak_stack:
+                    self.peak_stack = len(program_context.stack_types)
+                if len(program_context.local_frame_stack) > self.peak_frames:
+                    self.peak_frames = len(program_context.local_frame_stack)
+                if declaring[index]:
+                    self.countVariables(program_context)
+                program_context.program_counter += 1
+        finally:
+            self.run_seconds = clock() - run_start
+            self.write()
+
+    def countVariables(self, program_context):
+        frames = [program_context.global_frame, program_context.temporary_frame] + \
+            program_context.local_frame_stack
+        live = sum(len(frame) - frame.count(None) for frame in frames if frame != None)
+        if live > self.peak_variables:
+            self.peak_variables = live
+
+    def report(self):
+        opcodes = {}
+        for ins, count, seconds in zip(self.instructions, self.counts, self.times):
+            entry = opcodes.setdefault(ExecutionStats.opcodeOf(ins), {'count': 0, 'seconds': 0.0})
+            entry['count'] += count
+            entry['seconds'] += seconds
+        hot = sorted(range(len(self.counts)), key=lambda index: -self.counts[index])
+        executed = sum(self.counts)
+        return {
+            'instructions_executed': executed,
+            'load_seconds': self.load_seconds,
+            'optimizer_eliminated': self.eliminated,
+            'run_seconds': self.run_seconds,
+            'instructions_per_second': executed / self.run_seconds if self.run_seconds > 0 else 0.0,
+            'opcodes': dict(sorted(opcodes.items(), key=lambda item: -item[1]['count'])),
+            'hot_instructions': [
+                {'index': index, 'opcode': ExecutionStats.opcodeOf(self.instructions[index]),
+                 'count': self.counts[index], 'seconds': self.times[index]}
+                for index in hot[:ExecutionStats.HOT_INSTRUCTIONS] if self.counts[index] > 0],
+            'peak_stack_depth': self.peak_stack,
+            'peak_frame_depth': self.peak_frames,
+            'peak_live_variables': self.peak_variables,
+        }
+
+    def write(self):
+        try:
+            with open(self.path, 'w') as stats_file:
+                json.dump(self.report(), stats_file, indent=1)
+                stats_file.write('\n')
+        except OSError:
+            ErrorHandler.error_exit(
+                'could not write a file [{}]'.format(self.path), ErrCode.OPEN_OUTPUT_FILE)
+
+
+class CallGraphProfiler:  # --profile=FILE, samples the CALL stack every interval instructions
+    # output is collapsed stacks, one "main;label;label;OPCODE count" line per path, as flamegraph.pl reads them
+
+    def __init__(self, path, instructions, interval):
+        self.path = path
+        self.instructions = instructions
+        self.interval = interval
+        self.samples = {}  # (return addresses..., next instruction index) -> samples
+
+    def run(self, program, program_context):
+        samples = self.samples
+        chunk = itertools.repeat
+        try:
+            while program_context.program_counter < len(program):
+                for _ in chunk(None, self.interval):  # counted by the iterator, not by python code
+                    if program_context.program_counter >= len(program):
+                        break
+                    program[program_context.program_counter](program_context)
+                    program_context.program_counter += 1
+                else:
+                    key = tuple(program_context.call_stack[:program_context.call_depth]) + \
+                        (program_context.program_counter,)
+                    samples[key] = samples.get(key, 0) + 1
+        finally:
+            self.write()
+
+    def frameName(self, index):  # label called by the CALL at index, it may close a -O block
+        ins = self.instructions[index]
+        if isinstance(ins, Ins_Block):
+            ins = ins.instructions[-1]
+        return ins.args[0].name
+
+    def leafName(self, index):
+        if index >= len(self.instructions):
+            return 'end'
+        return ExecutionStats.opcodeOf(self.instructions[index])
+
+    def collapsed(self):
+        stacks = {}
+        for key, count in self.samples.items():
+            path = ';'.join(['main'] + [self.frameName(index) for index in key[:-1]] + [self.leafName(key[-1])])
+            stacks[path] = stacks.get(path, 0) + count * self.interval
+        return ['{} {}'.format(path, count) for path, count in sorted(stacks.items())]
+
+    def write(self):
+        try:
+            with open(self.path, 'w') as profile_file:
+                for line in self.collapsed():
+                    profile_file.write(line + '\n')
+        except OSError:
+            ErrorHandler.error_exit(
+                'could not write a file [{}]'.format(self.path), ErrCode.OPEN_OUTPUT_FILE)
+
+
+class ServerWorker:  # forked child running one job of ProgramServer
+    def __init__(self, job_id, reply, stdout_file, stderr_file, deadline):
+        self.job_id = job_id
+        self.reply = reply  # called with the result once the child is reaped
+        self.stdout_file = stdout_file
+        self.stderr_file = stderr_file
+        self.deadline = deadline  # time.monotonic() after which the child is killed, None waits forever
+        self.timed_out = False
+
+    def finish(self, exit_code):
+        result = {
+            'id': self.job_id,
+            'stdout': ServerWorker.readBack(self.stdout_file),
+            'stderr': ServerWorker.readBack(self.stderr_file),
+            'exit_code': exit_code,
+        }
+        if self.timed_out:
+            result['timed_out'] = True
+        self.reply(result)
+
+    @staticmethod
+    def readBack(captured):
+        captured.seek(0)
+        text = captured.read().decode('utf-8', errors='replace')
+        captured.close()
+        return text
+
+
+class ServerClient:  # --serve connection, jobs come one per line and are answered as they finish
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffer = b''
+        self.received = 0  # jobs read so far, numbers the ones without an id
+        self.pending = 0  # jobs not answered yet
+        self.closed = False  # the client sent everything, the connection ends with the last answer
+
+    def reply(self, result):
+        self.pending -= 1
+        try:
+            self.connection.sendall((json.dumps(result) + '\n').encode())
+        except OSError:
+            pass  # the client went away, the job still counted
+        if self.closed and self.pending == 0:
+            self.connection.close()
+
+
+class ProgramServer:  # --serve=SOCKET and --batch, runs jobs in forked workers
+    # a job is a json object on one line:
+    #   {"id": ANY, "source": PATH or "bytecode": PATH, "input": PATH or "input_text": TEXT,
+    #    "limits": {"timeout": SECONDS, "max_call_depth": N}, "args": [OPTION, ...]}
+    # the answer is {"id": ANY, "stdout": TEXT, "stderr": TEXT, "exit_code": N} and "timed_out": true when killed
+    # programs are prepared once in the server and cached, workers fork from it and share them copy-on-write
+    PROGRAM_CACHE_SIZE = 64
+    # options a job may pass in "args" (as --option=VALUE, -O as -OLEVEL), anything writing files or
+    # changing the server is refused, the "limits" are the --max-* ones among them
+    JOB_OPTIONS = ['--source-format', '--engine', '-O', '--output-buffer', '--max-call-depth', '--max-instructions',
+                   '--max-time', '--max-stack', '--max-frames', '--max-memory', '--hot-loop-threshold', '--warn',
+                   '--verbose']
+
+    def __init__(self, args, argv):
+        self.args = args
+        self.argv = argv  # options of the server itself, every job starts from them
+        self.programs = {}  # program key -> (PreparedProgram or None, stderr, exit code), least recently used first
+        self.queue = []  # (job, reply) waiting for a free worker
+        self.running = {}  # pid -> ServerWorker
+        self.clients = {}  # socket -> ServerClient
+        self.batch = None  # --batch, stdin read like a client, its jobs start as their lines arrive
+        self.listener = None  # --serve socket
+        self.wakeup = []  # pipe SIGCHLD writes to
+
+    def serve(self):
+        if self.args.serve != None:
+            self.run(self.listen(self.args.serve))
+            return
+        self.batch = ServerClient(None)
+        self.run(None)
+
+    def run(self, listener):  # until every queued job is answered, or forever with a listener
+        self.listener = listener
+        wakeup_read, wakeup_write = os.pipe()  # SIGCHLD wakes up select through it
+        self.wakeup = [wakeup_read, wakeup_write]
+        os.set_blocking(wakeup_read, False)
+        os.set_blocking(wakeup_write, False)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        signal.set_wakeup_fd(wakeup_write)
+
+        try:
+            self.startWorkers()  # before the loop test, jobs failing to start leave nothing to wait for
+            while listener != None or self.batchOpen() or len(self.queue) > 0 or len(self.running) > 0:
+                watched = [wakeup_read] + list(self.clients)
+                if listener != None:
+                    watched.append(listener)
+                if self.batchOpen():
+                    watched.append(sys.stdin)
+                readable, _, _ = select.select(watched, [], [], self.nextTimeout())
+                for ready in readable:
+                    if ready == wakeup_read:
+                        self.drain(wakeup_read)
+                    elif ready == sys.stdin:
+                        self.readBatch()
+                    elif ready == listener:
+                        connection, _ = listener.accept()
+                        self.clients[connection] = ServerClient(connection)
+                    else:
+                        self.readClient(self.clients[ready])
+                self.reap()
+                self.killExpired()
+                self.startWorkers()
+        finally:
+            signal.set_wakeup_fd(-1)
+            os.close(wakeup_read)
+            os.close(wakeup_write)
+            if listener != None:
+                listener.close()
+                os.unlink(self.args.serve)
+
+    def listen(self, path):
+        try:
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)  # left behind by a server that was killed
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(path)
+            listener.listen()
+        except OSError:
+            ErrorHandler.error_exit(
+                'could not listen on [{}]'.format(path), ErrCode.OPEN_OUTPUT_FILE)
+        return listener
+
+    @staticmethod
+    def drain(fd):
+        try:
+            while os.read(fd, 512):
+                pass
+        except BlockingIOError:
+            pass
+
+    def writeReply(self, result):  # --batch answers go to stdout
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+    def batchOpen(self):
+        return self.batch != None and not self.batch.closed
+
+    def readBatch(self):
+        data = os.read(sys.stdin.fileno(), 65536)
+        if data == b'':
+            self.batch.closed = True
+            self.submitLines(self.batch, [self.batch.buffer], self.writeReply)  # a last line without newline
+            return
+        self.receive(self.batch, data, self.writeReply)
+
+    def readClient(self, client):
+        data = client.connection.recv(65536)
+        if data == b'':
+            del self.clients[client.connection]
+            client.closed = True
+            if client.pending == 0:
+                client.connection.close()
+            return
+        self.receive(client, data, client.reply)
+
+    def receive(self, client, data, reply):  # submits the complete lines, keeps the rest for the next data
+        lines = (client.buffer + data).split(b'\n')
+        client.buffer = lines.pop()
+        self.submitLines(client, lines, reply)
+
+    def submitLines(self, client, lines, reply):
+        for line in lines:
+            if line.strip() != b'':
+                client.received += 1
+                client.pending += 1
+                self.submit(line.decode('utf-8', errors='replace'), client.received, reply)
+
+    def submit(self, line, default_id, reply):
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError
+        except ValueError:
+            reply(ProgramServer.failure(default_id, '', '<ERROR EXIT> bad job [{}]\n'.format(line.strip()),
+                                        ErrCode.CMD_ARGS.value))
+            return
+        job.setdefault('id', default_id)
+        self.queue.append((job, reply))
+
+    @staticmethod
+    def failure(job_id, stdout, stderr, exit_code):  # answer of a job that never got to a worker
+        return {'id': job_id, 'stdout': stdout, 'stderr': stderr, 'exit_code': exit_code}
+
+    def startWorkers(self):
+        while len(self.queue) > 0 and len(self.running) < self.args.workers:
+            job, reply = self.queue.pop(0)
+            self.start(job, reply)
+
+    def start(self, job, reply):
+        captured_out = io.StringIO()
+        captured_err = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(captured_out), contextlib.redirect_stderr(captured_err):
+                argv, timeout = self.jobArguments(job)
+                args = parse_arguments(argv)
+                if args.source == None and args.bytecode == None:
+                    ErrorHandler.error_exit('job without source or bytecode', ErrCode.CMD_ARGS)
+        except SystemExit as exit:
+            reply(ProgramServer.failure(job['id'], captured_out.getvalue(), captured_err.getvalue(), exit.code))
+            return
+
+        prepared, messages, exit_code = self.program(args)
+        if prepared == None:
+            reply(ProgramServer.failure(job['id'], '', messages, exit_code))
+            return
+
+        stdout_file = tempfile.TemporaryFile()
+        stderr_file = tempfile.TemporaryFile()
+        sys.stdout.flush()  # the child would write out whatever is still buffered again
+        sys.stderr.flush()
+        gc.freeze()  # the child keeps the prepared programs out of its collections, their pages stay shared
+        pid = os.fork()
+        if pid == 0:
+            self.runJob(job, args, prepared, messages, stdout_file, stderr_file)
+        gc.unfreeze()  # a long running server must still collect, garbage of earlier jobs included
+
+        deadline = None
+        if timeout != None:
+            deadline = time.monotonic() + timeout
+        self.running[pid] = ServerWorker(job['id'], reply, stdout_file, stderr_file, deadline)
+
+    def jobArguments(self, job):  # command line of a job and its timeout
+        argv = list(self.argv)
+        for key, option in [('source', '--source'), ('bytecode', '--bytecode'),
+                            ('source_format', '--source-format'), ('input', '--input')]:
+            if key in job:
+                argv.append('{}={}'.format(option, job[key]))
+
+        limits = job.get('limits', {})
+        extra = job.get('args', [])
+        if not isinstance(limits, dict) or not isinstance(extra, list):
+            ErrorHandler.error_exit('bad job limits or args', ErrCode.CMD_ARGS)
+        timeout = None
+        for key, value in limits.items():
+            if key == 'timeout':
+                try:
+                    timeout = float(value)
+                except (TypeError, ValueError):
+                    ErrorHandler.error_exit('bad timeout [{}]'.format(value), ErrCode.CMD_ARGS)
+            elif key.startswith('max_') and '--' + key.replace('_', '-') in ProgramServer.JOB_OPTIONS:
+                argv.append('--{}={}'.format(key.replace('_', '-'), value))
+            else:
+                ErrorHandler.error_exit('unknown limit [{}]'.format(key), ErrCode.CMD_ARGS)
+        extra = [str(arg) for arg in extra]
+        for arg in extra:
+            name = '-O' if arg.startswith('-O') else arg.split('=', 1)[0]
+            if name not in ProgramServer.JOB_OPTIONS:
+                ErrorHandler.error_exit('option not allowed in a job [{}]'.format(arg), ErrCode.CMD_ARGS)
+        return argv + extra, timeout
+
+    def program(self, args):  # prepared program for the job, cached by file identity and the options shaping it
+        path = args.bytecode if args.bytecode != None else args.source
+        try:
+            status = os.stat(path)
+            key = (os.path.realpath(path), status.st_mtime_ns, status.st_size, args.bytecode != None,
+                   source_format_of(args), args.engine, args.opt_level, args.max_stack != None, args.warn, args.verbose)
+        except OSError:
+            key = None  # loading reports the missing file
+        if key in self.programs:
+            entry = self.programs.pop(key)
+            self.programs[key] = entry
+            return entry
+
+        captured = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(captured):
+                entry = (prepare_program(args), captured.getvalue(), None)
+        except SystemExit as exit:
+            entry = (None, captured.getvalue(), exit.code)
+        if key != None:
+            self.programs[key] = entry
+            if len(self.programs) > ProgramServer.PROGRAM_CACHE_SIZE:
+                del self.programs[next(iter(self.programs))]
+        return entry
+
+    def runJob(self, job, args, prepared, messages, stdout_file, stderr_file):  # in the child, never returns
+        exit_code = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self.closeInherited()
+            sys.stdout = open(stdout_file.fileno(), 'w', encoding='utf-8', closefd=False)
+            sys.stderr = open(stderr_file.fileno(), 'w', encoding='utf-8', closefd=False)
+            sys.stderr.write(messages)
+            try:
+                if args.input != None:
+                    input_file = open_input(args.input)
+                elif 'input_text' in job:
+                    input_file = io.StringIO(str(job['input_text']))
+                else:
+                    input_file = open(os.devnull)
+                run_program(args, prepared, input_file)
+                output_buffer.flush()
+                exit_code = 0
+            except SystemExit as exit:
+                exit_code = exit.code if isinstance(exit.code, int) else 0 if exit.code == None else 1
+            except Exception as error:
+                sys.stderr.write('{}: {}\n'.format(type(error).__name__, error))
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(exit_code)
+
+    def closeInherited(self):  # in the child, a worker must not hold the server's sockets open
+        for connection in self.clients:
+            connection.close()
+        if self.listener != None:
+            self.listener.close()
+        for fd in self.wakeup:
+            os.close(fd)
+
+    def reap(self):
+        while len(self.running) > 0:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.running.pop(pid, None)
+            if worker != None:
+                worker.finish(os.waitstatus_to_exitcode(status))
+
+    def killExpired(self):
+        now = time.monotonic()
+        for pid, worker in self.running.items():
+            if worker.deadline != None and not worker.timed_out and worker.deadline <= now:
+                os.kill(pid, signal.SIGKILL)
+                worker.timed_out = True
+
+    def nextTimeout(self):  # seconds select may wait before a worker has to be killed
+        deadlines = [worker.deadline for worker in self.running.values()
+                     if worker.deadline != None and not worker.timed_out]
+        if len(deadlines) == 0:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+
+class InputSweep:  # --inputs=GLOB, runs one program against many inputs and checks them against .out and .rc files
+    def __init__(self, args, argv):
+        self.args = args
+        self.argv = argv
+        self.results = {}  # input path -> answer of its job
+
+    def inputPaths(self):
+        pattern = self.args.inputs
+        if pattern.startswith('@'):  # a manifest, one input path per line, relative to the manifest
+            manifest = pattern[1:]
+            try:
+                with open(manifest) as manifest_file:
+                    lines = [line.strip() for line in manifest_file]
+            except OSError:
+                ErrorHandler.error_exit(
+                    'could not open a file [{}]'.format(manifest), ErrCode.OPEN_INPUT_FILE)
+            return [os.path.join(os.path.dirname(manifest), line) for line in lines if line != '']
+        paths = sorted(glob.glob(pattern, recursive=True))
+        if len(paths) == 0:
+            ErrorHandler.error_exit(
+                'no input matches [{}]'.format(pattern), ErrCode.OPEN_INPUT_FILE)
+        return paths
+
+    def sweep(self):  # True when no input differs from its reference files
+        paths = self.inputPaths()
+        server = ProgramServer(self.args, self.argv)  # the program is prepared once, the runs fork from it
+        for path in paths:
+            server.queue.append(({'id': path, 'input': path}, self.collect))
+        server.run(None)
+
+        rows = [self.check(path) for path in paths]
+        self.printTable(rows)
+        return all(row[3] != 'FAIL' for row in rows)
+
+    def collect(self, result):
+        self.results[result['id']] = result
+
+    @staticmethod
+    def reference(path):  # contents of a reference file, None when there is none
+        try:
+            with open(path) as reference_file:
+                return reference_file.read()
+        except OSError:
+            return None
+
+    def check(self, path):  # (input, exit code, expected exit code, result)
+        result = self.results[path]
+        stem = os.path.splitext(path)[0]
+        expected_output = InputSweep.reference(stem + '.out')
+        expected_code = InputSweep.reference(stem + '.rc')
+        if expected_code != None:
+            expected_code = expected_code.strip()
+
+        if expected_output == None and expected_code == None:
+            return path, str(result['exit_code']), '-', '-'
+        if expected_code != None and expected_code != str(result['exit_code']):
+            return path, str(result['exit_code']), expected_code, 'FAIL'
+        if expected_output != None and expected_output != result['stdout']:
+            return path, str(result['exit_code']), expected_code or '-', 'FAIL'
+        return path, str(result['exit_code']), expected_code or '-', 'ok'
+
+    def printTable(self, rows):
+        width = max(len('input'), max(len(row[0]) for row in rows))
+        line = '{:<' + str(width) + '}  {:>4}  {:>8}  {}'
+        print(line.format('input', 'exit', 'expected', 'result'))
+        for row in rows:
+            print(line.format(*row))
+        results = [row[3] for row in rows]
+        print('{} inputs, {} passed, {} failed, {} without reference'.format(
+            len(rows), results.count('ok'), results.count('FAIL'), results.count('-')))
+
+
+class ResourceGovernor:  # --max-instructions, --max-time and --max-memory, --max-stack and --max-frames are ProgramContext's
+    # the limits are checked between chunks of instructions counted by the iterator, like CallGraphProfiler
+    CHECK_INTERVAL = 10000
+
+    def __init__(self, args):
+        self.max_instructions = args.max_instructions
+        self.max_time = args.max_time
+        self.max_memory = args.max_memory
+        self.executed = 0
+
+    @staticmethod
+    def limits(args):
+        return [args.max_instructions, args.max_time, args.max_memory]
+
+    def run(self, program, program_context):
+        if self.max_memory != None:
+            self.limitHeap()
+        deadline = None
+        if self.max_time != None:
+            deadline = time.monotonic() + self.max_time
+        chunk = itertools.repeat
+        try:
+            while program_context.program_counter < len(program):
+                interval = ResourceGovernor.CHECK_INTERVAL
+                if self.max_instructions != None:
+                    if self.executed >= self.max_instructions:
+                        ResourceGovernor.exceeded('instruction budget of {} used up'.format(self.max_instructions))
+                    interval = min(interval, self.max_instructions - self.executed)
+                for _ in chunk(None, interval):
+                    if program_context.program_counter >= len(program):
+                        break
+                    program[program_context.program_counter](program_context)
+                    program_context.program_counter += 1
+                self.executed += interval
+                self.check(program_context, deadline)
+        except MemoryError:
+            ResourceGovernor.exceeded('memory limit of {} bytes reached'.format(self.max_memory))
+
+    def check(self, program_context, deadline):
+        if deadline != None and time.monotonic() > deadline:
+            ResourceGovernor.exceeded('time limit of {} s reached'.format(self.max_time))
+        if self.max_memory != None and \
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 > self.max_memory:
+            ResourceGovernor.exceeded('memory limit of {} bytes reached'.format(self.max_memory))
+
+    def limitHeap(self):  # one huge allocation between two checks fails with MemoryError instead
+        soft, hard = resource.getrlimit(resource.RLIMIT_DATA)
+        if hard == resource.RLIM_INFINITY or self.max_memory < hard:
+            try:
+                resource.setrlimit(resource.RLIMIT_DATA, (self.max_memory, hard))
+            except (ValueError, OSError):
+                pass  # the batched checks still apply
+
+    @staticmethod
+    def exceeded(message):
+        ErrorHandler.error_exit('resource limit, ' + message, ErrCode.RESOURCE_LIMIT)
+
+
+class Checkpoint:  # --checkpoint-every=N and --resume=FILE, the whole run state in one marshal record
+    # written between two instructions, after the output buffer is flushed, so the record, the lines
+    # READ consumed and the output on stdout all describe the same moment
+    MAGIC = b'IPPS'
+    FORMAT = 1
+
+    def __init__(self, path, every, instructions):
+        self.path = path
+        self.every = every  # instructions between two checkpoints
+        self.program_key = Checkpoint.programKey(instructions)
+
+    @staticmethod
+    def programKey(instructions):  # a checkpoint only resumes the program, options included, it was taken from
+        digest = hashlib.sha256()
+        digest.update(marshal.dumps([Checkpoint.dumpInstruction(ins) for ins in instructions]))
+        return digest.hexdigest()
+
+    @staticmethod
+    def dumpInstruction(ins):
+        if isinstance(ins, Ins_Block):
+            return ('Block', tuple(Checkpoint.dumpInstruction(member) for member in ins.instructions))
+        return (ExecutionStats.opcodeOf(ins), tuple(ProgramCache.dumpArg(arg) for arg in ins.args))
+
+    def run(self, program, program_context):
+        chunk = itertools.repeat
+        while program_context.program_counter < len(program):
+            try:
+                for _ in chunk(None, self.every):  # counted by the iterator, like CallGraphProfiler
+                    if program_context.program_counter >= len(program):
+                        break
+                    program[program_context.program_counter](program_context)
+                    program_context.program_counter += 1
+            except SystemExit:
+                self.remove()  # EXIT or an error exit, resuming would only repeat it
+                raise
+            if program_context.program_counter < len(program):
+                self.write(program_context)  # a failed write exits and keeps the last good checkpoint
+        self.remove()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def write(self, program_context):  # atomic, the old checkpoint stays until the new one is complete
+        output_buffer.flush()
+        record = marshal.dumps(self.state(program_context))
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as checkpoint_file:
+                checkpoint_file.write(Checkpoint.MAGIC)
+                checkpoint_file.write(record)
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            ErrorHandler.error_exit(
+                'could not write a file [{}]'.format(self.path), ErrCode.OPEN_OUTPUT_FILE)
+
+    def state(self, program_context):
+        return {
+            'format': Checkpoint.FORMAT,
+            'program': self.program_key,
+            'program_counter': program_context.program_counter,
+            'global_frame': Checkpoint.dumpFrame(program_context.global_frame),
+            'temporary_frame': Checkpoint.dumpFrame(program_context.temporary_frame),
+            'local_frames': [Checkpoint.dumpFrame(frame) for frame in program_context.local_frame_stack],
+            'stack_types': [typpe.name for typpe in program_context.stack_types],
+            'stack_values': [Checkpoint.dumpValue(value) for value in program_context.stack_values],
+            'call_stack': program_context.call_stack[:program_context.call_depth],
+            'input_lines': program_context.input_reader.consumed,
+            'output_characters': output_buffer.written,
+            'output_position': Checkpoint.outputPosition(),
+        }
+
+    # READ at the end of input stores the enum VariableType.NIL as the value, marshal gets None instead
+    @staticmethod
+    def dumpValue(value):
+        return None if value is VariableType.NIL else value
+
+    @staticmethod
+    def loadValue(value):
+        return VariableType.NIL if value == None else value
+
+    # a frame is a list of None (undeclared) or (type name, value), StringData is flattened to its value
+    @staticmethod
+    def dumpFrame(frame):
+        if frame == None:
+            return None
+        return [None if data == None else (data.type.name, Checkpoint.dumpValue(data.value)) for data in frame]
+
+    @staticmethod
+    def loadFrame(frame):
+        if frame == None:
+            return None
+        return [None if data == None else
+                UNINIT_DATA if data[0] == 'UNINIT' else
+                VariableData(VariableType[data[0]], Checkpoint.loadValue(data[1]))
+                for data in frame]
+
+    @staticmethod
+    def outputPosition():  # offset in stdout when it is a file, resuming truncates the output written after it
+        try:
+            return os.lseek(sys.stdout.fileno(), 0, os.SEEK_CUR)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            return None
+
+    @staticmethod
+    def resume(path, program_context, instructions):
+        try:
+            with open(path, 'rb') as checkpoint_file:
+                data = checkpoint_file.read()
+        except OSError:
+            ErrorHandler.error_exit(
+                'could not open a file [{}]'.format(path), ErrCode.OPEN_INPUT_FILE)
+        try:
+            if data[:len(Checkpoint.MAGIC)] != Checkpoint.MAGIC:
+                raise ValueError
+            state = marshal.loads(data[len(Checkpoint.MAGIC):])
+            if state['format'] != Checkpoint.FORMAT:
+                raise ValueError
+        except (ValueError, EOFError, TypeError, KeyError):
+            ErrorHandler.error_exit('damaged checkpoint [{}]'.format(path), ErrCode.BAD_XML)
+        if state['program'] != Checkpoint.programKey(instructions):
+            ErrorHandler.error_exit(
+                'checkpoint [{}] belongs to another program or options'.format(path), ErrCode.BAD_XML)
+
+        program_context.program_counter = state['program_counter']
+        program_context.global_frame = Checkpoint.loadFrame(state['global_frame'])
+        program_context.temporary_frame = Checkpoint.loadFrame(state['temporary_frame'])
+        program_context.local_frame_stack = [Checkpoint.loadFrame(frame) for frame in state['local_frames']]
+        program_context.local_frame = \
+            program_context.local_frame_stack[-1] if program_context.local_frame_stack else None
+        program_context.stack_types = [VariableType[name] for name in state['stack_types']]
+        program_context.stack_values = [Checkpoint.loadValue(value) for value in state['stack_values']]
+        call_stack = state['call_stack']
+        program_context.call_stack = call_stack + [0] * max(16, len(call_stack))
+        program_context.call_depth = len(call_stack)
+        if not program_context.input_reader.skip(state['input_lines']):
+            ErrorHandler.error_exit(
+                'input is shorter than when checkpoint [{}] was taken'.format(path), ErrCode.OPEN_INPUT_FILE)
+        output_buffer.written = state['output_characters']
+        Checkpoint.restoreOutput(state['output_position'])
+
+    @staticmethod
+    def restoreOutput(position):  # stdout reopened on the same file (>>) drops what was written after the checkpoint
+        if position == None:
+            return
+        try:
+            fd = sys.stdout.fileno()
+            if stat.S_ISREG(os.fstat(fd).st_mode) and os.fstat(fd).st_size >= position:
+                sys.stdout.flush()
+                os.ftruncate(fd, position)
+                os.lseek(fd, position, os.SEEK_SET)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            pass
+
+
+class CustomParser(argparse.ArgumentParser):
+    def print_help(self, file=None):
+        print("IPPCode23 interpret")
+        print("run with:")
+        print("  python3 interpret.py ARGS")
+        print("  ARGS:")
+        print("    --help prints this message")
+        print("    --source=SOURCE IPPCode23 source file")
+        print("    --input=INPUT input file to read from")
+        print("    --source-format=FORMAT xml or ipp (IPPcode23 text, checked like parse.php),")
+        print("      by default ipp for .IPPcode23, .ipp and .src files and xml otherwise")
+        print("    --engine=ENGINE classic (default) executes instruction objects,")
+        print("      compiled turns every instruction into a specialised python function")
+        print("    --output-buffer=SIZE characters of output collected before it is written,")
+        print("      0 writes every WRITE and DPRINT immediately, default 65536")
+        print("    --cache-dir=DIR where validated programs are cached, default ~/.cache/ipp23")
+        print("    --cache-size=BYTES size the cache is kept under, default 64 MiB")
+        print("    --no-cache always load the program from xml")
+        print("    --compile-only=OUT validate SOURCE and write it to OUT as bytecode, nothing is run")
+        print("    --bytecode=FILE run a program written by --compile-only instead of SOURCE")
+        print("    --max-call-depth=N nested CALLs allowed before exiting with 90, default 1000000")
+        print("    --stats=FILE write execution statistics as json to FILE")
+        print("    --timings=FILE write the load and run time as json to FILE, the run loop is not instrumented")
+        print("    --profile=FILE write collapsed CALL stacks sampled while running to FILE,")
+        print("      for flamegraph tools")
+        print("    --profile-interval=N instructions between profile samples, default 1000")
+        print("    --serve=SOCKET answer json jobs sent to a unix socket, one per line")
+        print("    --batch run the json jobs read from stdin, one per line, answers go to stdout")
+        print("    --workers=N jobs run at once by --serve, --batch and --inputs, default the number of cores")
+        print("    --inputs=GLOB run SOURCE with every matching input (or every path listed in @FILE),")
+        print("      compare the runs with .out and .rc files next to the inputs and print a table")
+        print("    --max-instructions=N --max-time=SECONDS --max-stack=N --max-frames=N --max-memory=BYTES")
+        print("      end the run with exit code 90 once it executed N instructions, ran SECONDS,")
+        print("      holds more than N values on the data stack or frames on the frame stack,")
+        print("      or the interpreter uses more than BYTES of memory, the stack and frame limits are checked")
+        print("      on every push, the others every 10000 instructions")
+        print("    --checkpoint-every=N write the run state to the --checkpoint file every N instructions")
+        print("    --checkpoint=FILE checkpoint file, default the --resume file")
+        print("    --resume=FILE continue the run saved in a checkpoint, with the same program, options and input")
+        print("    --hot-loop-threshold=N backward jumps before a simple loop is compiled for the variable")
+        print("      types it sees, default 1000, 0 never compiles loops")
+        print("    --warn report instructions that fail their type check whenever they run on stderr")
+        print("    --verbose report what the optimizer did on stderr")
+        print("    -O LEVEL optimisation, 1 fuses common instruction sequences,")
+        print("      2 also fuses whole basic blocks, 0 (default) runs the program as is,")
+        print("      --stats and --verbose report the number of eliminated instructions")
+        print("    by default INPUT = stdin and SOURCE = stdin")
+        print("    so atleast one must be specified")
+
+
+def load_program(args):  # validated instructions with resolved slots
+    gc.disable()  # loading only allocates, collections would just rescan the growing program
+    try:
+        if args.bytecode != None:
+            return Bytecode.read(args.bytecode)
+        return _load_program(args)
+    finally:
+        gc.enable()
+
+
+SOURCE_EXTENSIONS = ['.ippcode23', '.ipp', '.src']  # loaded as IPPcode23 text unless --source-format says otherwise
+
+
+def source_format_of(args):
+    if args.source_format != None:
+        return args.source_format
+    if args.source != None and os.path.splitext(args.source)[1].lower() in SOURCE_EXTENSIONS:
+        return 'ipp'
+    return 'xml'
+
+
+def _load_program(args):
+    source = args.source
+    if source == None:
+        source = sys.stdin
+    source_format = source_format_of(args)
+
+    cache = None
+    key = None
+    if not args.no_cache:
+        cache = ProgramCache(args.cache_dir, args.cache_size)
+        if source == sys.stdin:
+            source_bytes = sys.stdin.buffer.read()
+            source = io.BytesIO(source_bytes)
+            key = cache.key(source_bytes, source_format)
+        else:
+            key = cache.fileKey(source, source_format)  # a miss streams the file like --no-cache
+            if key == None:  # modified just now or missing
+                try:
+                    with open(source, 'rb') as source_file:
+                        source_bytes = source_file.read()
+                except OSError:
+                    pass  # the loader reports the unreadable source
+                else:
+                    source = io.BytesIO(source_bytes)
+                    key = cache.key(source_bytes, source_format)
+        if key != None:
+            program = cache.load(key)
+            if program != None:
+                return program
+
+    if source_format == 'ipp':
+        if source == sys.stdin:
+            source = sys.stdin.buffer
+        instructions = SourceLoader(source).load()
+    else:
+        instructions = XMLLoader(source).load()
+
+    slot_resolver = SlotResolver()
+    slot_resolver.resolve(instructions)
+    global_slot_count = len(slot_resolver.global_slots)
+    local_slot_count = len(slot_resolver.local_slots)
+
+    if key != None:
+        cache.store(key, instructions, global_slot_count, local_slot_count)
+    return instructions, global_slot_count, local_slot_count
+
+
+def mark_tail_calls(instructions):  # CALL followed by RETURN returns straight to our own caller
+    previous = None
+    for ins in instructions:
+        first = ins.instructions[0] if isinstance(ins, Ins_Block) else ins
+        if isinstance(previous, Ins_CALL) and isinstance(first, Ins_RETURN):
+            previous.tail = True
+        previous = ins.instructions[-1] if isinstance(ins, Ins_Block) else ins
+
+
+def parse_arguments(argv=None):  # validated options, argv defaults to the command line
+    parser = CustomParser()
+
+    parser.add_argument('--source')
+    parser.add_argument('--source-format')
+    parser.add_argument('--input')
+    parser.add_argument('--engine', default='classic')
+    parser.add_argument('-O', dest='opt_level', default='0')
+    parser.add_argument('--output-buffer', default='65536')
+    parser.add_argument('--cache-dir', default=ProgramCache.defaultDirectory())
+    parser.add_argument('--cache-size', default='67108864')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--compile-only')
+    parser.add_argument('--max-call-depth', default='1000000')
+    parser.add_argument('--stats')
+    parser.add_argument('--timings')
+    parser.add_argument('--profile')
+    parser.add_argument('--profile-interval', default='1000')
+    parser.add_argument('--bytecode')
+    parser.add_argument('--serve')
+    parser.add_argument('--batch', action='store_true')
+    parser.add_argument('--workers')
+    parser.add_argument('--inputs')
+    parser.add_argument('--max-instructions')
+    parser.add_argument('--max-time')
+    parser.add_argument('--max-stack')
+    parser.add_argument('--max-frames')
+    parser.add_argument('--max-memory')
+    parser.add_argument('--checkpoint-every')
+    parser.add_argument('--checkpoint')
+    parser.add_argument('--resume')
+    parser.add_argument('--hot-loop-threshold', default='1000')
+    parser.add_argument('--warn', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+
+    args = parser.parse_args(argv)
+
+    if args.engine not in ['classic', 'compiled']:
+        ErrorHandler.error_exit(
+            'unknown engine [{}]'.format(args.engine), ErrCode.CMD_ARGS)
+    if args.source_format not in [None, 'xml', 'ipp']:
+        ErrorHandler.error_exit(
+            'unknown source format [{}]'.format(args.source_format), ErrCode.CMD_ARGS)
+    if args.opt_level not in ['0', '1', '2']:
+        ErrorHandler.error_exit(
+            'unknown optimisation level [{}]'.format(args.opt_level), ErrCode.CMD_ARGS)
+    try:
+        output_buffer.threshold = int(args.output_buffer)
+    except ValueError:
+        ErrorHandler.error_exit(
+            'bad output buffer size [{}]'.format(args.output_buffer), ErrCode.CMD_ARGS)
+    try:
+        args.profile_interval = int(args.profile_interval)
+        if args.profile_interval < 1:
+            raise ValueError
+    except ValueError:
+        ErrorHandler.error_exit(
+            'bad profile interval [{}]'.format(args.profile_interval), ErrCode.CMD_ARGS)
+    if args.stats != None and args.profile != None:
+        ErrorHandler.error_exit(
+            '--stats can not be combined with --profile', ErrCode.CMD_ARGS)
+    try:
+        args.max_call_depth = int(args.max_call_depth)
+    except ValueError:
+        ErrorHandler.error_exit(
+            'bad max call depth [{}]'.format(args.max_call_depth), ErrCode.CMD_ARGS)
+    try:
+        args.cache_size = int(args.cache_size)
+    except ValueError:
+        ErrorHandler.error_exit(
+            'bad cache size [{}]'.format(args.cache_size), ErrCode.CMD_ARGS)
+    for name, convert in [('max_instructions', int), ('max_time', float), ('max_stack', int),
+                          ('max_frames', int), ('max_memory', int)]:
+        value = getattr(args, name)
+        try:
+            if value != None:
+                setattr(args, name, convert(value))
+                if getattr(args, name) < 0:
+                    raise ValueError
+        except ValueError:
+            ErrorHandler.error_exit(
+                'bad --{} [{}]'.format(name.replace('_', '-'), value), ErrCode.CMD_ARGS)
+    if (args.stats != None or args.profile != None) and \
+            any(limit != None for limit in ResourceGovernor.limits(args)):
+        ErrorHandler.error_exit(
+            '--max-instructions, --max-time and --max-memory '
+            'can not be combined with --stats or --profile', ErrCode.CMD_ARGS)
+    try:
+        args.hot_loop_threshold = int(args.hot_loop_threshold)
+        if args.hot_loop_threshold < 0:
+            raise ValueError
+    except ValueError:
+        ErrorHandler.error_exit(
+            'bad hot loop threshold [{}]'.format(args.hot_loop_threshold), ErrCode.CMD_ARGS)
+    if args.checkpoint == None:
+        args.checkpoint = args.resume
+    try:
+        if args.checkpoint_every != None:
+            args.checkpoint_every = int(args.checkpoint_every)
+            if args.checkpoint_every < 1:
+                raise ValueError
+    except ValueError:
+        ErrorHandler.error_exit(
+            'bad checkpoint interval [{}]'.format(args.checkpoint_every), ErrCode.CMD_ARGS)
+    if args.checkpoint_every != None and args.checkpoint == None:
+        ErrorHandler.error_exit(
+            '--checkpoint-every needs --checkpoint or --resume', ErrCode.CMD_ARGS)
+    if args.checkpoint_every != None and (args.stats != None or args.profile != None or
+                                          any(limit != None for limit in ResourceGovernor.limits(args))):
+        ErrorHandler.error_exit(
+            '--checkpoint-every can not be combined with --stats, --profile, --max-instructions, --max-time '
+            'or --max-memory', ErrCode.CMD_ARGS)
+    try:
+        args.workers = (os.cpu_count() or 1) if args.workers == None else int(args.workers)
+        if args.workers < 1:
+            raise ValueError
+    except ValueError:
+        ErrorHandler.error_exit(
+            'bad number of workers [{}]'.format(args.workers), ErrCode.CMD_ARGS)
+
+    if args.bytecode != None and (args.source != None or args.compile_only != None):
+        ErrorHandler.error_exit(
+            "--bytecode can not be combined with --source or --compile-only", ErrCode.CMD_ARGS)
+    if args.serve != None and args.batch:
+        ErrorHandler.error_exit(
+            "--serve can not be combined with --batch", ErrCode.CMD_ARGS)
+
+    return args
+
+
+class PreparedProgram:  # loaded, optimised, linked and compiled, runs any number of times
+    def __init__(self, instructions, program, global_slot_count, local_slot_count, load_seconds):
+        self.instructions = instructions
+        self.program = program  # execute methods or compiled functions, one per instruction
+        self.global_slot_count = global_slot_count
+        self.local_slot_count = local_slot_count
+        self.load_seconds = load_seconds
+        self.eliminated = 0  # instructions the -O optimizer removed
+
+
+def prepare_program(args):
+    load_start = time.perf_counter()
+    instructions, global_slot_count, local_slot_count = load_program(args)
 
     # if any instructions
+    optimizer = ProgramOptimizer(int(args.opt_level), args.max_stack != None)
     if len(instructions) > 0:
 
-        instructions.sort(key=lambda x: x[1])
+        instructions = optimizer.optimize(instructions)
+        if optimizer.level > 0 and args.verbose:
+            sys.stderr.write('optimizer: eliminated {} instructions\n'.format(optimizer.eliminated))
 
-        if instructions[0][1] < 1:  # make sure list starts from 1 or over
-            ErrorHandler.error_exit(
-                'order needs to start from 1 or over', ErrCode.BAD_XML)
+        # --labels resolved to indices, LABEL instructions are not executed
+        instructions = ProgramLinker().link(instructions)
+        mark_tail_calls(instructions)
 
-        for i in range(0, len(instructions)-1):  # search for duplicite order
-            if instructions[i][1] == instructions[i+1][1]:
-                ErrorHandler.error_exit('duplicit order', ErrCode.BAD_XML)
+        inference = TypeInference()
+        inference.analyze(instructions)
+        if args.warn:
+            for message in inference.errors:
+                sys.stderr.write('types: {}\n'.format(message))
 
-        instructions = list(map(lambda x: x[0], instructions))
+    if args.engine == 'compiled':
+        program = ProgramCompiler().compile(instructions)
+    else:
+        program = [ins.runner() for ins in instructions]
 
-        # --interpret instructions
-        program_context = ProgramContext(input_file)
+    prepared = PreparedProgram(instructions, program, global_slot_count, local_slot_count,
+                               time.perf_counter() - load_start)
+    prepared.eliminated = optimizer.eliminated
+    return prepared
 
-        # --first just labels
-        while program_context.program_counter < len(instructions):
-            ins = instructions[program_context.program_counter]
-            if isinstance(ins, Ins_LABEL):
-                ins.execute(program_context)
-            program_context.program_counter += 1
 
-        program_context.program_counter = 0
-        instructions_executed = 0
+def run_program(args, prepared, input_file):  # a fresh context for every run, the prepared program is not changed
+    program = prepared.program
+
+    # --interpret instructions
+    program_context = ProgramContext(
+        input_file, prepared.global_slot_count, prepared.local_slot_count, args.max_call_depth,
+        args.max_stack, args.max_frames)
+    if args.resume != None:
+        Checkpoint.resume(args.resume, program_context, prepared.instructions)
 
-        # --whole program
-        while program_context.program_counter < len(instructions):
-            ins = instructions[program_context.program_counter]
-            ins.execute(program_context)
+    # --whole program
+    run_start = time.perf_counter()
+    try:
+        run_loop(args, prepared, program, program_context)
+    finally:
+        if args.timings != None:
+            write_timings(args.timings, prepared.load_seconds, time.perf_counter() - run_start)
+
+
+def run_loop(args, prepared, program, program_context):
+    if args.checkpoint_every != None:
+        Checkpoint(args.checkpoint, args.checkpoint_every, prepared.instructions).run(program, program_context)
+    elif args.stats != None:
+        ExecutionStats(args.stats, prepared.instructions, prepared.load_seconds, prepared.eliminated).run(program, program_context)
+    elif args.profile != None:
+        CallGraphProfiler(args.profile, prepared.instructions, args.profile_interval).run(program, program_context)
+    elif any(limit != None for limit in ResourceGovernor.limits(args)):
+        ResourceGovernor(args).run(program, program_context)
+    else:
+        if args.hot_loop_threshold > 0:  # only here, a specialised loop runs all its iterations as one instruction
+            program = HotLoops(args.hot_loop_threshold).install(prepared.instructions, program)
+        while program_context.program_counter < len(program):
+            program[program_context.program_counter](program_context)
             program_context.program_counter += 1
-            instructions_executed += 1
+
+
+def write_timings(path, load_seconds, run_seconds):  # --timings=FILE, the run loop itself pays nothing for it
+    try:
+        with open(path, 'w') as timings_file:
+            json.dump({'load_seconds': load_seconds, 'run_seconds': run_seconds}, timings_file)
+            timings_file.write('\n')
+    except OSError:
+        ErrorHandler.error_exit(
+            'could not write a file [{}]'.format(path), ErrCode.OPEN_OUTPUT_FILE)
+
+
+def open_input(path):
+    try:
+        return open(path)
+    except Exception:
+        ErrorHandler.error_exit(
+            'could not open a file [{}]'.format(path), ErrCode.OPEN_INPUT_FILE)
+
+
+def main():
+    args = parse_arguments()
+
+    if args.serve != None or args.batch:
+        ProgramServer(args, sys.argv[1:]).serve()
+        return
+
+    if args.inputs != None:
+        if args.source == None and args.bytecode == None or args.input != None:
+            ErrorHandler.error_exit(
+                "--inputs needs --source or --bytecode and replaces --input", ErrCode.CMD_ARGS)
+        if args.checkpoint_every != None or args.resume != None:
+            ErrorHandler.error_exit(
+                "--inputs can not be combined with --checkpoint-every or --resume", ErrCode.CMD_ARGS)
+        if not InputSweep(args, sys.argv[1:]).sweep():
+            sys.exit(1)
+        return
+
+    source_file_path = args.source
+    input_file_path = args.input
+
+    if args.compile_only != None:
+        instructions, global_slot_count, local_slot_count = load_program(args)
+        ProgramLinker().link(instructions)  # reports bad labels now, the file keeps the LABEL instructions
+        Bytecode.write(args.compile_only, instructions, global_slot_count, local_slot_count)
+        return
+
+    if input_file_path == None and source_file_path == None and args.bytecode == None:
+        ErrorHandler.error_exit(
+            "specify either --source or --input", ErrCode.CMD_ARGS)
+
+    input_file = sys.stdin
+
+    # if path specified open file else stdin
+    if input_file_path != None:
+        input_file = open_input(input_file_path)
+
+    prepared = prepare_program(args)
+    gc.freeze()  # the program lives until exit, keep it out of garbage collections
+    run_program(args, prepared, input_file)
+
+    output_buffer.flush()
 
     if input_file != sys.stdin:
         input_file.close()
@@ -55,6 +55,21 @@ $INS_ARG_LIST = array(
     "POPFRAME" => [],
     "RETURN" => [],
     "BREAK" => [],
+    "CLEARS" => [],
+    "ADDS" => [],
+    "SUBS" => [],
+    "MULS" => [],
+    "IDIVS" => [],
+    "LTS" => [],
+    "GTS" => [],
+    "EQS" => [],
+    "ANDS" => [],
+    "ORS" => [],
+    "NOTS" => [],
+    "INT2CHARS" => [],
+    "STRI2INTS" => [],
+    "JUMPIFEQS" => ['Label'],
+    "JUMPIFNEQS" => ['Label'],
 );
 
 //patterns for regex parsing
@@ -0,0 +1,34 @@
+# runs interpret.py in a child process, programs are IPPcode23 source text
+
+import os
+import subprocess
+import sys
+
+INTERPRETER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'interpret.py')
+
+
+class Run:
+    def __init__(self, process):
+        self.stdout = process.stdout
+        self.stderr = process.stderr
+        self.exit_code = process.returncode
+
+    def result(self):  # what a user of the interpreter sees
+        return self.stdout, self.exit_code
+
+
+def write_source(directory, source, name='program.src'):
+    path = os.path.join(str(directory), name)
+    with open(path, 'w') as source_file:
+        source_file.write('.IPPcode23\n' + source)
+    return path
+
+
+def run_interpreter(args, input_text='', cache=False):  # without the program cache unless asked for
+    process = subprocess.run([sys.executable, INTERPRETER] + ([] if cache else ['--no-cache']) + args, input=input_text,
+                             capture_output=True, text=True, timeout=120)
+    return Run(process)
+
+
+def run_source(directory, source, args=(), input_text='', cache=False):
+    return run_interpreter(['--source=' + write_source(directory, source)] + list(args), input_text, cache)
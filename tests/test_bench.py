@@ -0,0 +1,42 @@
+# the benchmark times the run loop users get, not the instrumented --stats loop
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bench.runner import BenchmarkError, BenchmarkRunner, source_level
+from support import INTERPRETER, run_source
+
+
+def test_timings_written_on_exit(tmp_path):
+    timings = tmp_path / 'timings.json'
+    run = run_source(tmp_path, 'WRITE int@1\nEXIT int@4\n', ['--timings=' + str(timings)])
+    assert run.result() == ('1', 4)
+    assert sorted(json.loads(timings.read_text())) == ['load_seconds', 'run_seconds']
+
+
+def test_workload_result():
+    result = BenchmarkRunner(['--no-cache'], 1, 0, 0.01).run(['loop'])['loop']
+    assert result['exit_code'] == 0
+    assert result['instructions_executed'] > 0
+    assert result['instructions_per_second'] > 0
+
+
+def test_instructions_counted_without_fusion():  # -O2 runs a block as one instruction, the rate counts its parts
+    counts = [BenchmarkRunner(['--no-cache'] + args, 1, 0, 0.01).run(['loop'])['loop']['instructions_executed']
+              for args in [[], ['-O2'], ['-O', '2', '--engine=compiled']]]
+    assert counts[0] == counts[1] == counts[2]
+    assert source_level(['-O1', '--engine=compiled', '-O', '2']) == ['--engine=compiled']
+
+
+def test_failing_run_stops_the_benchmark():
+    with pytest.raises(BenchmarkError, match='^recursion: interpret.py exited with 90: <ERROR EXIT> resource limit'):
+        BenchmarkRunner(['--no-cache', '--max-call-depth=1'], 1, 0, 0.01).run(['recursion'])
+    process = subprocess.run([sys.executable, '-m', 'bench', '--scale=0.01', '--repeat=1', '--warmup=0',
+                              '--interpreter-arg=--max-call-depth=1', 'recursion'],
+                             cwd=os.path.dirname(INTERPRETER), capture_output=True, text=True)
+    assert (process.stdout, process.returncode) == ('', 2)
+    assert process.stderr.startswith('bench: recursion: interpret.py exited with 90')
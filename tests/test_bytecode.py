@@ -0,0 +1,119 @@
+# --compile-only writes a program that --bytecode runs exactly like its source
+
+import pytest
+
+import interpret
+from support import run_interpreter, write_source
+from test_engines import INPUT, PROGRAMS
+
+
+def load_source(path):
+    with open(path, 'rb') as source_file:
+        instructions = interpret.SourceLoader(source_file).load()
+    resolver = interpret.SlotResolver()
+    resolver.resolve(instructions)
+    return instructions, len(resolver.global_slots), len(resolver.local_slots)
+
+
+def dumped(instructions):
+    return [interpret.ProgramCache.dumpInstruction(ins) for ins in instructions]
+
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+def test_round_trip(tmp_path, name):
+    instructions, global_count, local_count = load_source(write_source(tmp_path, PROGRAMS[name]))
+    data = interpret.Bytecode().dump(instructions, global_count, local_count)
+    loaded, loaded_global, loaded_local = interpret.Bytecode.load(data)
+    assert dumped(loaded) == dumped(instructions)
+    assert (loaded_global, loaded_local) == (global_count, local_count)
+
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+def test_runs_like_the_source(tmp_path, name):
+    source = write_source(tmp_path, PROGRAMS[name])
+    bytecode = str(tmp_path / 'program.ippb')
+    assert run_interpreter(['--source=' + source, '--compile-only=' + bytecode]).exit_code == 0
+    expected = run_interpreter(['--source=' + source], INPUT)
+    assert run_interpreter(['--bytecode=' + bytecode], INPUT).result() == expected.result()
+
+
+def test_damaged_file(tmp_path):
+    source = write_source(tmp_path, PROGRAMS['arithmetic'])
+    bytecode = tmp_path / 'program.ippb'
+    run_interpreter(['--source=' + source, '--compile-only=' + str(bytecode)])
+    bytecode.write_bytes(bytecode.read_bytes()[:40])
+    assert run_interpreter(['--bytecode=' + str(bytecode)]).exit_code == 32
+    bytecode.write_bytes(b'ELF\0' + bytes(60))
+    assert run_interpreter(['--bytecode=' + str(bytecode)]).exit_code == 32
+
+
+@pytest.mark.parametrize('source', ['LABEL a\nLABEL a\n', 'JUMP missing\n'])
+def test_bad_labels_at_compile_time(tmp_path, source):
+    bytecode = tmp_path / 'program.ippb'
+    source_path = write_source(tmp_path, source)
+    assert run_interpreter(['--source=' + source_path, '--compile-only=' + str(bytecode)]).exit_code == 52
+    assert not bytecode.exists()
+
+
+def test_older_version_rejected(tmp_path):
+    source = write_source(tmp_path, PROGRAMS['arithmetic'])
+    bytecode = tmp_path / 'program.ippb'
+    run_interpreter(['--source=' + source, '--compile-only=' + str(bytecode)])
+    data = bytearray(bytecode.read_bytes())
+    data[4:6] = (1).to_bytes(2, 'little')
+    bytecode.write_bytes(bytes(data))
+    assert run_interpreter(['--bytecode=' + str(bytecode)]).exit_code == 32
+
+
+DAMAGED_SOURCE = 'DEFVAR GF@a\nMOVE GF@a int@5\nWRITE GF@a\n'
+
+
+def damaged(tmp_path, operand, record):  # bytecode of DAMAGED_SOURCE with one operand record replaced
+    instructions, global_count, local_count = load_source(write_source(tmp_path, DAMAGED_SOURCE))
+    writer = interpret.Bytecode()
+    data = writer.dump(instructions, global_count, local_count)
+    constant = {value: index for (_, value), index in writer.pool_index.items()}
+    offset = (interpret.Bytecode.HEADER.size + len(instructions) * interpret.Bytecode.INSTRUCTION.size
+              + operand * interpret.Bytecode.OPERAND.size)
+    return (data[:offset] + interpret.Bytecode.OPERAND.pack(*record(constant))
+            + data[offset + interpret.Bytecode.OPERAND.size:])
+
+
+VAR = interpret.Bytecode.OPERAND_VAR
+LITERAL = interpret.Bytecode.OPERAND_LITERAL
+TYPES = interpret.Bytecode.types
+
+
+@pytest.mark.parametrize('operand, record', [
+    (3, lambda constant: (VAR, constant['a'], constant['GF'], 1000)),  # WRITE GF@a from a slot past the frame
+    (3, lambda constant: (VAR, constant['a'], constant['a'], 0)),  # frame named a
+    (2, lambda constant: (LITERAL, TYPES.index(interpret.VariableType.UNINIT), 0, 0)),
+    (2, lambda constant: (LITERAL, TYPES.index(interpret.VariableType.INT), constant['a'], 0)),
+    (2, lambda constant: (LITERAL, TYPES.index(interpret.VariableType.STRING), constant['5'], 0)),
+    (2, lambda constant: (LITERAL, TYPES.index(interpret.VariableType.BOOL), 2, 0)),
+], ids=['slot', 'frame', 'uninit literal', 'int from a string', 'string from an int', 'bool'])
+def test_damaged_operand(tmp_path, operand, record):
+    data = damaged(tmp_path, operand, record)
+    with pytest.raises(ValueError):
+        interpret.Bytecode.load(data)
+    bytecode = tmp_path / 'program.ippb'
+    bytecode.write_bytes(data)
+    run = run_interpreter(['--bytecode=' + str(bytecode)])
+    assert run.result() == ('', 32)
+
+
+@pytest.mark.parametrize('cut', [0, 1, 30, -1])
+def test_truncated_or_empty_file(tmp_path, cut):
+    source = write_source(tmp_path, DAMAGED_SOURCE)
+    bytecode = tmp_path / 'program.ippb'
+    run_interpreter(['--source=' + source, '--compile-only=' + str(bytecode)])
+    bytecode.write_bytes(bytecode.read_bytes()[:cut])
+    assert run_interpreter(['--bytecode=' + str(bytecode)]).exit_code == 32
+
+
+def test_data_after_the_pool(tmp_path):
+    source = write_source(tmp_path, DAMAGED_SOURCE)
+    bytecode = tmp_path / 'program.ippb'
+    run_interpreter(['--source=' + source, '--compile-only=' + str(bytecode)])
+    bytecode.write_bytes(bytecode.read_bytes() + b'\0')
+    assert run_interpreter(['--bytecode=' + str(bytecode)]).exit_code == 32
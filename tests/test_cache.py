@@ -0,0 +1,134 @@
+# the program cache returns what was stored, and anything it can not use is a miss
+
+import marshal
+import os
+import time
+
+import interpret
+from support import run_interpreter, run_source, write_source
+
+SOURCE = 'DEFVAR GF@a\nMOVE GF@a int@20\nADD GF@a GF@a int@22\nWRITE GF@a\n'
+
+
+def cached_program(tmp_path):  # (cache, key) of SOURCE stored in a fresh cache directory
+    cache = interpret.ProgramCache(str(tmp_path / 'cache'), 1 << 20)
+    path = tmp_path / 'program.src'
+    path.write_text('.IPPcode23\n' + SOURCE)
+    with open(path, 'rb') as source_file:
+        instructions = interpret.SourceLoader(source_file).load()
+    resolver = interpret.SlotResolver()
+    resolver.resolve(instructions)
+    key = cache.key(path.read_bytes(), 'ipp')
+    cache.store(key, instructions, len(resolver.global_slots), len(resolver.local_slots))
+    return cache, key
+
+
+def test_hit_returns_the_stored_program(tmp_path):
+    cache, key = cached_program(tmp_path)
+    instructions, global_count, local_count = cache.load(key)
+    assert [interpret.InstructionFactory.opcodeOf(ins) for ins in instructions] == ['DEFVAR', 'MOVE', 'ADD', 'WRITE']
+    assert (global_count, local_count) == (1, 0)
+    assert instructions[2].args[0].slot == 0
+
+
+def test_miss(tmp_path):
+    cache, key = cached_program(tmp_path)
+    assert cache.load('0' * len(key)) == None
+    assert cache.key(b'.IPPcode23\nWRITE int@1\n', 'ipp') != key
+    assert cache.key(SOURCE.encode(), 'xml') != cache.key(SOURCE.encode(), 'ipp')
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache, key = cached_program(tmp_path)
+    with open(cache.path(key), 'wb') as cache_file:
+        cache_file.write(b'not marshal data')
+    assert cache.load(key) == None
+
+
+def test_bad_entry_is_a_miss(tmp_path, capsys):  # valid marshal data the Ins_* constructors would exit on
+    cache, key = cached_program(tmp_path)
+    for program in [[('NOSUCHOP', ())], [('ADD', (('a', 'GF', 0),))], [('JUMP', (('INT', 1),))]]:
+        with open(cache.path(key), 'wb') as cache_file:
+            cache_file.write(marshal.dumps((1, 0, program)))
+        assert cache.load(key) == None
+    assert capsys.readouterr().err == ''
+
+
+def test_entry_checked_like_bytecode(tmp_path):  # slots past the frames and literals of the wrong kind are misses
+    cache, key = cached_program(tmp_path)
+    for program in [[('WRITE', (('a', 'GF', 1),))], [('WRITE', (('a', 'LF', 0),))],
+                    [('WRITE', (('a', 'XF', 0),))], [('WRITE', (('INT', 'a'),))], [('WRITE', (('UNINIT', None),))],
+                    [('READ', (('a', 'GF', 0), ('UNINIT', None, None, None)))]]:
+        with open(cache.path(key), 'wb') as cache_file:
+            cache_file.write(marshal.dumps((1, 0, program)))
+        assert cache.load(key) == None
+
+
+def aged(path, seconds=3600):  # modification time far enough back for the file key to be used
+    modified = time.time() - seconds
+    os.utime(path, (modified, modified))
+
+
+def test_file_key_follows_the_file(tmp_path):
+    cache = interpret.ProgramCache(str(tmp_path / 'cache'), 1 << 20)
+    path = tmp_path / 'program.src'
+    path.write_text('.IPPcode23\n' + SOURCE)
+    aged(path)
+    key = cache.fileKey(str(path), 'ipp')
+    assert key != None
+    assert cache.fileKey(str(path), 'ipp') == key
+    assert cache.fileKey(str(path), 'xml') != key
+    path.write_text('.IPPcode23\n' + SOURCE + 'WRITE int@1\n')
+    aged(path)
+    assert cache.fileKey(str(path), 'ipp') != key
+    assert cache.fileKey(str(tmp_path / 'missing.src'), 'ipp') == None
+
+
+def test_recently_modified_file_is_hashed(tmp_path):
+    cache = interpret.ProgramCache(str(tmp_path / 'cache'), 1 << 20)
+    path = tmp_path / 'program.src'
+    path.write_text('.IPPcode23\n' + SOURCE)
+    assert cache.fileKey(str(path), 'ipp') == None
+
+
+def test_same_size_edit_in_the_same_tick(tmp_path):  # size and modification time both kept, the output must not be
+    path = write_source(tmp_path, SOURCE)
+    args = ['--source=' + path, '--cache-dir=' + str(tmp_path / 'cache')]
+    modified = os.stat(path).st_mtime_ns
+    assert run_interpreter(args, cache=True).result() == ('42', 0)
+    write_source(tmp_path, SOURCE.replace('int@22', 'int@23'))
+    os.utime(path, ns=(modified, modified))
+    assert run_interpreter(args, cache=True).result() == ('43', 0)
+
+
+def test_eviction_keeps_the_size(tmp_path):
+    cache, key = cached_program(tmp_path)
+    cache.max_size = 0
+    cache.evict()
+    assert os.listdir(cache.directory) == []
+
+
+def test_runs_from_the_cache(tmp_path):
+    args = ['--source=' + write_source(tmp_path, SOURCE), '--cache-dir=' + str(tmp_path / 'cache')]
+    assert run_interpreter(args, cache=True).result() == ('42', 0)
+    entries = os.listdir(tmp_path / 'cache')
+    assert len(entries) == 1
+    assert run_interpreter(args, cache=True).result() == ('42', 0)
+    assert os.listdir(tmp_path / 'cache') == entries  # a hit stores nothing new
+    with open(tmp_path / 'cache' / entries[0], 'wb') as cache_file:
+        cache_file.write(b'\0' * 16)
+    assert run_interpreter(args, cache=True).result() == ('42', 0)
+
+
+def test_changed_source_is_a_miss(tmp_path):
+    args = ['--cache-dir=' + str(tmp_path / 'cache')]
+    assert run_source(tmp_path, SOURCE, args, cache=True).result() == ('42', 0)
+    assert run_source(tmp_path, SOURCE + 'WRITE int@1\n', args, cache=True).result() == ('421', 0)
+    assert len(os.listdir(tmp_path / 'cache')) == 2
+
+
+def test_stdin_source(tmp_path):
+    args = ['--cache-dir=' + str(tmp_path / 'cache'), '--source-format=ipp', '--input=/dev/null']
+    for _ in range(2):
+        assert run_interpreter(args, '.IPPcode23\n' + SOURCE, cache=True).result() == ('42', 0)
+    assert len(os.listdir(tmp_path / 'cache')) == 1
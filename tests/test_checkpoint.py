@@ -0,0 +1,157 @@
+# a run killed after a checkpoint and resumed from it produces the output of an uninterrupted run
+
+import io
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+import interpret
+from support import INTERPRETER, run_interpreter, write_source
+
+SOURCE = '''
+DEFVAR GF@i
+DEFVAR GF@x
+DEFVAR GF@s
+MOVE GF@i int@0
+MOVE GF@s string@
+CREATEFRAME
+PUSHFRAME
+DEFVAR LF@sum
+MOVE LF@sum int@0
+LABEL loop
+READ GF@x int
+ADD LF@sum LF@sum GF@x
+PUSHS GF@x
+CONCAT GF@s GF@s string@a
+CALL show
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@{count}
+WRITE LF@sum
+STRLEN GF@x GF@s
+WRITE GF@x
+POPS GF@x
+WRITE GF@x
+EXIT int@3
+LABEL show
+WRITE GF@i
+WRITE string@\\010
+RETURN
+'''
+
+COUNT = 60000
+
+
+def command(source, *args):
+    return [sys.executable, INTERPRETER, '--no-cache', '--source=' + source, '--input=' + source + '.in'] + list(args)
+
+
+def kill_and_resume(tmp_path, source, input_text):  # (output of the killed and resumed run, uninterrupted run)
+    with open(source + '.in', 'w') as input_file:
+        input_file.write(input_text)
+    expected = run_interpreter(['--source=' + source, '--input=' + source + '.in'])
+
+    checkpoint = str(tmp_path / 'run.ckpt')
+    output = tmp_path / 'out.txt'
+    with open(output, 'w') as output_file:
+        process = subprocess.Popen(command(source, '--checkpoint-every=5000', '--checkpoint=' + checkpoint),
+                                   stdout=output_file)
+        deadline = time.monotonic() + 60
+        while not os.path.exists(checkpoint) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)  # more output after the checkpoint, resuming must drop it
+        process.send_signal(signal.SIGKILL)
+        assert process.wait() == -signal.SIGKILL
+    assert os.path.exists(checkpoint)
+    assert 0 < len(output.read_text()) < len(expected.stdout)
+
+    with open(output, 'a') as output_file:
+        resumed = subprocess.run(command(source, '--checkpoint-every=5000', '--resume=' + checkpoint),
+                                 stdout=output_file)
+    assert resumed.returncode == expected.exit_code
+    assert not os.path.exists(checkpoint)  # removed once the program ended
+    return output.read_text(), expected
+
+
+def test_kill_and_resume(tmp_path):
+    source = write_source(tmp_path, SOURCE.format(count=COUNT))
+    output, expected = kill_and_resume(tmp_path, source, ''.join('{}\n'.format(n) for n in range(COUNT)))
+    assert expected.exit_code == 3
+    assert output == expected.stdout
+
+
+NIL_SOURCE = '''
+DEFVAR GF@i
+DEFVAR GF@x
+DEFVAR GF@b
+READ GF@x int
+PUSHS GF@x
+PUSHS nil@nil
+MOVE GF@i int@0
+LABEL loop
+WRITE GF@i
+WRITE string@\\010
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@{count}
+TYPE GF@b GF@x
+WRITE GF@b
+EQ GF@b GF@x nil@nil
+WRITE GF@b
+POPS GF@x
+POPS GF@x
+TYPE GF@b GF@x
+WRITE GF@b
+EQ GF@b GF@x nil@nil
+WRITE GF@b
+'''
+
+
+def test_resume_with_nil_from_read(tmp_path):  # READ at the end of input leaves a nil in a frame and on the stack
+    source = write_source(tmp_path, NIL_SOURCE.format(count=COUNT))
+    output, expected = kill_and_resume(tmp_path, source, '')
+    assert expected.exit_code == 0
+    assert output == expected.stdout
+
+
+def test_failed_write_keeps_the_last_checkpoint(tmp_path, monkeypatch):
+    checkpoint = tmp_path / 'run.ckpt'
+    checkpoint.write_bytes(b'IPPS last good')
+    program_context = interpret.ProgramContext(io.StringIO(''))
+    writer = interpret.Checkpoint(str(checkpoint), 1, [])
+
+    def replace(source, destination):
+        raise OSError('disk full')
+    monkeypatch.setattr(interpret.os, 'replace', replace)
+    with pytest.raises(SystemExit) as exit_info:
+        writer.run([lambda context: None] * 3, program_context)
+    assert exit_info.value.code == 12
+    assert checkpoint.read_bytes() == b'IPPS last good'
+    assert os.listdir(tmp_path) == ['run.ckpt']
+
+
+def test_checkpoint_of_another_program(tmp_path):
+    source = write_source(tmp_path, SOURCE.format(count=COUNT))
+    with open(source + '.in', 'w') as input_file:
+        input_file.write('1\n' * COUNT)
+    checkpoint = str(tmp_path / 'run.ckpt')
+    process = subprocess.Popen(command(source, '--checkpoint-every=1000', '--checkpoint=' + checkpoint),
+                               stdout=subprocess.DEVNULL)
+    while not os.path.exists(checkpoint) and process.poll() == None:
+        time.sleep(0.01)
+    process.kill()
+    process.wait()
+
+    other = write_source(tmp_path, SOURCE.format(count=COUNT + 1), 'other.src')
+    os.rename(source + '.in', other + '.in')
+    assert subprocess.run(command(other, '--resume=' + checkpoint), stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL).returncode == 32
+
+
+def test_damaged_checkpoint(tmp_path):
+    source = write_source(tmp_path, 'WRITE int@1\n')
+    checkpoint = tmp_path / 'run.ckpt'
+    checkpoint.write_bytes(b'IPPS\xff\xff')
+    assert run_interpreter(['--source=' + source, '--resume=' + str(checkpoint)]).exit_code == 32
@@ -0,0 +1,170 @@
+# every engine, optimisation level and hot loop threshold must behave like the plain classic engine
+
+import json
+
+import pytest
+
+from support import run_source
+
+PROGRAMS = {
+    'arithmetic': '''
+DEFVAR GF@i
+DEFVAR GF@s
+DEFVAR GF@t
+DEFVAR GF@b
+MOVE GF@i int@0
+MOVE GF@s int@0
+LABEL loop
+ADD GF@s GF@s GF@i
+MUL GF@t GF@i int@3
+IDIV GF@t GF@t int@2
+SUB GF@s GF@s GF@t
+LT GF@b GF@s int@0
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@5000
+WRITE GF@s
+WRITE GF@b
+''',
+    'strings': '''
+DEFVAR GF@i
+DEFVAR GF@s
+DEFVAR GF@c
+MOVE GF@i int@0
+MOVE GF@s string@
+LABEL loop
+CONCAT GF@s GF@s string@ab
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@3000
+SETCHAR GF@s int@1 string@z
+GETCHAR GF@c GF@s int@1
+WRITE GF@c
+STRLEN GF@i GF@s
+WRITE GF@i
+STRI2INT GF@i GF@s int@0
+WRITE GF@i
+''',
+    'calls': '''
+DEFVAR GF@n
+DEFVAR GF@r
+MOVE GF@n int@300
+MOVE GF@r int@0
+CALL sum
+WRITE GF@r
+EXIT int@7
+LABEL sum
+JUMPIFEQ done GF@n int@0
+CREATEFRAME
+PUSHFRAME
+DEFVAR LF@x
+MOVE LF@x GF@n
+ADD GF@r GF@r LF@x
+SUB GF@n GF@n int@1
+POPFRAME
+CALL sum
+LABEL done
+RETURN
+''',
+    'stack': '''
+DEFVAR GF@i
+DEFVAR GF@x
+MOVE GF@i int@0
+LABEL loop
+PUSHS GF@i
+PUSHS int@2
+MULS
+PUSHS int@1
+ADDS
+POPS GF@x
+ADD GF@i GF@i int@1
+PUSHS GF@i
+PUSHS int@2000
+JUMPIFNEQS loop
+WRITE GF@x
+TYPE GF@x GF@x
+WRITE GF@x
+''',
+    'read': '''
+DEFVAR GF@a
+DEFVAR GF@b
+DEFVAR GF@c
+DEFVAR GF@d
+READ GF@a int
+READ GF@b bool
+READ GF@c string
+READ GF@d int
+WRITE GF@a
+WRITE GF@b
+WRITE GF@c
+WRITE GF@d
+TYPE GF@d GF@d
+WRITE GF@d
+''',
+    'type change in a hot loop': '''
+DEFVAR GF@i
+DEFVAR GF@v
+DEFVAR GF@s
+DEFVAR GF@t
+PUSHS nil@nil
+PUSHS bool@true
+MOVE GF@i int@0
+LABEL fill
+PUSHS GF@i
+ADD GF@i GF@i int@1
+JUMPIFNEQ fill GF@i int@3000
+POPS GF@v
+MOVE GF@s int@0
+LABEL loop
+ADD GF@s GF@s GF@v
+POPS GF@v
+TYPE GF@t GF@v
+JUMPIFNEQ loop GF@t string@nil
+WRITE GF@s
+''',
+    'division by zero in a hot loop': '''
+DEFVAR GF@i
+DEFVAR GF@x
+MOVE GF@i int@3000
+LABEL loop
+SUB GF@i GF@i int@1
+IDIV GF@x int@10 GF@i
+JUMP loop
+''',
+}
+
+CONFIGURATIONS = [
+    ['--engine=compiled'],
+    ['-O1'],
+    ['-O2'],
+    ['-O2', '--engine=compiled'],
+    ['--hot-loop-threshold=1'],
+    ['--hot-loop-threshold=100', '-O2'],
+    ['--hot-loop-threshold=100', '--engine=compiled'],
+]
+
+INPUT = '42\ntrue\nhello\\032world\nnot a number\n'
+
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+@pytest.mark.parametrize('args', CONFIGURATIONS, ids=' '.join)
+def test_same_as_classic(tmp_path, name, args):
+    expected = run_source(tmp_path, PROGRAMS[name], ['--hot-loop-threshold=0'], INPUT)
+    assert run_source(tmp_path, PROGRAMS[name], args, INPUT).result() == expected.result()
+
+
+def test_programs_exercise_errors_and_exit(tmp_path):  # the differential runs above compare more than success
+    exit_codes = {name: run_source(tmp_path, source, ['--hot-loop-threshold=0'], INPUT).exit_code
+                  for name, source in PROGRAMS.items()}
+    assert exit_codes['calls'] == 7
+    assert exit_codes['type change in a hot loop'] == 53
+    assert exit_codes['division by zero in a hot loop'] == 57
+
+
+def test_optimizer_report(tmp_path):  # never mixed into the program's stderr unless asked for
+    source = PROGRAMS['arithmetic'] + 'DPRINT int@5\n'
+    run = run_source(tmp_path, source, ['-O2'])
+    assert run.stderr == '5'
+    run = run_source(tmp_path, source, ['-O2', '--verbose'])
+    assert run.stderr.startswith('optimizer: eliminated ')
+    stats = tmp_path / 'stats.json'
+    run_source(tmp_path, source, ['-O2', '--stats=' + str(stats)])
+    assert json.loads(stats.read_text())['optimizer_eliminated'] > 0
@@ -0,0 +1,63 @@
+# frames dropped by CREATEFRAME and POPFRAME are reused, a reused frame never shows the variables it held
+
+import pytest
+
+from support import run_source
+
+CONFIGURATIONS = [[], ['--engine=compiled'], ['-O2'], ['-O2', '--engine=compiled'], ['--hot-loop-threshold=1']]
+
+PROGRAMS = [
+    # the TF dropped by CREATEFRAME is the next TF
+    ('''
+DEFVAR GF@t
+CREATEFRAME
+DEFVAR TF@x
+MOVE TF@x int@1
+CREATEFRAME
+DEFVAR TF@y
+TYPE GF@t TF@x
+''', ('', 54)),
+    # the frame POPFRAME made the TF goes back to the pool on CREATEFRAME
+    ('''
+CREATEFRAME
+PUSHFRAME
+DEFVAR LF@x
+MOVE LF@x int@1
+POPFRAME
+WRITE TF@x
+CREATEFRAME
+PUSHFRAME
+WRITE LF@x
+''', ('1', 54)),
+    # every call gets a blank local frame, a leaked LF@x would be redefined (52) or still set
+    ('''
+DEFVAR GF@i
+DEFVAR GF@t
+MOVE GF@i int@0
+LABEL loop
+CALL f
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@50
+WRITE GF@i
+EXIT int@0
+LABEL f
+CREATEFRAME
+PUSHFRAME
+DEFVAR LF@y
+DEFVAR LF@x
+TYPE GF@t LF@x
+JUMPIFNEQ bad GF@t string@
+MOVE LF@x GF@i
+MOVE LF@y LF@x
+POPFRAME
+RETURN
+LABEL bad
+EXIT int@9
+''', ('50', 0)),
+]
+
+
+@pytest.mark.parametrize('source, result', PROGRAMS, ids=['createframe', 'popframe', 'calls'])
+@pytest.mark.parametrize('args', CONFIGURATIONS, ids=lambda args: ' '.join(args) or 'classic')
+def test_reused_frame_is_blank(tmp_path, source, result, args):
+    assert run_source(tmp_path, source, args).result() == result
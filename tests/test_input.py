@@ -0,0 +1,70 @@
+# InputReader hands out the same lines as readline whatever the chunk boundaries, READ sees them
+
+import io
+
+import pytest
+
+import interpret
+from support import run_source
+
+TEXT = 'one\ntwo\r\nthree\rfoür\n\nlast'
+LINES = ['one', 'two', 'three', 'foür', '', 'last']
+
+
+def reader(text, binary):
+    if binary:  # a file with a buffer under it, like open() returns
+        return interpret.InputReader(io.TextIOWrapper(io.BytesIO(text.encode('utf-8')), encoding='utf-8'))
+    return interpret.InputReader(io.StringIO(text))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 1 << 20])
+def test_lines_across_chunks(monkeypatch, chunk_size):  # \r\n and the two bytes of u-umlaut split as well
+    monkeypatch.setattr(interpret.InputReader, 'CHUNK_SIZE', chunk_size)
+    input_reader = reader(TEXT, True)
+    assert [input_reader.readLine() for _ in LINES] == LINES
+    assert input_reader.consumed == len(LINES)
+    assert [input_reader.readLine(), input_reader.readLine()] == ['', '']  # stays at the end
+    assert input_reader.consumed == len(LINES)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 1 << 20])
+@pytest.mark.parametrize('text', ['a\nb\n', 'a\nb'], ids=['newline', 'no newline'])
+def test_last_line(monkeypatch, chunk_size, text):
+    monkeypatch.setattr(interpret.InputReader, 'CHUNK_SIZE', chunk_size)
+    for binary in (False, True):
+        input_reader = reader(text, binary)
+        assert [input_reader.readLine() for _ in range(3)] == ['a', 'b', '']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1 << 20])
+def test_skip(monkeypatch, chunk_size):  # what a resumed run drops before its first READ
+    monkeypatch.setattr(interpret.InputReader, 'CHUNK_SIZE', chunk_size)
+    input_reader = reader(TEXT, True)
+    assert input_reader.skip(3)
+    assert input_reader.readLine() == 'foür'
+    assert input_reader.consumed == 4
+    assert not input_reader.skip(5)  # fewer lines left than asked for
+    assert input_reader.readLine() == ''
+
+
+def test_read_past_a_chunk_and_the_end(tmp_path):  # the first line fills more than one chunk
+    source = '''
+DEFVAR GF@s
+DEFVAR GF@n
+READ GF@s string
+STRLEN GF@n GF@s
+WRITE GF@n
+WRITE string@\\032
+READ GF@n int
+WRITE GF@n
+WRITE string@\\032
+READ GF@n int
+WRITE GF@n
+WRITE string@\\032
+READ GF@n int
+TYPE GF@s GF@n
+WRITE GF@s
+'''
+    long_line = 'x' * (interpret.InputReader.CHUNK_SIZE + 12345)
+    run = run_source(tmp_path, source, input_text=long_line + '\n42\n7')
+    assert run.result() == ('{} 42 7 nil'.format(len(long_line)), 0)
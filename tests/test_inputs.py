@@ -0,0 +1,69 @@
+# --inputs runs one program over many stdin files and compares each run with its .out and .rc reference
+
+import pytest
+
+from support import run_interpreter, write_source
+
+SOURCE = '''
+DEFVAR GF@x
+READ GF@x int
+MUL GF@x GF@x int@2
+WRITE GF@x
+JUMPIFNEQ done GF@x int@10
+EXIT int@3
+LABEL done
+'''
+
+# name: input, .out, .rc (None when the reference file is missing)
+INPUTS = {
+    'a': ('1\n', '2', None),
+    'b': ('5\n', '10', '3\n'),
+    'c': ('2\n', None, None),
+    'd': ('7\n', '15', None),
+    'e': ('4\n', None, '3\n'),
+}
+
+
+def sweep(tmp_path, names, manifest=False):  # {name: (exit, expected, result)}, summary line, exit code
+    source = write_source(tmp_path, SOURCE)
+    paths = []
+    for name in names:
+        text, out, rc = INPUTS[name]
+        for suffix, content in (('.in', text), ('.out', out), ('.rc', rc)):
+            if content != None:
+                (tmp_path / (name + suffix)).write_text(content)
+        paths.append(str(tmp_path / (name + '.in')))
+    if manifest:
+        (tmp_path / 'manifest').write_text('\n'.join(paths) + '\n')
+        inputs = '@' + str(tmp_path / 'manifest')
+    else:
+        inputs = str(tmp_path / '*.in')
+    run = run_interpreter(['--source=' + source, '--inputs=' + inputs, '--workers=2'])
+    lines = run.stdout.splitlines()
+    assert lines[0].split() == ['input', 'exit', 'expected', 'result']
+    rows = {}
+    for line in lines[1:-1]:
+        path, exit_code, expected, result = line.split()
+        rows[path[len(str(tmp_path)) + 1:-len('.in')]] = (exit_code, expected, result)
+    return rows, lines[-1], run.exit_code
+
+
+def test_table_and_failure(tmp_path):
+    rows, summary, exit_code = sweep(tmp_path, 'abcde')
+    assert rows == {
+        'a': ('0', '-', 'ok'),  # only .out, it matches
+        'b': ('3', '3', 'ok'),  # .out and .rc match
+        'c': ('0', '-', '-'),  # no reference
+        'd': ('0', '-', 'FAIL'),  # .out differs
+        'e': ('0', '3', 'FAIL'),  # .rc differs
+    }
+    assert summary == '5 inputs, 2 passed, 2 failed, 1 without reference'
+    assert exit_code == 1
+
+
+@pytest.mark.parametrize('manifest', [False, True], ids=['glob', 'manifest'])
+def test_all_passing(tmp_path, manifest):
+    rows, summary, exit_code = sweep(tmp_path, 'abc', manifest)
+    assert [rows[name][2] for name in 'abc'] == ['ok', 'ok', '-']
+    assert summary == '3 inputs, 2 passed, 0 failed, 1 without reference'
+    assert exit_code == 0
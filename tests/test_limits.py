@@ -0,0 +1,61 @@
+# every resource limit ends the run with exit code 90, the stack and frame limits exactly at the limit
+
+import json
+
+import pytest
+
+from support import run_source
+
+PUSHES = 'DEFVAR GF@n\nMOVE GF@n int@0\nLABEL l\nPUSHS GF@n\nADD GF@n GF@n int@1\nWRITE string@.\nJUMP l\n'
+FRAMES = 'LABEL l\nCREATEFRAME\nPUSHFRAME\nWRITE string@.\nJUMP l\n'
+RECURSION = 'LABEL f\nWRITE string@.\nCALL f\nWRITE string@x\nRETURN\n'  # no tail call, it would not nest
+ENGINES = [[], ['--engine=compiled'], ['-O1'], ['-O2', '--engine=compiled']]
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_stack_limit_at_push(tmp_path, args):
+    run = run_source(tmp_path, PUSHES, ['--max-stack=25'] + args)
+    assert (run.stdout, run.exit_code) == ('.' * 25, 90)
+    assert run.stderr == '<ERROR EXIT> resource limit, data stack limit of 25 values reached\n'
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_stack_limit_at_fused_push(tmp_path, args):  # -O does not turn PUSHS+POPS into an unchecked MOVE
+    source = 'DEFVAR GF@x\nPUSHS int@1\nPOPS GF@x\nWRITE GF@x\n'
+    assert run_source(tmp_path, source, ['--max-stack=0'] + args).result() == ('', 90)
+    assert run_source(tmp_path, source, ['--max-stack=1'] + args).result() == ('1', 0)
+    stats = tmp_path / 'stats.json'
+    eliminated = []
+    for limit in [[], ['--max-stack=1']]:
+        run_source(tmp_path, source, ['-O1', '--stats=' + str(stats)] + limit)
+        eliminated.append(json.loads(stats.read_text())['optimizer_eliminated'])
+    assert eliminated == [1, 0]
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_frame_limit_at_push(tmp_path, args):
+    run = run_source(tmp_path, FRAMES, ['--max-frames=7'] + args)
+    assert (run.stdout, run.exit_code) == ('.' * 7, 90)
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_call_depth_is_a_resource_limit(tmp_path, args):
+    run = run_source(tmp_path, RECURSION, ['--max-call-depth=40'] + args)
+    assert (run.stdout, run.exit_code) == ('.' * 41, 90)
+    assert run.stderr == '<ERROR EXIT> resource limit, call depth limit of 40 calls reached\n'
+
+
+def test_instruction_budget(tmp_path):
+    run = run_source(tmp_path, FRAMES, ['--max-instructions=1000'])
+    assert run.exit_code == 90
+    assert run.stderr.startswith('<ERROR EXIT> resource limit, instruction budget')
+
+
+def test_time_limit(tmp_path):
+    assert run_source(tmp_path, 'LABEL l\nJUMP l\n', ['--max-time=0.2']).exit_code == 90
+
+
+def test_within_limits(tmp_path):
+    run = run_source(tmp_path, 'PUSHS int@1\nPUSHS int@2\nCREATEFRAME\nPUSHFRAME\nWRITE string@ok\n',
+                     ['--max-stack=2', '--max-frames=1', '--max-instructions=5'])
+    assert run.result() == ('ok', 0)
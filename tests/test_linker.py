@@ -0,0 +1,47 @@
+# labels are resolved before the program runs, so a bad one is reported before any output
+
+import pytest
+
+from support import run_source
+
+CONFIGURATIONS = [[], ['--engine=compiled'], ['-O2'], ['-O2', '--engine=compiled'], ['--hot-loop-threshold=1']]
+
+SOURCES = {
+    'never reached': 'WRITE string@before\nEXIT int@0\nJUMP nowhere\n',
+    'call': 'WRITE string@before\nCALL nowhere\n',
+    'conditional': 'WRITE string@before\nJUMPIFEQ nowhere int@1 int@2\n',
+    'in a loop': '''
+DEFVAR GF@i
+MOVE GF@i int@0
+WRITE string@before
+LABEL loop
+ADD GF@i GF@i int@1
+JUMPIFEQ nowhere GF@i int@-1
+JUMPIFNEQ loop GF@i int@100
+''',
+    'redeclared': 'WRITE string@before\nLABEL twice\nLABEL twice\n',
+}
+
+
+@pytest.mark.parametrize('name', sorted(SOURCES))
+@pytest.mark.parametrize('args', CONFIGURATIONS, ids=lambda args: ' '.join(args) or 'classic')
+def test_reported_before_running(tmp_path, name, args):
+    run = run_source(tmp_path, SOURCES[name], args)
+    assert run.result() == ('', 52)
+    assert 'label' in run.stderr
+
+
+@pytest.mark.parametrize('args', CONFIGURATIONS, ids=lambda args: ' '.join(args) or 'classic')
+def test_jumps_land_after_their_label(tmp_path, args):  # labels may open and close the program
+    source = '''
+LABEL start
+DEFVAR GF@i
+MOVE GF@i int@0
+LABEL loop
+ADD GF@i GF@i int@1
+JUMPIFEQ end GF@i int@3
+JUMP loop
+LABEL end
+WRITE GF@i
+'''
+    assert run_source(tmp_path, source, args).result() == ('3', 0)
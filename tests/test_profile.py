@@ -0,0 +1,62 @@
+# --profile writes collapsed stacks whose paths follow the CALLs and whose counts add up to the instructions run
+
+import pytest
+
+from support import run_source
+
+SOURCE = '''
+DEFVAR GF@n
+MOVE GF@n int@0
+CALL outer
+CALL outer
+WRITE GF@n
+JUMP end
+LABEL outer
+CALL inner
+CALL inner
+MOVE GF@n GF@n
+RETURN
+LABEL inner
+ADD GF@n GF@n int@1
+RETURN
+LABEL end
+'''
+
+EXECUTED = 22
+
+
+def profile(tmp_path, interval):  # {path: count} of the collapsed stacks
+    path = tmp_path / 'profile.txt'
+    run = run_source(tmp_path, SOURCE, ['--profile=' + str(path), '--profile-interval={}'.format(interval)])
+    assert run.result() == ('4', 0)
+    stacks = {}
+    for line in path.read_text().splitlines():
+        stack, count = line.rsplit(' ', 1)
+        stacks[stack] = int(count)
+    return stacks
+
+
+def test_every_instruction_sampled(tmp_path):  # the leaf is the instruction about to run
+    assert profile(tmp_path, 1) == {
+        'main;MOVE': 1,
+        'main;CALL': 2,
+        'main;WRITE': 1,
+        'main;JUMP': 1,
+        'main;end': 1,
+        'main;outer;CALL': 4,
+        'main;outer;MOVE': 2,
+        'main;outer;RETURN': 2,
+        'main;outer;inner;ADD': 4,
+        'main;outer;inner;RETURN': 4,
+    }
+
+
+@pytest.mark.parametrize('interval', [1, 2, 3, 5])
+def test_weights_add_up(tmp_path, interval):
+    stacks = profile(tmp_path, interval)
+    assert sum(stacks.values()) == EXECUTED - EXECUTED % interval  # the last partial interval is not sampled
+    edges = set()
+    for stack in stacks:
+        frames = stack.split(';')[:-1]
+        edges.update(zip(frames, frames[1:]))
+    assert edges <= {('main', 'outer'), ('outer', 'inner')}
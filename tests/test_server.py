@@ -0,0 +1,90 @@
+# --batch runs jobs while stdin is still open and refuses job options that reach outside the job
+
+import gc
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import interpret
+from support import INTERPRETER, write_source
+
+
+def batch():
+    return subprocess.Popen([sys.executable, INTERPRETER, '--no-cache', '--batch', '--workers=2'],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+
+def test_jobs_start_before_end_of_input(tmp_path):
+    source = write_source(tmp_path, 'DEFVAR GF@x\nREAD GF@x int\nWRITE GF@x\n')
+    process = batch()
+    try:
+        process.stdin.write(json.dumps({'id': 'a', 'source': source, 'input_text': '5\n'}) + '\n')
+        process.stdin.flush()
+        answer = json.loads(process.stdout.readline())  # stdin is still open
+        assert (answer['id'], answer['stdout'], answer['exit_code']) == ('a', '5', 0)
+        process.stdin.write(json.dumps({'source': source, 'input_text': '6\n', 'args': ['-O2']}))  # no newline
+        process.stdin.close()
+        answer = json.loads(process.stdout.readline())
+        assert (answer['id'], answer['stdout'], answer['exit_code']) == (2, '6', 0)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_job_options_are_whitelisted(tmp_path):
+    source = write_source(tmp_path, 'WRITE int@1\n')
+    jobs = [
+        {'id': 1, 'source': source, 'args': ['--engine=compiled', '-O1', '--max-instructions=10', '--warn']},
+        {'id': 2, 'source': source, 'args': ['--stats=' + str(tmp_path / 'stats.json')]},
+        {'id': 3, 'source': source, 'args': ['--compile-only=' + str(tmp_path / 'out.ippb')]},
+        {'id': 4, 'source': source, 'args': ['--checkpoint-every=1', '--checkpoint=' + str(tmp_path / 'c')]},
+        {'id': 5, 'source': source, 'args': ['--cache-dir=' + str(tmp_path)]},
+        {'id': 6, 'source': source, 'limits': {'max_stack': 5, 'timeout': 10}},
+        {'id': 7, 'source': source, 'limits': {'max_workers': 5}},
+    ]
+    process = batch()
+    output, _ = process.communicate(''.join(json.dumps(job) + '\n' for job in jobs), timeout=60)
+    answers = {answer['id']: answer for answer in map(json.loads, output.splitlines())}
+    assert {job_id: answer['exit_code'] for job_id, answer in answers.items()} == \
+        {1: 0, 2: 10, 3: 10, 4: 10, 5: 10, 6: 0, 7: 10}
+    assert answers[1]['stdout'] == '1'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['program.src']
+
+
+def test_preparing_does_not_freeze(tmp_path):  # a server prepares program after program, frozen objects never go
+    args = interpret.parse_arguments(['--no-cache', '--source=' + write_source(tmp_path, 'WRITE int@1\n')])
+    frozen = gc.get_freeze_count()
+    interpret.prepare_program(args)
+    assert gc.get_freeze_count() == frozen
+
+
+def test_worker_closes_server_sockets(tmp_path):
+    path = str(tmp_path / 'server.sock')
+    source = write_source(tmp_path, 'LABEL a\nJUMP a\n')
+    server = subprocess.Popen([sys.executable, INTERPRETER, '--no-cache', '--serve=' + path, '--workers=1'])
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    workers = []
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        client.connect(path)
+        client.sendall((json.dumps({'id': 1, 'source': source, 'limits': {'timeout': 60}}) + '\n').encode())
+        while workers == [] and time.monotonic() < deadline:
+            with open('/proc/{0}/task/{0}/children'.format(server.pid)) as children:
+                workers = children.read().split()
+            time.sleep(0.01)
+        assert len(workers) == 1
+        descriptors = '/proc/{}/fd'.format(workers[0])
+        links = [os.readlink(os.path.join(descriptors, fd)) for fd in os.listdir(descriptors)]
+        assert [link for link in links if link.startswith('socket:')] == []
+    finally:
+        client.close()
+        server.kill()
+        server.wait()
+        for worker in workers:  # the job never ends by itself
+            os.kill(int(worker), signal.SIGKILL)
@@ -0,0 +1,46 @@
+# the IPPcode23 source frontend exits with the codes parse.php exits with for the same input
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from support import run_interpreter
+
+PARSE_PHP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parse.php')
+PHP = shutil.which('php8.1') or shutil.which('php')
+
+# source, exit code of parse.php
+SOURCES = [
+    ('', 21),
+    ('WRITE int@1\n', 21),
+    ('.IPPcode22\nWRITE int@1\n', 21),
+    ('# comment\n\n  .ippCODE23   # header\nWRITE int@1 # operand\n', 0),
+    ('.IPPcode23\nFOO GF@a\n', 22),
+    ('.IPPcode23\n.IPPcode23\n', 22),
+    ('.IPPcode23\nDEFVAR XF@a\n', 23),
+    ('.IPPcode23\nDEFVAR GF@1a\n', 23),
+    ('.IPPcode23\nWRITE int@abc\n', 23),
+    ('.IPPcode23\nWRITE string@a\\1\n', 23),
+    ('.IPPcode23\nWRITE bool@True\n', 23),
+    ('.IPPcode23\nWRITE int@1 int@2\n', 23),
+    ('.IPPcode23\nMOVE GF@a\n', 23),
+    ('.IPPcode23\nJUMP 1abc\n', 23),
+    ('.IPPcode23\nREAD GF@a float\n', 23),
+]
+IDS = ['empty', 'no header', 'wrong header', 'comments', 'opcode', 'header twice', 'frame', 'variable name',
+       'int', 'escape', 'bool', 'extra operand', 'missing operand', 'label', 'type']
+
+
+@pytest.mark.parametrize('source, exit_code', SOURCES, ids=IDS)
+def test_exit_code_of_parse_php(tmp_path, source, exit_code):
+    path = tmp_path / 'program.src'
+    path.write_text(source)
+    assert run_interpreter(['--source=' + str(path)]).exit_code == exit_code
+
+
+@pytest.mark.skipif(PHP == None, reason='php is not installed')
+@pytest.mark.parametrize('source, exit_code', SOURCES, ids=IDS)
+def test_table_matches_parse_php(source, exit_code):
+    assert subprocess.run([PHP, PARSE_PHP], input=source, capture_output=True, text=True).returncode == exit_code
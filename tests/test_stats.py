@@ -0,0 +1,40 @@
+# --stats counts every executed instruction exactly, bench relies on instructions_executed
+
+import json
+
+import pytest
+
+from support import run_source
+
+SOURCE = '''
+DEFVAR GF@i
+MOVE GF@i int@0
+LABEL loop
+ADD GF@i GF@i int@1
+PUSHS GF@i
+JUMPIFNEQ loop GF@i int@3
+CREATEFRAME
+PUSHFRAME
+DEFVAR LF@x
+POPS LF@x
+WRITE LF@x
+POPFRAME
+EXIT int@4
+'''
+
+COUNTS = {'ADD': 3, 'PUSHS': 3, 'JUMPIFNEQ': 3, 'DEFVAR': 2, 'MOVE': 1, 'CREATEFRAME': 1, 'PUSHFRAME': 1,
+          'POPS': 1, 'WRITE': 1, 'POPFRAME': 1, 'EXIT': 1}
+
+
+@pytest.mark.parametrize('args', [[], ['--engine=compiled']], ids=' '.join)
+def test_exact_counts(tmp_path, args):
+    stats = tmp_path / 'stats.json'
+    assert run_source(tmp_path, SOURCE, ['--stats=' + str(stats)] + args).result() == ('3', 4)
+    report = json.loads(stats.read_text())  # written although EXIT ended the run
+    assert report['instructions_executed'] == 18
+    assert {opcode: entry['count'] for opcode, entry in report['opcodes'].items()} == COUNTS
+    assert [(entry['index'], entry['opcode'], entry['count']) for entry in report['hot_instructions'][:3]] == \
+        [(2, 'ADD', 3), (3, 'PUSHS', 3), (4, 'JUMPIFNEQ', 3)]
+    assert sum(entry['count'] for entry in report['hot_instructions']) == 18
+    assert (report['peak_stack_depth'], report['peak_frame_depth'], report['peak_live_variables']) == (3, 1, 2)
+    assert report['optimizer_eliminated'] == 0
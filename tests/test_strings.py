@@ -0,0 +1,89 @@
+# StringData versions of a string share one character list, every version must still read as itself
+
+import pytest
+
+from interpret import StringData, VariableData, VariableType, string_length
+from support import run_source
+
+
+def plain(text):
+    return VariableData(VariableType.STRING, text)
+
+
+def test_concat_keeps_older_versions():
+    first = StringData.concat(plain('ab'), 'c')
+    second = StringData.concat(first, 'de')
+    third = StringData.concat(second, 'f')
+    assert third.value == 'abcdef'
+    assert first.value == 'abc'
+    assert second.value == 'abcde'
+    assert third.value == 'abcdef'
+
+
+def test_setchar_keeps_older_versions():
+    first = StringData.concat(plain('abc'), 'd')
+    second = StringData.setChar(first, 0, 'x')
+    third = StringData.setChar(second, 3, 'y')
+    assert [first.value, second.value, third.value] == ['abcd', 'xbcd', 'xbcy']
+
+
+def test_branching_versions():  # two strings grown from the same older version
+    base = StringData.concat(plain(''), 'ab')
+    left = StringData.concat(base, 'L')
+    right = StringData.concat(base, 'R')
+    changed = StringData.setChar(left, 0, 'z')
+    assert right.value == 'abR'
+    assert left.value == 'abL'
+    assert changed.value == 'zbL'
+    assert base.value == 'ab'
+
+
+def test_length_without_flattening():
+    data = StringData.concat(plain('abc'), 'de')
+    older = StringData.concat(data, 'fgh')
+    assert string_length(data) == 5
+    assert string_length(older) == 8
+    assert string_length(plain('xy')) == 2
+
+
+def test_plain_string_is_not_changed():
+    original = plain('abc')
+    StringData.setChar(original, 1, 'x')
+    StringData.concat(original, 'd')
+    assert original.value == 'abc'
+
+
+PROGRAM = '''
+DEFVAR GF@s
+DEFVAR GF@t
+DEFVAR GF@c
+DEFVAR GF@i
+MOVE GF@s string@abc
+CONCAT GF@s GF@s string@def
+MOVE GF@t GF@s
+CONCAT GF@s GF@s string@ghi
+SETCHAR GF@t int@0 string@X
+GETCHAR GF@c GF@s int@0
+WRITE GF@c
+WRITE GF@t
+WRITE string@|
+WRITE GF@s
+STRLEN GF@i GF@t
+WRITE GF@i
+'''
+
+
+@pytest.mark.parametrize('args', [[], ['--engine=compiled'], ['-O2']], ids=' '.join)
+def test_copies_are_independent(tmp_path, args):  # MOVE shares the value, CONCAT and SETCHAR must not leak into the copy
+    run = run_source(tmp_path, PROGRAM, args)
+    assert run.result() == ('aXbcdef|abcdefghi6', 0)
+
+
+@pytest.mark.parametrize('source, exit_code', [
+    ('DEFVAR GF@s\nMOVE GF@s string@ab\nSETCHAR GF@s int@2 string@x\n', 58),
+    ('DEFVAR GF@s\nMOVE GF@s string@ab\nSETCHAR GF@s int@0 string@\n', 58),
+    ('DEFVAR GF@c\nGETCHAR GF@c string@ab int@-1\n', 58),
+    ('DEFVAR GF@s\nMOVE GF@s string@ab\nCONCAT GF@s GF@s int@1\n', 53),
+])
+def test_string_errors(tmp_path, source, exit_code):
+    assert run_source(tmp_path, source).exit_code == exit_code
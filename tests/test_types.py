@@ -0,0 +1,118 @@
+# TypeInference only drops type checks it can prove, and READ gives every result type it can produce
+
+import pytest
+
+import interpret
+from support import run_interpreter, run_source, write_source
+
+
+def analyzed(tmp_path, source):  # linked instructions after TypeInference
+    path = tmp_path / 'program.src'
+    path.write_text('.IPPcode23\n' + source)
+    with open(path, 'rb') as source_file:
+        instructions = interpret.SourceLoader(source_file).load()
+    interpret.SlotResolver().resolve(instructions)
+    instructions = interpret.ProgramLinker().link(instructions)
+    inference = interpret.TypeInference()
+    inference.analyze(instructions)
+    return instructions, inference
+
+
+def test_proves_straight_line_types(tmp_path):
+    instructions, inference = analyzed(tmp_path, 'DEFVAR GF@a\nMOVE GF@a int@1\nADD GF@a GF@a int@2\n')
+    assert inference.proven == 1
+    assert instructions[2].proven_types == {(interpret.FRAME_GF, 0): interpret.VariableType.INT}
+
+
+def test_merged_types_keep_the_check(tmp_path):
+    source = '''
+DEFVAR GF@a
+DEFVAR GF@b
+READ GF@b bool
+MOVE GF@a int@1
+JUMPIFEQ skip GF@b bool@true
+MOVE GF@a string@x
+LABEL skip
+ADD GF@a GF@a int@2
+'''
+    instructions, inference = analyzed(tmp_path, source)
+    assert inference.proven == 0
+    assert inference.errors == []
+
+
+def test_reports_instructions_that_always_fail(tmp_path):
+    _, inference = analyzed(tmp_path, 'DEFVAR GF@a\nMOVE GF@a string@x\nADD GF@a GF@a int@2\n')
+    assert inference.errors == ['instruction 2 (ADD) always exits with 53']
+
+
+def test_frames_forget_types(tmp_path):  # after CREATEFRAME the TF variables are unknown again
+    source = '''
+CREATEFRAME
+DEFVAR TF@a
+MOVE TF@a int@1
+CREATEFRAME
+DEFVAR TF@a
+READ TF@a string
+ADD TF@a TF@a int@1
+'''
+    _, inference = analyzed(tmp_path, source)
+    assert inference.proven == 0
+
+
+@pytest.mark.parametrize('typpe, line, output', [
+    ('int', '12', '12int'),
+    ('int', 'x', 'nil'),
+    ('bool', 'TRUE', 'truebool'),
+    ('bool', 'no', 'falsebool'),
+    ('string', 'abc', 'abcstring'),
+    ('string', '', 'string'),
+])
+def test_read_every_type(tmp_path, typpe, line, output):
+    source = 'DEFVAR GF@x\nDEFVAR GF@t\nREAD GF@x {}\nWRITE GF@x\nTYPE GF@t GF@x\nWRITE GF@t\n'.format(typpe)
+    assert run_source(tmp_path, source, input_text=line + '\n').result() == (output, 0)
+
+
+@pytest.mark.parametrize('typpe, output', [('int', 'nil'), ('bool', 'nil'), ('string', 'string')])
+def test_read_at_end_of_input(tmp_path, typpe, output):
+    source = 'DEFVAR GF@x\nDEFVAR GF@t\nREAD GF@x {}\nTYPE GF@t GF@x\nWRITE GF@t\n'.format(typpe)
+    assert run_source(tmp_path, source).result() == (output, 0)
+
+
+READ_NIL = '''<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode23">
+ <instruction order="1" opcode="DEFVAR"><arg1 type="var">GF@x</arg1></instruction>
+ <instruction order="2" opcode="DEFVAR"><arg1 type="var">GF@t</arg1></instruction>
+ <instruction order="3" opcode="READ"><arg1 type="var">GF@x</arg1><arg2 type="type">nil</arg2></instruction>
+ <instruction order="4" opcode="TYPE"><arg1 type="var">GF@t</arg1><arg2 type="var">GF@x</arg2></instruction>
+ <instruction order="5" opcode="WRITE"><arg1 type="var">GF@t</arg1></instruction>
+</program>
+'''
+
+
+@pytest.mark.parametrize('input_text', ['', 'something\n'])
+def test_read_nil(tmp_path, input_text):  # only the xml frontend accepts the nil type
+    path = tmp_path / 'program.xml'
+    path.write_text(READ_NIL)
+    assert run_interpreter(['--source=' + str(path)], input_text).result() == ('nil', 0)
+
+
+FAILING = 'DEFVAR GF@a\nMOVE GF@a int@1\nJUMPIFEQ end GF@a int@1\nADD GF@a string@x int@2\nLABEL end\nWRITE GF@a\n'
+
+
+def test_diagnostics_only_with_warn(tmp_path):
+    run = run_source(tmp_path, FAILING)
+    assert (run.stdout, run.stderr, run.exit_code) == ('1', '', 0)
+    run = run_source(tmp_path, FAILING, ['--warn'])
+    assert run.stderr == 'types: instruction 3 (ADD) always exits with 53\n'
+    assert run.result() == ('1', 0)
+
+
+@pytest.mark.parametrize('args', [[], ['-O2']], ids=' '.join)
+def test_proven_instructions_run_unchecked(tmp_path, args):  # chosen when the program list is built, not patched in
+    path = write_source(tmp_path, 'DEFVAR GF@a\nMOVE GF@a int@1\nADD GF@a GF@a int@2\nWRITE GF@a\n')
+    prepared = interpret.prepare_program(interpret.parse_arguments(['--source=' + path, '--no-cache'] + args))
+    add = prepared.instructions[2] if args == [] else prepared.instructions[0].instructions[2]
+    assert add.unchecked
+    assert 'execute' not in vars(add)
+    if args == []:
+        assert prepared.program[2] == add.executeUnchecked